@@ -1,9 +1,18 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify
+from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, Response
 import email_verification_tool
 import russian_email_generator
 import google_sheets_handler
 import domain_finder
+import company_domain_cache
+import dns_cache
+import rate_limiter
+import result_store
+import verification_engine
+import jobs
+import pipeline
+import log_config
 import os
+import io
 import json
 import logging
 import threading
@@ -13,23 +22,8 @@ from dotenv import load_dotenv
 # Load environment variables from .env file
 load_dotenv()
 
-# Configure application logging
-handlers = [logging.StreamHandler()]
-# Only add file logging in development environment
-if os.environ.get('VERCEL_ENV') != 'production':
-    handlers.append(logging.FileHandler("app.log"))
-
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=handlers
-)
 logger = logging.getLogger("email_finder_app")
 
-# Set domain_finder logger to DEBUG level
-domain_finder_logger = logging.getLogger("domain_finder")
-domain_finder_logger.setLevel(logging.DEBUG)
-
 app = Flask(__name__)
 # Use a secure secret key, but allow it to be set via environment variable for Vercel
 app.secret_key = os.environ.get('SECRET_KEY', os.urandom(24))
@@ -39,12 +33,14 @@ DEFAULT_CREDENTIALS_PATH = os.getenv('GOOGLE_CREDENTIALS_PATH')
 DEFAULT_CREDENTIALS_JSON = os.getenv('GOOGLE_APPLICATION_CREDENTIALS')
 DEFAULT_TIMEOUT = int(os.getenv('EMAIL_VERIFICATION_TIMEOUT', 30))
 DEFAULT_STOP_ON_FIRST_VALID = os.getenv('STOP_ON_FIRST_VALID', 'true').lower() == 'true'
+JOB_AUTO_RESUME = os.getenv('JOB_AUTO_RESUME', 'true').lower() == 'true'
+RESULTS_WRITE_BACK = os.getenv('RESULTS_WRITE_BACK', 'true').lower() == 'true'
 
 # Check if we have credentials in .env
 if not DEFAULT_CREDENTIALS_JSON and not DEFAULT_CREDENTIALS_PATH:
     logger.warning("No Google credentials found in .env file")
 
-# Global variables to track verification progress
+# Progress of the manual verification (sheet jobs keep their own, see jobs.scheduler)
 verification_progress = {
     'status': 'idle',
     'total': 0,
@@ -127,6 +123,8 @@ def process_sheet():
             credentials_source = request.form.get('credentials_source', '')
             timeout = int(request.form.get('timeout', 10))
             stop_on_first_valid = request.form.get('stop_on_first_valid') == 'on'
+            worksheet = request.form.get('worksheet', '').strip() or None
+            start_row = max(2, int(request.form.get('start_row') or 2))
             
             # Log the received data
             logger.info(f"Process sheet form submitted with URL: {sheet_url}, credentials: {credentials_source}")
@@ -139,59 +137,57 @@ def process_sheet():
             # Initialize Google Sheets handler
             sheets_handler = google_sheets_handler.GoogleSheetsHandler(credentials_source)
             
-            # Get data from sheet
+            # Get the header first; data rows are read in ranged chunks as the job is created
             logger.info(f"Fetching data from sheet: {sheet_url}")
-            sheet_data = sheets_handler.get_sheet_data(sheet_url)
+            header = sheets_handler.read_header(sheet_url, worksheet)
             
-            if not sheet_data or len(sheet_data) < 2:  # Check if there's data (excluding header)
+            if not header:
                 flash('No data found in the sheet or sheet is not accessible', 'danger')
                 return redirect(url_for('home'))
             
-            # Extract header and data
-            header = sheet_data[0]
-            data_rows = sheet_data[1:]
-            
             # Validate header (need at least first name and last name columns)
             if len(header) < 2:
                 flash('Sheet must have at least 2 columns (First Name, Last Name)', 'danger')
                 return redirect(url_for('home'))
             
-            # Extract name entries (first_name, last_name, domain)
-            name_entries = []
-            for row in data_rows:
-                if len(row) >= 2 and row[0] and row[1]:  # Must have first and last name
-                    first_name = row[0].strip()
-                    last_name = row[1].strip()
-                    
-                    # Get domain or company name from third column if available
-                    domain_or_company = row[2].strip() if len(row) > 2 and row[2] else ""
-                    
-                    name_entries.append((first_name, last_name, domain_or_company))
+            # Previews that were never started don't pile up in the job store
+            jobs.job_store.delete_expired_drafts()
             
-            if not name_entries:
+            # Stream the name entries (first_name, last_name, domain) straight into a draft job;
+            # the session cookie only carries its ID
+            job_id = jobs.job_store.create_job(
+                sheets_handler.read_name_entries(sheet_url, worksheet, start_row),
+                sheet_url=sheet_url,
+                params={'timeout': timeout, 'stop_on_first_valid': stop_on_first_valid},
+                status='draft',
+                numbered=True
+            )
+            total_entries = jobs.job_store.get_job(job_id)['total']
+            
+            if not total_entries:
                 flash('No valid entries found in the sheet', 'danger')
                 return redirect(url_for('home'))
             
             # Store data in session
-            session['name_entries'] = name_entries
+            session['job_id'] = job_id
             session['credentials_source'] = credentials_source
             session['sheet_url'] = sheet_url
             session['timeout'] = timeout
             session['stop_on_first_valid'] = stop_on_first_valid
-            session['total_entries'] = len(name_entries)
+            session['total_entries'] = total_entries
             
-            logger.info(f"Successfully processed sheet with {len(name_entries)} entries")
+            logger.info(f"Successfully processed sheet with {total_entries} entries")
             
             # Show preview before processing
-            preview_data = name_entries[:10]  # Show first 10 entries
+            preview_data = jobs.job_store.preview_entries(job_id)  # Show first 10 entries
             
             # Check if we have any entries with company names instead of domains
-            has_company_names = any(entry[2] and '.' not in entry[2] for entry in name_entries)
+            has_company_names = jobs.job_store.has_company_names(job_id)
             
             return render_template(
                 'sheet_preview.html',
                 preview_data=preview_data,
-                total_entries=len(name_entries),
+                total_entries=total_entries,
                 credentials_source=credentials_source,
                 sheet_url=sheet_url,
                 timeout=timeout,
@@ -205,23 +201,23 @@ def process_sheet():
             return redirect(url_for('home'))
     
     # If GET request or if we have data in session, show the preview
-    if 'name_entries' in session and 'sheet_url' in session:
-        name_entries = session['name_entries']
+    job = jobs.job_store.get_job(session['job_id']) if 'job_id' in session else None
+    if job and 'sheet_url' in session:
         sheet_url = session['sheet_url']
         credentials_source = session.get('credentials_source', '')
         timeout = session.get('timeout', 10)
         stop_on_first_valid = session.get('stop_on_first_valid', True)
         
         # Show preview before processing
-        preview_data = name_entries[:10]  # Show first 10 entries
+        preview_data = jobs.job_store.preview_entries(job['id'])  # Show first 10 entries
         
         # Check if we have any entries with company names instead of domains
-        has_company_names = any(entry[2] and '.' not in entry[2] for entry in name_entries)
+        has_company_names = jobs.job_store.has_company_names(job['id'])
         
         return render_template(
             'sheet_preview.html',
             preview_data=preview_data,
-            total_entries=len(name_entries),
+            total_entries=job['total'],
             credentials_source=credentials_source,
             sheet_url=sheet_url,
             timeout=timeout,
@@ -232,164 +228,189 @@ def process_sheet():
     # If no data in session, redirect to home
     return redirect(url_for('home'))
 
-def process_sheet_in_background(name_entries, credentials_source, sheet_url, timeout, stop_on_first_valid):
-    """Process the sheet data in a background thread."""
-    global verification_progress
-    global stop_processing
-    
-    # Reset stop flag
-    stop_processing = False
+def open_result_writer(job, resuming):
+    """Incremental writer for the job's Results sheet, or None if results can't be written back.
+    
+    A resumed job keeps the rows it already wrote before the interruption. If
+    an earlier run couldn't write all of its rows, the sheet is started over
+    and every completed row is written again from the job store.
+    """
+    credentials_source = DEFAULT_CREDENTIALS_JSON or DEFAULT_CREDENTIALS_PATH
+    if not RESULTS_WRITE_BACK or not job['sheet_url'] or not credentials_source:
+        return None
+    rewrite = resuming and job['results_unwritten']
+    try:
+        sheets_handler = google_sheets_handler.GoogleSheetsHandler(credentials_source)
+        writer = sheets_handler.open_result_writer(job['sheet_url'], clear=not resuming or rewrite)
+    except Exception as e:
+        logger.warning(f"Results of job {job['id']} won't be written to the sheet: {str(e)}")
+        return None
+    if rewrite:
+        logger.info(f"Writing the results of job {job['id']} to the sheet again")
+        for batch in jobs.job_store.iter_completed_batches(job['id'], pipeline.PIPELINE_BATCH_SIZE):
+            for sheet_row, entry, checked, valid in batch:
+                writer.add_result(sheet_row, entry, checked, valid)
+    return writer
+
+def close_result_writer(job_id, writer):
+    """Write out the last results; if some rows didn't make it, the job's next run writes the sheet again."""
+    unwritten = writer.close()
+    jobs.job_store.set_results_unwritten(job_id, unwritten > 0)
+    if unwritten:
+        logger.error(f"{unwritten} result rows of job {job_id} are missing from the sheet; "
+                     f"it will be written again when the job is resumed")
+
+def process_sheet_in_background(handle):
+    """Run a sheet job on its scheduler thread, resuming it if it was interrupted."""
+    job_id = handle.job_id
+    progress = handle.progress
     
     try:
-        verification_progress['status'] = 'running'
-        verification_progress['current'] = 0
-        verification_progress['total'] = len(name_entries)
-        verification_progress['valid_emails'] = []
-        verification_progress['all_checked_emails'] = {}
-        verification_progress['current_name'] = ""
-        verification_progress['current_email'] = ""
-        verification_progress['current_email_index'] = 0
-        verification_progress['total_emails'] = 0
-        verification_progress['error_message'] = ""
+        job = jobs.job_store.get_job(job_id)
+        timeout = job['params'].get('timeout', 10)
+        stop_on_first_valid = job['params'].get('stop_on_first_valid', True)
         
-        logger.info(f"Starting to process {len(name_entries)} entries from sheet")
         
-        # Check if we need to find missing domains
-        has_missing_domains = any(not entry[2] or '.' not in entry[2] for entry in name_entries)
+        progress['job_id'] = job_id
+        progress['type'] = 'sheet'
+        progress['status'] = 'running'
+        progress['current'] = jobs.job_store.completed_count(job_id)
+        progress['total'] = job['total']
+        # Valid emails of rows completed before an interruption are restored from the job store
+        progress['valid_emails'] = jobs.job_store.get_valid_emails(job_id)
+        progress['all_checked_emails'] = {}
+        progress['current_name'] = ""
+        progress['current_email'] = ""
+        progress['current_email_index'] = 0
+        progress['total_emails'] = 0
+        progress['error_message'] = ""
+        jobs.job_store.set_status(job_id, 'running')
         
-        if has_missing_domains:
-            logger.info("Found entries with missing domains or company names. Attempting to find domains...")
-            verification_progress['status'] = 'finding_domains'
-            try:
-                # Find missing domains
-                name_entries_with_domains = domain_finder.find_missing_domains(name_entries)
-                
-                # Log the results
-                for i, (original, with_domain) in enumerate(zip(name_entries, name_entries_with_domains)):
-                    orig_first, orig_last, orig_domain = original
-                    new_first, new_last, new_domain = with_domain
-                    
-                    if orig_domain != new_domain:
-                        logger.info(f"Found domain for entry {i+1}: {orig_first} {orig_last} - {orig_domain} -> {new_domain}")
-                
-                # Update name_entries with the new domains
-                name_entries = name_entries_with_domains
-                
-                # Update status back to running
-                verification_progress['status'] = 'running'
-            except Exception as e:
-                logger.error(f"Error finding domains: {str(e)}")
-                verification_progress['status'] = 'error'
-                verification_progress['error_message'] = f"Error finding domains: {str(e)}"
-                return
+        logger.info(f"Starting job {job_id}: {job['total']} entries, "
+                    f"{progress['current']} already completed")
         
-        for i, entry in enumerate(name_entries):
-            # Check if we should stop processing
-            if stop_processing:
-                logger.info("Processing stopped by user")
-                verification_progress['status'] = 'stopped'
-                verification_progress['error_message'] = "Processing stopped by user"
-                return
-                
-            try:
-                first_name, last_name, domain = entry
-                
-                # Update progress
-                verification_progress['current'] = i + 1
-                verification_progress['current_name'] = f"{first_name} {last_name} ({domain})"
-                
-                # Skip if domain is still missing
-                if not domain or '.' not in domain:
-                    logger.warning(f"Skipping entry {i+1}: {first_name} {last_name} - No valid domain found")
-                    continue
-                    
-                logger.info(f"Processing entry {i+1}/{len(name_entries)}: {first_name} {last_name} ({domain})")
-                
-                # Generate email variations
-                email_variations = russian_email_generator.generate_email_variations(first_name, last_name, domain)
-                
-                # Reset email progress tracking
-                verification_progress['current_email_index'] = 0
-                verification_progress['total_emails'] = len(email_variations)
-                verification_progress['current_email'] = ""
-                
-                # Store all email variations for this person
-                person_key = f"{first_name} {last_name} ({domain})"
-                verification_progress['all_checked_emails'][person_key] = []
-                
-                # Check each email variation
-                valid_email_found = False
-                
-                for j, email in enumerate(email_variations):
-                    try:
-                        # Update email progress
-                        verification_progress['current_email'] = email
-                        verification_progress['current_email_index'] = j
-                        
-                        logger.info(f"Checking email {j+1}/{len(email_variations)}: {email}")
-                        
-                        is_valid = email_verification_tool.verify_email(email, timeout)
-                        
-                        # Store result for this email
-                        verification_progress['all_checked_emails'][person_key].append({
-                            'email': email,
-                            'is_valid': is_valid
-                        })
-                        
-                        if is_valid:
-                            logger.info(f"Valid email found: {email}")
-                            verification_progress['valid_emails'].append({
-                                'first_name': first_name,
-                                'last_name': last_name,
-                                'domain': domain,
-                                'email': email
-                            })
-                            valid_email_found = True
-                            
-                            # Stop checking if we found a valid email and stop_on_first_valid is True
-                            if stop_on_first_valid:
-                                break
-                    except Exception as e:
-                        logger.error(f"Error verifying email {email}: {str(e)}")
-                        # Store error result
-                        verification_progress['all_checked_emails'][person_key].append({
-                            'email': email,
-                            'is_valid': False,
-                            'error': str(e)
-                        })
-                    
-                    # Add a small delay between email checks to avoid being blocked
-                    time.sleep(1)
-                
-                # If we've processed all emails for this person, log the result
-                if not valid_email_found:
-                    logger.warning(f"No valid email found for {first_name} {last_name} ({domain})")
-            except Exception as e:
-                logger.error(f"Error processing entry {i+1}: {str(e)}")
-                # Continue with next entry instead of failing the entire process
-                continue
+        # Rows stream through domain discovery, verification and the job store in
+        # bounded batches; per-MX limits keep each mail server's load polite
+        result_writer = open_result_writer(job, resuming=progress['current'] > 0)
+        job_pipeline = pipeline.SheetPipeline(
+            job_id,
+            progress,
+            engine_options=jobs.scheduler.engine_options(handle),
+            timeout=timeout,
+            stop_on_first_valid=stop_on_first_valid,
+            on_row_done=result_writer.add_result if result_writer else None
+        )
+        try:
+            completed = job_pipeline.run()
+        finally:
+            # Whatever finished is in the sheet, even if the job stopped or failed
+            if result_writer:
+                close_result_writer(job_id, result_writer)
         
-        # Update progress to complete
-        logger.info("Sheet processing complete")
-        verification_progress['status'] = 'complete'
+        if not completed:
+            logger.info(f"Job {job_id} stopped by user")
+            progress['status'] = 'stopped'
+            progress['error_message'] = "Processing stopped by user"
+            jobs.job_store.set_status(job_id, 'stopped', progress['error_message'])
+            return
         
-        # Store results in session for the results page
-        session['sheet_results'] = {
-            'valid_emails': verification_progress['valid_emails'],
-            'all_checked_emails': verification_progress['all_checked_emails'],
-            'total_processed': len(name_entries)
-        }
+        # Release pooled SMTP connections once no other job needs them
+        if not [other for other in jobs.scheduler.running_jobs() if other != job_id]:
+            email_verification_tool.close_smtp_sessions()
+        logger.info(f"DNS cache stats: {dns_cache.get_stats()}")
+        logger.info(f"Company domain cache stats: {company_domain_cache.company_domain_cache.get_stats()}")
+        logger.info(f"Result store stats: {result_store.result_store.get_stats()}")
+        logger.info(f"SMTP rate limits: {rate_limiter.rate_limiter.get_rates()}")
+        logger.info(f"Logging stats: {log_config.get_stats()}")
+        
+        # Results are served from the job store, in sheet order
+        progress['valid_emails'] = jobs.job_store.get_valid_emails(job_id)
+        
+        # Update progress to complete
+        logger.info(f"Sheet processing complete for job {job_id}")
+        progress['status'] = 'complete'
+        jobs.job_store.set_status(job_id, 'complete')
         
     except Exception as e:
         logger.error(f"Error processing sheet: {str(e)}")
-        verification_progress['status'] = 'error'
-        verification_progress['error_message'] = str(e)
+        progress['status'] = 'error'
+        progress['error_message'] = str(e)
+        try:
+            jobs.job_store.set_status(job_id, 'error', str(e))
+        except Exception:
+            pass
+
+def resume_interrupted_jobs():
+    """Pick up jobs that were still running when their process stopped.
+    
+    Only jobs nobody owns (or whose owner stopped sending heartbeats) are
+    listed, and scheduler.start claims each one atomically, so with several
+    workers each job is resumed by exactly one of them.
+    """
+    try:
+        job_ids = jobs.job_store.resumable_jobs()
+    except Exception as e:
+        logger.error(f"Could not check for interrupted jobs: {str(e)}")
+        return
+    
+    if not job_ids:
+        return
+    
+    for job_id in job_ids:
+        handle = jobs.scheduler.get(job_id)
+        if handle and handle.is_running:
+            continue
+        if jobs.scheduler.start(job_id, process_sheet_in_background):
+            logger.info(f"Resumed interrupted job {job_id}")
+
+def watch_interrupted_jobs():
+    # Jobs of a process that just died still have a fresh heartbeat, so look again
+    # every JOB_CLAIM_TIMEOUT rather than only once at startup
+    while True:
+        resume_interrupted_jobs()
+        time.sleep(jobs.JOB_CLAIM_TIMEOUT)
+
+_started = False
+_startup_lock = threading.Lock()
+
+def startup():
+    """Start background work once the server is about to serve requests.
+    
+    Called by the entry points (wsgi.py, `python app.py`), not on import, so
+    importing the app for tests or tooling doesn't start jobs or create log
+    files. Safe to call more than once.
+    """
+    global _started
+    with _startup_lock:
+        if _started:
+            return
+        _started = True
+    # Route all logging through the background writer (levels and format via LOG_* settings)
+    log_config.configure_logging()
+    if JOB_AUTO_RESUME:
+        threading.Thread(target=watch_interrupted_jobs, daemon=True, name="job-resume").start()
+
+def get_job_progress(job_id):
+    """Progress for a job: live while it runs in this process, otherwise from the job store."""
+    handle = jobs.scheduler.get(job_id) if job_id else None
+    if handle:
+        return handle.progress
+    if job_id:
+        job = jobs.job_store.get_job(job_id)
+        if job:
+            return {
+                'status': job['status'],
+                'total': job['total'],
+                'current': jobs.job_store.completed_count(job_id),
+                'error_message': job['error_message']
+            }
+    return {'status': 'idle'}
 
 @app.route('/sheet_progress')
 def sheet_progress():
     """Show progress of sheet processing."""
     # Check if we have data in session
-    if 'name_entries' not in session:
+    if 'job_id' not in session and not request.args.get('job_id'):
         flash('No data to process. Please upload a sheet first.', 'danger')
         return redirect(url_for('home'))
     
@@ -397,43 +418,46 @@ def sheet_progress():
     total_entries = session.get('total_entries', 0)
     
     # Check if processing has started
-    if verification_progress.get('status') == 'idle':
+    job_id = request.args.get('job_id') or session.get('job_id')
+    if get_job_progress(job_id).get('status') == 'idle':
         flash('Processing has not started yet.', 'warning')
         return redirect(url_for('process_sheet'))
     
-    return render_template('sheet_progress.html', total_entries=total_entries)
+    return render_template('sheet_progress.html', total_entries=total_entries, job_id=job_id)
 
 @app.route('/sheet_progress_data')
 def get_sheet_progress_data():
     """Return the current progress data for sheet processing."""
-    global verification_progress
+    job_id = request.args.get('job_id') or session.get('job_id')
+    progress = get_job_progress(job_id)
     
     # Calculate percentage
-    total = verification_progress.get('total', 0)
-    current = verification_progress.get('current', 0)
+    total = progress.get('total', 0)
+    current = progress.get('current', 0)
     percent = int((current / total * 100) if total > 0 else 0)
     
     # Calculate email percentage
-    total_emails = verification_progress.get('total_emails', 0)
-    current_email_index = verification_progress.get('current_email_index', 0)
+    total_emails = progress.get('total_emails', 0)
+    current_email_index = progress.get('current_email_index', 0)
     email_percent = int(((current_email_index + 1) / total_emails * 100) if total_emails > 0 else 0)
     
     # Prepare response
     response = {
-        'status': verification_progress.get('status', 'initializing'),
+        'job_id': job_id or '',
+        'status': progress.get('status', 'initializing'),
         'current': current,
         'total': total,
         'percent': percent,
-        'current_name': verification_progress.get('current_name', ''),
-        'current_email': verification_progress.get('current_email', ''),
+        'current_name': progress.get('current_name', ''),
+        'current_email': progress.get('current_email', ''),
         'current_email_index': current_email_index,
         'total_emails': total_emails,
         'email_percent': email_percent
     }
     
     # Add error message if status is error
-    if verification_progress.get('status') == 'error' and 'error_message' in verification_progress:
-        response['error_message'] = verification_progress.get('error_message', '')
+    if progress.get('status') == 'error' and 'error_message' in progress:
+        response['error_message'] = progress.get('error_message', '')
     
     # Use Flask's jsonify to ensure proper JSON response
     return jsonify(response)
@@ -441,57 +465,38 @@ def get_sheet_progress_data():
 @app.route('/sheet_results')
 def sheet_results():
     """Display the results of sheet processing."""
-    # Check if we have results in session
-    if 'sheet_results' in session:
-        # Get results from session
-        sheet_results = session.get('sheet_results', {})
-        results = sheet_results.get('valid_emails', [])
-        all_checked_emails = sheet_results.get('all_checked_emails', {})
-        num_processed = sheet_results.get('total_processed', 0)
-    else:
-        # Fall back to verification_progress if session data is not available
-        global verification_progress
-        
-        if verification_progress.get('status') != 'complete':
-            flash('Processing is not complete yet', 'warning')
-            return redirect(url_for('sheet_progress'))
-        
-        # Get results from verification progress
-        results = verification_progress.get('valid_emails', [])
-        all_checked_emails = verification_progress.get('all_checked_emails', {})
-        num_processed = verification_progress.get('total', 0)
+    job_id = request.args.get('job_id') or session.get('job_id')
+    job = jobs.job_store.get_job(job_id) if job_id else None
+    
+    if not job:
+        flash('No sheet results found. Please process a sheet first.', 'warning')
+        return redirect(url_for('home'))
+    
+    # Results of a job come from the job store, so they survive restarts
+    if job['status'] != 'complete':
+        flash('Processing is not complete yet', 'warning')
+        return redirect(url_for('sheet_progress', job_id=job_id))
+    
+    if job['results_unwritten']:
+        flash('Some results could not be written to the Results sheet; they are all listed here', 'warning')
+    
+    results = jobs.job_store.get_valid_emails(job_id)
+    num_processed = job['total']
     
     # Count the number of valid emails
     num_valid = len(results)
     
-    # Extract domain finding information if available
-    domains_found = {}
-    original_entries = session.get('name_entries', [])
-    
-    # Create a mapping of original company names to domains
+    # Create a mapping of original company names to the domains that were used for them
     company_to_domain = {}
-    for entry in original_entries:
-        first_name, last_name, domain_or_company = entry
-        if domain_or_company and '.' not in domain_or_company:
+    for (first_name, last_name, domain_or_company), (_, _, domain) in zip(
+            jobs.job_store.get_original_entries(job_id), jobs.job_store.get_entries(job_id)):
+        if domain_or_company and '.' not in domain_or_company and domain and '.' in domain:
             # This is a company name, not a domain
-            company_name = domain_or_company
-            # Look for this person in all_checked_emails to find the domain that was used
-            person_key_pattern = f"{first_name} {last_name} ("
-            for person_key in all_checked_emails.keys():
-                if person_key.startswith(person_key_pattern):
-                    # Extract the domain from the key
-                    domain = person_key.split('(')[1].rstrip(')')
-                    if domain and '.' in domain:
-                        # Found a domain for this company
-                        company_to_domain[company_name] = domain
-                        break
+            company_to_domain.setdefault(domain_or_company, domain)
     
     # Store the company to domain mapping
     domains_found = company_to_domain
     
-    # Store results in session for the all_checked_emails page
-    session['all_checked_emails'] = all_checked_emails
-    
     return render_template(
         'sheet_results.html',
         results=results,
@@ -505,13 +510,19 @@ def all_checked_emails():
     """Page that shows all checked emails for the sheet processing."""
     logger.info("All checked emails page accessed")
     
-    with verification_lock:
-        if verification_progress['type'] != 'sheet' or verification_progress['status'] != 'complete':
-            logger.warning("Tried to access all checked emails before processing complete")
-            flash("No email verification data available.")
-            return redirect(url_for('home'))
-        
-        all_checked_emails = verification_progress['all_checked_emails']
+    job_id = request.args.get('job_id') or session.get('job_id')
+    job = jobs.job_store.get_job(job_id) if job_id else None
+    
+    if not job or job['status'] != 'complete':
+        logger.warning("Tried to access all checked emails before processing complete")
+        flash("No email verification data available.")
+        return redirect(url_for('home'))
+    
+    # (email, status) pairs built from the compact records, per person
+    all_checked_emails = {
+        person_key: [(record.email, record.status) for record in records]
+        for person_key, records in jobs.job_store.get_results(job_id)['all_checked_emails'].items()
+    }
     
     return render_template('all_checked_emails.html',
                           all_checked_emails=all_checked_emails)
@@ -663,9 +674,9 @@ def run_verification_in_background(email_variations, timeout):
                     'is_valid': False,
                     'error': str(e)
                 })
-            
-            # Add a small delay between email checks to avoid being blocked
-            time.sleep(1)
+        
+        # Release pooled SMTP connections now that the run is over
+        email_verification_tool.close_smtp_sessions()
         
         # Update progress to complete
         verification_progress['status'] = 'complete'
@@ -757,12 +768,12 @@ def view_logs():
     logger.info("Logs page accessed")
     
     log_files = {
-        'app': 'app.log',
-        'email_verification': 'email_verification.log'
+        'app': log_config.APP_LOG_FILE,
+        'email_verification': log_config.VERIFICATION_LOG_FILE
     }
     
     log_type = request.args.get('type', 'app')
-    log_file = log_files.get(log_type, 'app.log')
+    log_file = log_files.get(log_type, log_config.APP_LOG_FILE)
     
     try:
         with open(log_file, 'r') as f:
@@ -774,16 +785,70 @@ def view_logs():
     
     return render_template('logs.html', logs=logs, log_type=log_type)
 
+@app.route('/rate_limits')
+def get_rate_limits():
+    """Return the current adaptive probe rate for every mail server seen so far."""
+    return jsonify(rate_limiter.rate_limiter.get_rates())
+
+@app.route('/export_candidates')
+def export_candidates():
+    """Download a job's candidate addresses as CSV (row, pattern, email) without verifying them.
+
+    Rows whose company hasn't been resolved to a domain yet are left out.
+    `top_k` limits the candidates per row (defaults to MAX_EMAIL_VARIATIONS).
+    """
+    job_id = request.args.get('job_id') or session.get('job_id')
+    job = jobs.job_store.get_job(job_id) if job_id else None
+    if not job:
+        return jsonify({'error': 'No such job'}), 404
+
+    top_k = request.args.get('top_k', type=int)
+    entries = [(first_name, last_name, domain if domain and '.' in domain else '')
+               for first_name, last_name, domain in jobs.job_store.get_entries(job_id)]
+    # Generated in one pass, so names repeated across the sheet are scored once
+    batch = russian_email_generator.generate_candidates_bulk(entries, top_k)
+
+    output = io.StringIO()
+    batch.write_csv(output)
+    return Response(output.getvalue(), mimetype='text/csv',
+                    headers={'Content-Disposition': f'attachment; filename=candidates_{job_id}.csv'})
+
+@app.route('/company_domain_overrides', methods=['GET', 'POST', 'DELETE'])
+def company_domain_overrides():
+    """List, set or remove manual company -> domain overrides.
+
+    POST/DELETE take `company_name` (and `domain` for POST) as form fields or JSON.
+    """
+    cache = company_domain_cache.company_domain_cache
+    if request.method == 'GET':
+        return jsonify(cache.list_overrides())
+
+    data = request.get_json(silent=True) or request.form
+    company_name = (data.get('company_name') or '').strip()
+    if not company_name:
+        return jsonify({'error': 'company_name is required'}), 400
+
+    if request.method == 'DELETE':
+        cache.remove_override(company_name)
+        return jsonify({'removed': company_name})
+
+    domain = domain_finder.clean_domain((data.get('domain') or '').strip())
+    if not domain_finder.is_valid_domain(domain):
+        return jsonify({'error': f"'{domain}' is not a valid domain"}), 400
+    cache.set_override(company_name, domain)
+    return jsonify({'company_name': company_name, 'domain': domain})
+
 @app.route('/start_processing', methods=['POST'])
 def start_processing():
     """Start processing the sheet after preview."""
-    if 'name_entries' not in session:
+    job = jobs.job_store.get_job(session['job_id']) if 'job_id' in session else None
+    if not job:
         flash('No data to process. Please upload a sheet first.', 'danger')
         return redirect(url_for('home'))
     
     try:
         # Get data from session
-        name_entries = session['name_entries']
+        job_id = job['id']
         credentials_source = session.get('credentials_source', '')
         sheet_url = session.get('sheet_url', '')
         timeout = session.get('timeout', 10)
@@ -795,41 +860,18 @@ def start_processing():
         # Update session with the new value
         session['stop_on_first_valid'] = stop_on_first_valid
         
-        logger.info(f"Starting processing of {len(name_entries)} entries from sheet: {sheet_url}")
+        logger.info(f"Starting processing of {job['total']} entries from sheet: {sheet_url}")
         logger.info(f"Stop on first valid: {stop_on_first_valid}")
         
-        # Reset progress tracking
-        global verification_progress
-        verification_progress = {
-            'status': 'initializing',
-            'total': len(name_entries),
-            'current': 0,
-            'valid_emails': [],
-            'all_checked_emails': {},
-            'current_name': '',
-            'current_email': '',
-            'current_email_index': 0,
-            'total_emails': 0,
-            'error_message': '',
-            'type': 'sheet'
-        }
+        if job['status'] == 'draft':
+            # From here on the job is resumed if the process restarts
+            jobs.job_store.start_job(job_id, {'timeout': timeout, 'stop_on_first_valid': stop_on_first_valid})
         
-        # Start processing in a background thread
-        processing_thread = threading.Thread(
-            target=process_sheet_in_background,
-            args=(
-                name_entries,
-                credentials_source,
-                sheet_url,
-                timeout,
-                stop_on_first_valid
-            ),
-            daemon=True
-        )
-        processing_thread.start()
+        # Run it alongside any other jobs; the scheduler shares the connection budget fairly
+        jobs.scheduler.start(job_id, process_sheet_in_background, total=job['total'])
         
         # Redirect to the progress page
-        return redirect(url_for('sheet_progress'))
+        return redirect(url_for('sheet_progress', job_id=job_id))
         
     except Exception as e:
         logger.error(f"Error starting processing: {str(e)}", exc_info=True)
@@ -838,10 +880,18 @@ def start_processing():
 
 @app.route('/cancel_processing')
 def cancel_processing():
-    """Cancel the current processing."""
+    """Cancel a sheet job, or the manual verification if no job ID is given."""
     global stop_processing
     global verification_progress
     
+    job_id = request.args.get('job_id')
+    if job_id:
+        if jobs.scheduler.cancel(job_id):
+            flash('Processing is being stopped. Please wait a moment...', 'warning')
+        else:
+            flash('This job is not running.', 'warning')
+        return redirect(url_for('home'))
+    
     # Set the stop flag to signal background threads to stop
     stop_processing = True
     
@@ -858,6 +908,8 @@ def cancel_processing():
 if __name__ == '__main__':
     # Use PORT environment variable if available (for Heroku/Vercel compatibility)
     port = int(os.environ.get('PORT', 5000))
+    # Set up logging and continue any job a previous process didn't get to finish
+    startup()
     logger.info("Starting Flask application")
     app.run(host='0.0.0.0', port=port)
 
@@ -0,0 +1,584 @@
+import asyncio
+import logging
+import os
+import ssl
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import dns.asyncresolver
+import dns.resolver
+
+import dns_cache
+import email_verification_tool
+from rate_limiter import rate_limiter
+from email_verification_tool import (
+    ACCEPT_ALL_REASON,
+    MAILRU_DOMAINS,
+    NO_DOMAIN_STATUS,
+    NO_VALID_EMAIL_STATUS,
+    YANDEX_DOMAINS,
+    SMTP_HELO_HOSTNAME,
+    SMTP_MAIL_FROM,
+    SMTP_MAX_RECIPIENTS_PER_SESSION,
+    SMTP_SESSION_IDLE_TIMEOUT,
+    SMTP_TIMEOUT,
+    catch_all_cache,
+    classify_rcpt_response,
+    entry_result,
+    interpret_catch_all_probe,
+    is_valid_syntax,
+    random_local_part,
+    rcpt_outcome,
+    status_for_result,
+)
+from result_store import (
+    OUTCOME_ACCEPT_ALL,
+    OUTCOME_AMBIGUOUS,
+    OUTCOME_ERROR,
+    OUTCOME_INVALID,
+    OUTCOME_LIKELY_VALID,
+    OUTCOME_TIMEOUT,
+    result_store,
+)
+
+logger = logging.getLogger("async_verifier")
+
+# Default number of probes in flight at once
+ASYNC_MAX_IN_FLIGHT = 1000
+# Default number of concurrent probes against a single MX host
+ASYNC_MAX_PER_MX = 2
+# Probe results buffered before they're written to the result store in one transaction
+ASYNC_RESULT_FLUSH_ROWS = int(os.environ.get('ASYNC_RESULT_FLUSH_ROWS', 200))
+
+RESERVED_TLDS = ('.local', '.test', '.example', '.invalid')
+
+
+class SMTPReplyError(Exception):
+    """Raised when the server answers a setup command with an error code."""
+
+    def __init__(self, code: int, message: str):
+        super().__init__(f"{code} {message}")
+        self.code = code
+        self.message = message
+
+
+# DNS
+
+_pending_lookups: Dict[Tuple[str, str], asyncio.Future] = {}
+
+
+async def async_resolve(domain: str, rdtype: str) -> List[str]:
+    """Resolve MX/A records without blocking, sharing the process-wide DNS cache.
+
+    Concurrent lookups of the same name on the loop share one query.
+    """
+    cached = dns_cache.resolver_cache.get_cached(domain, rdtype)
+    if cached is not None:
+        return cached
+
+    key = (domain.lower().rstrip('.'), rdtype.upper())
+    pending = _pending_lookups.get(key)
+    if pending is not None:
+        return list(await asyncio.shield(pending))
+
+    future = asyncio.get_running_loop().create_future()
+    _pending_lookups[key] = future
+    try:
+        try:
+            answer = await dns.asyncresolver.resolve(domain, rdtype, lifetime=dns_cache.DNS_LIFETIME)
+            records = dns_cache.resolver_cache.put(domain, rdtype, answer=answer)
+        except dns_cache.NEGATIVE_EXCEPTIONS as e:
+            dns_cache.resolver_cache.put(domain, rdtype, negative=type(e))
+            raise
+        future.set_result(records)
+        return list(records)
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as e:
+        if not future.done():
+            future.set_exception(e)
+            # Mark retrieved so a lookup nobody else waited on doesn't warn
+            future.exception()
+        raise
+    finally:
+        _pending_lookups.pop(key, None)
+
+
+async def async_resolve_mx(domain: str) -> List[str]:
+    return await async_resolve(domain, 'MX')
+
+
+async def async_has_mx_record(domain: str) -> bool:
+    """Async version of email_verification_tool.has_mx_record."""
+    try:
+        try:
+            if await async_resolve(domain, 'MX'):
+                return True
+        except dns.resolver.NoAnswer:
+            # Try A record as fallback
+            if await async_resolve(domain, 'A'):
+                return True
+    except dns_cache.NEGATIVE_EXCEPTIONS as e:
+        logger.info(f"No mail records for {domain}: {str(e)}")
+    except Exception as e:
+        logger.error(f"Failed to resolve records for {domain}: {str(e)}")
+    return False
+
+
+# SMTP
+
+def _starttls_context() -> ssl.SSLContext:
+    # Like smtplib.starttls(): encrypt, but don't insist on a matching certificate
+    context = ssl.create_default_context()
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    return context
+
+
+class AsyncSMTPSession:
+    """Non-blocking equivalent of email_verification_tool.SMTPSession."""
+
+    def __init__(self, mx_host: str, max_recipients: int = SMTP_MAX_RECIPIENTS_PER_SESSION,
+                 timeout: float = SMTP_TIMEOUT):
+        self.mx_host = mx_host
+        self.max_recipients = max(1, max_recipients)
+        self.timeout = timeout
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self.recipients_sent = 0
+        self.last_used = 0.0
+
+    @property
+    def is_connected(self) -> bool:
+        return self.writer is not None
+
+    @property
+    def is_exhausted(self) -> bool:
+        return self.recipients_sent >= self.max_recipients
+
+    async def _read_reply(self) -> Tuple[int, str]:
+        lines = []
+        while True:
+            line = await asyncio.wait_for(self.reader.readline(), self.timeout)
+            if not line:
+                raise ConnectionResetError(f"{self.mx_host} closed the connection")
+            text = line.decode('utf-8', errors='replace').rstrip('\r\n')
+            lines.append(text[4:])
+            # "250-..." continues a multiline reply, "250 ..." ends it
+            if len(text) < 4 or text[3] != '-':
+                try:
+                    code = int(text[:3])
+                except ValueError:
+                    raise SMTPReplyError(-1, text)
+                return code, '\n'.join(lines)
+
+    async def command(self, line: str) -> Tuple[int, str]:
+        self.writer.write(f"{line}\r\n".encode('ascii'))
+        await self.writer.drain()
+        return await self._read_reply()
+
+    async def _expect(self, line: str, accepted=(250,)) -> Tuple[int, str]:
+        code, message = await self.command(line)
+        if code not in accepted:
+            raise SMTPReplyError(code, message)
+        return code, message
+
+    async def connect(self):
+        self.close()
+        logger.info(f"Connecting to SMTP server: {self.mx_host}")
+        self.reader, self.writer = await asyncio.wait_for(
+            asyncio.open_connection(self.mx_host, 25), self.timeout)
+        try:
+            code, message = await self._read_reply()
+            if code != 220:
+                raise SMTPReplyError(code, message)
+
+            code, features = await self._expect(f"EHLO {SMTP_HELO_HOSTNAME}")
+            if 'STARTTLS' in features.upper() and hasattr(self.writer, 'start_tls'):
+                await self._expect("STARTTLS", accepted=(220,))
+                await asyncio.wait_for(
+                    self.writer.start_tls(_starttls_context(), server_hostname=self.mx_host), self.timeout)
+                await self._expect(f"EHLO {SMTP_HELO_HOSTNAME}")
+
+            await self._expect(f"MAIL FROM:<{SMTP_MAIL_FROM}>")
+        except BaseException:
+            self.close()
+            raise
+        self.recipients_sent = 0
+        self.last_used = time.monotonic()
+
+    async def reset(self) -> bool:
+        """RSET + MAIL FROM; False if the server refused either, so the connection is no good."""
+        code, _ = await self.command("RSET")
+        if code != 250:
+            return False
+        code, _ = await self.command(f"MAIL FROM:<{SMTP_MAIL_FROM}>")
+        return code == 250
+
+    async def probe(self, email: str) -> Tuple[int, str]:
+        """Send RCPT TO for one address, reconnecting once if the server dropped us."""
+        for attempt in range(2):
+            try:
+                if not self.is_connected or self.is_exhausted:
+                    await self.connect()
+                elif self.recipients_sent > 0 and not await self.reset():
+                    logger.info(f"{self.mx_host} refused to reset the transaction, reconnecting")
+                    await self.connect()
+
+                code, message = await self.command(f"RCPT TO:<{email}>")
+                self.recipients_sent += 1
+                self.last_used = time.monotonic()
+                if code == 421:
+                    self.close()
+                return code, message
+            except (ConnectionResetError, BrokenPipeError, asyncio.IncompleteReadError) as e:
+                self.close()
+                if attempt == 1:
+                    raise ConnectionResetError(str(e))
+                logger.info(f"Connection to {self.mx_host} was dropped, reconnecting")
+            except BaseException:
+                # Timeouts and cancellation leave the dialogue in an unknown state
+                self.close()
+                raise
+
+    def close(self):
+        if self.writer is None:
+            return
+        try:
+            if not self.writer.is_closing():
+                self.writer.write(b"QUIT\r\n")
+            self.writer.close()
+        except Exception:
+            pass
+        self.reader = None
+        self.writer = None
+        self.recipients_sent = 0
+
+
+class AsyncSMTPSessionPool:
+    """Idle AsyncSMTPSession objects keyed by MX host."""
+
+    def __init__(self, max_recipients: int = SMTP_MAX_RECIPIENTS_PER_SESSION,
+                 idle_timeout: int = SMTP_SESSION_IDLE_TIMEOUT):
+        self.max_recipients = max_recipients
+        self.idle_timeout = idle_timeout
+        self._idle: Dict[str, List[AsyncSMTPSession]] = {}
+
+    def acquire(self, mx_host: str) -> AsyncSMTPSession:
+        sessions = self._idle.get(mx_host, [])
+        while sessions:
+            smtp_session = sessions.pop()
+            if time.monotonic() - smtp_session.last_used < self.idle_timeout:
+                return smtp_session
+            smtp_session.close()
+        return AsyncSMTPSession(mx_host, max_recipients=self.max_recipients)
+
+    def release(self, smtp_session: AsyncSMTPSession):
+        if not smtp_session.is_connected or smtp_session.is_exhausted:
+            smtp_session.close()
+            return
+        self._idle.setdefault(smtp_session.mx_host, []).append(smtp_session)
+
+    def close_all(self):
+        for sessions in self._idle.values():
+            for smtp_session in sessions:
+                smtp_session.close()
+        self._idle.clear()
+
+
+class AsyncVerifier:
+    """Runs SMTP/DNS verification for many addresses on one event loop.
+
+    Every probe is a coroutine: DNS goes through dns.asyncresolver, the SMTP
+    dialogue uses asyncio streams, and a timeout cancels the probe and closes
+    its connection instead of leaking a thread that still holds the socket.
+    A fixed number of worker coroutines pull from the input, so memory stays
+    bounded however many addresses are fed in.
+
+    SQLite never runs on the loop: result store and catch-all cache reads go
+    through asyncio.to_thread, and new results are buffered and written
+    ASYNC_RESULT_FLUSH_ROWS at a time from a worker thread, so one commit
+    doesn't stall a thousand probes in flight.
+
+    Usage:
+        results = asyncio.run(verify_emails_async(emails, timeout_per_email=30))
+
+    Args:
+        max_in_flight: Probes running at the same time
+        max_per_mx: Concurrent probes against a single mail server
+        reuse_session: Probe over pooled connections per MX host
+    """
+
+    def __init__(self, max_in_flight: int = ASYNC_MAX_IN_FLIGHT, max_per_mx: int = ASYNC_MAX_PER_MX,
+                 reuse_session: bool = None):
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_per_mx = max(1, max_per_mx)
+        if reuse_session is None:
+            reuse_session = email_verification_tool.SMTP_SESSION_REUSE
+        self.reuse_session = reuse_session
+        self.pool = AsyncSMTPSessionPool()
+        self._mx_slots: Dict[str, asyncio.Semaphore] = {}
+        self._catch_all_locks: Dict[str, asyncio.Lock] = {}
+        self._pending_results: List[Tuple[str, str, Optional[int], str, str]] = []
+        self._flushes: List[asyncio.Future] = []
+
+    def _record_result(self, email: str, outcome: str, smtp_code: int = None, reason: str = '', mx_host: str = ''):
+        """Buffer a result for the result store; full buffers are written off the loop."""
+        self._pending_results.append((email, outcome, smtp_code, reason, mx_host))
+        if len(self._pending_results) >= ASYNC_RESULT_FLUSH_ROWS:
+            self._start_flush()
+
+    def _start_flush(self):
+        batch, self._pending_results = self._pending_results, []
+        if batch:
+            self._flushes = [flush for flush in self._flushes if not flush.done()]
+            self._flushes.append(asyncio.ensure_future(asyncio.to_thread(result_store.record_many, batch)))
+
+    async def flush_results(self):
+        """Write every buffered result and wait for writes in progress."""
+        self._start_flush()
+        flushes, self._flushes = self._flushes, []
+        await asyncio.gather(*flushes, return_exceptions=True)
+
+    def _mx_slot(self, mx_host: str) -> asyncio.Semaphore:
+        if mx_host not in self._mx_slots:
+            self._mx_slots[mx_host] = asyncio.Semaphore(self.max_per_mx)
+        return self._mx_slots[mx_host]
+
+    async def _wait_for_token(self, mx_record: str):
+        delay = rate_limiter.reserve(mx_record)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def smtp_probe(self, email: str, mx_record: str, paced: bool = False) -> Tuple[int, str]:
+        """Send RCPT TO for an address to the given MX host and return (code, message).
+
+        The host's rate limit is waited for (unless the caller did: `paced`)
+        before taking its slot, so a paced probe doesn't hold the slot.
+        """
+        if not paced:
+            await self._wait_for_token(mx_record)
+        async with self._mx_slot(mx_record):
+            if self.reuse_session:
+                smtp_session = self.pool.acquire(mx_record)
+            else:
+                smtp_session = AsyncSMTPSession(mx_record, max_recipients=1)
+            try:
+                code, message = await smtp_session.probe(email)
+            except (ConnectionResetError, BrokenPipeError):
+                rate_limiter.report(mx_record, dropped=True)
+                raise
+            finally:
+                if self.reuse_session:
+                    self.pool.release(smtp_session)
+                else:
+                    smtp_session.close()
+            rate_limiter.report(mx_record, code)
+            return code, message
+
+    async def is_catch_all_domain(self, domain: str, mx_record: str) -> bool:
+        """Async version of email_verification_tool.is_catch_all_domain; shares its cache."""
+        domain = domain.lower()
+        if domain not in self._catch_all_locks:
+            self._catch_all_locks[domain] = asyncio.Lock()
+
+        async with self._catch_all_locks[domain]:
+            # The cache may have to read SQLite, so ask it from a worker thread
+            if await asyncio.to_thread(catch_all_cache.is_known, domain):
+                return bool(await asyncio.to_thread(catch_all_cache.get, domain))
+
+            verdict = None
+            try:
+                probe_email = f"{random_local_part()}@{domain}"
+                code, message = await self.smtp_probe(probe_email, mx_record)
+                verdict = interpret_catch_all_probe(code)
+                logger.info(f"Catch-all probe for {domain}: code={code}, catch-all={verdict}")
+            except Exception as e:
+                logger.warning(f"Catch-all probe failed for {domain}: {str(e)}")
+
+            await asyncio.to_thread(catch_all_cache.put, domain, verdict, mx_record)
+            return bool(verdict)
+
+    async def probe_email(self, email: str, paced: bool = False) -> Dict[str, Any]:
+        """Async version of email_verification_tool.probe_email."""
+        domain = email.split('@')[1]
+
+        def result(exists, reason, outcome, smtp_code=None, mx_host=''):
+            return {'exists': exists, 'reason': reason, 'outcome': outcome,
+                    'smtp_code': smtp_code, 'mx_host': mx_host}
+
+        # Providers that block SMTP probing get the same heuristics as the sync path. Their
+        # has_mx_record check can block on DNS and sleep between retries, so it runs off the loop
+        if domain in MAILRU_DOMAINS or domain in YANDEX_DOMAINS:
+            if domain in MAILRU_DOMAINS:
+                heuristics = email_verification_tool.check_russian_mailru
+            else:
+                heuristics = email_verification_tool.check_russian_yandex
+            exists, reason = await asyncio.to_thread(heuristics, email)
+            return result(exists, reason, OUTCOME_LIKELY_VALID if exists else OUTCOME_INVALID)
+
+        try:
+            mx_record = (await async_resolve_mx(domain))[0]
+        except Exception as e:
+            return result(False, str(e), OUTCOME_ERROR)
+
+        # A server that accepts everything can't confirm this address
+        if await self.is_catch_all_domain(domain, mx_record):
+            logger.info(f"Skipping SMTP probe for {email}: {domain} accepts all recipients")
+            return result(False, ACCEPT_ALL_REASON, OUTCOME_ACCEPT_ALL, mx_host=mx_record)
+
+        try:
+            code, message = await self.smtp_probe(email, mx_record, paced)
+        except (ConnectionResetError, BrokenPipeError) as e:
+            logger.warning(f"Server disconnected while verifying {email}: {str(e)}")
+            return result(False, "Server disconnected", OUTCOME_AMBIGUOUS, mx_host=mx_record)
+        except (SMTPReplyError, OSError) as e:
+            logger.warning(f"Error while verifying {email}: {str(e)}")
+            return result(False, str(e), OUTCOME_AMBIGUOUS, getattr(e, 'code', None), mx_record)
+
+        logger.info(f"RCPT TO response: code={code}, message={message}")
+        exists, reason = classify_rcpt_response(email, code)
+        return result(exists, reason, rcpt_outcome(code), code, mx_record)
+
+    async def email_exists(self, email: str) -> Tuple[bool, str]:
+        """Async version of email_verification_tool.email_exists."""
+        probe = await self.probe_email(email)
+        return probe['exists'], probe['reason']
+
+    async def check_email(self, email: str, timeout: float = 30) -> str:
+        """Verify one address and return the same status strings as verify_emails."""
+        if not is_valid_syntax(email):
+            return 'Invalid syntax'
+
+        domain = email.split('@')[1]
+        if domain.endswith(RESERVED_TLDS):
+            return 'Invalid domain'
+
+        stored = await asyncio.to_thread(result_store.lookup, email)
+        if stored:
+            return status_for_result(stored['outcome'], stored['reason'])
+
+        # Pace against the mail server before the clock starts, so waiting isn't a timeout
+        paced = await self._wait_for_probe_turn(domain)
+        try:
+            return await asyncio.wait_for(self._check_deliverable(email, domain, paced), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"SMTP verification timed out for {email}")
+            self._record_result(email, OUTCOME_TIMEOUT, reason='SMTP verification timeout')
+            return 'SMTP verification timeout'
+        except Exception as e:
+            logger.error(f"Unexpected error during verification of {email}: {str(e)}")
+            return f'Error: {str(e)}'
+
+    async def _wait_for_probe_turn(self, domain: str) -> bool:
+        """Async version of email_verification_tool.wait_for_probe_turn."""
+        if domain.lower() in MAILRU_DOMAINS or domain.lower() in YANDEX_DOMAINS:
+            return False
+        try:
+            mx_record = (await async_resolve_mx(domain))[0]
+        except Exception:
+            # _check_deliverable reports the failed lookup
+            return False
+        if await self.is_catch_all_domain(domain, mx_record):
+            return False
+        await self._wait_for_token(mx_record)
+        return True
+
+    async def _check_deliverable(self, email: str, domain: str, paced: bool = False) -> str:
+        if not await async_has_mx_record(domain):
+            return 'Invalid domain (no mail server)'
+
+        probe = await self.probe_email(email, paced)
+        logger.info(f"Email {email}: {probe['outcome']} ({probe['reason']})")
+        self._record_result(email, probe['outcome'], probe['smtp_code'], probe['reason'], probe['mx_host'])
+        return status_for_result(probe['outcome'], probe['reason'])
+
+    async def verify_email(self, email: str, timeout: float = 30) -> bool:
+        """Async version of email_verification_tool.verify_email."""
+        if not email:
+            return False
+        return await self.check_email(email, timeout) == 'Valid email'
+
+    async def verify_emails(self, emails: Iterable[str], timeout_per_email: float = 30) -> List[Tuple[str, str]]:
+        """Async version of email_verification_tool.verify_emails; keeps input order."""
+        indexed = ((i, email) for i, email in enumerate(emails) if email)
+        results: Dict[int, Tuple[str, str]] = {}
+
+        async def worker():
+            for i, email in indexed:
+                results[i] = (email, await self.check_email(email, timeout_per_email))
+
+        await self._run_workers(worker)
+        return [results[i] for i in sorted(results)]
+
+    async def process_name_entries(self, entries: Iterable[Tuple[str, str, str]],
+                                   email_variations_func,
+                                   timeout_per_email: float = 30,
+                                   stop_on_first_valid: bool = True) -> List[Dict[str, Any]]:
+        """Async version of email_verification_tool.process_name_entries.
+
+        Returns one result per row, in row order; rows without a valid email
+        have valid_email '' and a status saying why.
+        """
+        indexed = enumerate(entries)
+        results: Dict[int, Dict[str, Any]] = {}
+
+        async def worker():
+            for i, (first_name, last_name, domain) in indexed:
+                if not domain:
+                    results[i] = entry_result(first_name, last_name, domain, NO_DOMAIN_STATUS)
+                    continue
+
+                valid_emails = []
+                last_status = ''
+                for email in email_variations_func(first_name, last_name, domain):
+                    last_status = await self.check_email(email, timeout_per_email)
+                    if 'Valid' in last_status:
+                        valid_emails.append((email, last_status))
+                        if stop_on_first_valid:
+                            break
+
+                if valid_emails:
+                    valid_emails.sort(key=lambda x: 0 if 'Valid email' in x[1] else 1)
+                    best_email, status = valid_emails[0]
+                    results[i] = entry_result(first_name, last_name, domain, status, best_email)
+                else:
+                    logger.warning(f"No valid emails found for {first_name} {last_name} at {domain}")
+                    # Say why there's no answer (accept-all, no mail server, timed out ...)
+                    if not last_status or last_status.startswith('Invalid email'):
+                        last_status = NO_VALID_EMAIL_STATUS
+                    results[i] = entry_result(first_name, last_name, domain, last_status)
+
+        await self._run_workers(worker)
+        return [results[i] for i in sorted(results)]
+
+    async def _run_workers(self, worker):
+        # A fixed set of workers share one iterator, so pending work is never materialised
+        workers = [asyncio.ensure_future(worker()) for _ in range(self.max_in_flight)]
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            for task in workers:
+                task.cancel()
+            self.pool.close_all()
+            await self.flush_results()
+
+
+async def verify_emails_async(emails: Iterable[str], timeout_per_email: float = 30,
+                              max_in_flight: int = ASYNC_MAX_IN_FLIGHT) -> List[Tuple[str, str]]:
+    """Verify a list of emails concurrently; see email_verification_tool.verify_emails."""
+    verifier = AsyncVerifier(max_in_flight=max_in_flight)
+    return await verifier.verify_emails(emails, timeout_per_email=timeout_per_email)
+
+
+async def process_name_entries_async(entries: Iterable[Tuple[str, str, str]],
+                                     email_variations_func,
+                                     timeout_per_email: float = 30,
+                                     stop_on_first_valid: bool = True,
+                                     max_in_flight: int = ASYNC_MAX_IN_FLIGHT) -> List[Dict[str, Any]]:
+    """Process name entries concurrently; see email_verification_tool.process_name_entries."""
+    verifier = AsyncVerifier(max_in_flight=max_in_flight)
+    return await verifier.process_name_entries(entries, email_variations_func,
+                                               timeout_per_email=timeout_per_email,
+                                               stop_on_first_valid=stop_on_first_valid)
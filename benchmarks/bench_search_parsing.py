@@ -0,0 +1,63 @@
+"""Benchmark search result parsing on saved Google/Yandex result pages.
+
+Usage:
+    python benchmarks/bench_search_parsing.py [iterations]
+
+Parses every fixture in benchmarks/fixtures with the single-pass extractor
+and each available BeautifulSoup tree builder, and prints the average parse
+time per page, the number of relevant domain mentions and the domain that
+would be picked for the company.
+"""
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import domain_finder  # noqa: E402
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+# Fixture file name (engine_slug.html) -> company that was searched for
+COMPANIES = {
+    'gazprom_neft': 'Газпром нефть',
+    'romashka': 'Ромашка',
+}
+
+
+def available_parsers():
+    # None is the single-pass extractor; the rest are BeautifulSoup tree builders
+    parsers = [None, 'html.parser']
+    try:
+        import lxml  # noqa: F401
+        parsers.append('lxml')
+    except ImportError:
+        pass
+    return parsers
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    logging.disable(logging.INFO)
+
+    fixtures = sorted(name for name in os.listdir(FIXTURES_DIR) if name.endswith('.html'))
+    print(f"{'fixture':<28} {'parser':<12} {'ms/page':>8}  domains  picked")
+    for parser in available_parsers():
+        for name in fixtures:
+            engine, slug = name[:-len('.html')].split('_', 1)
+            company_name = COMPANIES[slug]
+            with open(os.path.join(FIXTURES_DIR, name), encoding='utf-8') as f:
+                html = f.read()
+
+            start = time.perf_counter()
+            for _ in range(iterations):
+                domains = domain_finder.parse_search_results(html, engine, company_name, parser=parser)
+            elapsed_ms = (time.perf_counter() - start) / iterations * 1000
+
+            picked = domain_finder.pick_most_likely_domain(company_name, domains)
+            print(f"{name:<28} {parser or 'single-pass':<12} {elapsed_ms:>8.1f}  {len(domains):>7}  {picked}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""Benchmark the in-house transliterator against the `transliterate` package.
+
+Usage:
+    python benchmarks/bench_transliteration.py [names]
+
+Builds a list of Russian first names and surnames (100,000 by default, with
+repeats the way real sheets have them) and times:
+
+- `transliterate.translit` (one spelling), if the package is installed
+- transliteration.transliterate (the same legacy spelling)
+- every standard at once, bypassing the cache
+- transliteration.transliteration_variants with a cold cache (every standard)
+- transliteration.transliteration_variants again with a warm cache
+
+and checks that the legacy spelling matches the package on every name
+(apart from the package's apostrophe for ъ/ь).
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import transliteration  # noqa: E402
+
+FIRST_NAMES = ['Александр', 'Алексей', 'Анастасия', 'Андрей', 'Анна', 'Артём', 'Дарья', 'Дмитрий',
+               'Екатерина', 'Елена', 'Иван', 'Ирина', 'Кирилл', 'Ксения', 'Максим', 'Мария',
+               'Михаил', 'Наталья', 'Никита', 'Ольга', 'Павел', 'Сергей', 'Татьяна', 'Юлия',
+               'Юрий', 'Яна', 'Фёдор', 'Илья', 'Вячеслав', 'Людмила']
+SURNAME_STEMS = ['Иван', 'Петр', 'Сидор', 'Смирн', 'Кузнец', 'Попов', 'Соколов', 'Лебедев', 'Козл',
+                 'Новик', 'Морозов', 'Волк', 'Соловьёв', 'Васильев', 'Зайцев', 'Павлов', 'Семён',
+                 'Голубев', 'Виноградов', 'Богдан', 'Воробьёв', 'Фёдор', 'Михайлов', 'Беляев',
+                 'Тарас', 'Белоус', 'Комар', 'Орлов', 'Киселёв', 'Макаров', 'Андреев', 'Ковал',
+                 'Ильин', 'Гусев', 'Титов', 'Кузьмин', 'Кудрявцев', 'Баранов', 'Куликов', 'Алексеев',
+                 'Степанов', 'Яковлев', 'Сорокин', 'Сергеев', 'Романов', 'Захаров', 'Борисов', 'Щукин',
+                 'Хрущ', 'Шевчен', 'Объедк', 'Мельнич', 'Достоев', 'Троц', 'Жук', 'Цвет', 'Чернышёв']
+SURNAME_ENDINGS = ['ов', 'ова', 'ев', 'ин', 'ина', 'ский', 'ская', 'ко', 'ук', 'юк', 'ич', '', 'ой', 'ый']
+
+
+def make_names(count: int):
+    rng = random.Random(42)
+    names = []
+    for _ in range(count):
+        if rng.random() < 0.3:
+            names.append(rng.choice(FIRST_NAMES))
+        else:
+            names.append(rng.choice(SURNAME_STEMS) + rng.choice(SURNAME_ENDINGS))
+    return names
+
+
+def timed(label: str, func, names):
+    start = time.perf_counter()
+    results = [func(name) for name in names]
+    elapsed = time.perf_counter() - start
+    print(f"{label:<44} {elapsed * 1000:>9.1f} ms  {elapsed / len(names) * 1e6:>7.2f} µs/name")
+    return results
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    names = make_names(count)
+    print(f"{count} names, {len(set(names))} distinct\n")
+
+    package_results = None
+    try:
+        from transliterate import translit
+        package_results = timed("transliterate.translit", lambda name: translit(name, 'ru', reversed=True).lower(),
+                                names)
+    except ImportError:
+        print("transliterate package not installed, skipping it")
+
+    legacy_results = timed("transliteration.transliterate (legacy)",
+                           lambda name: transliteration.transliterate(name, 'legacy'), names)
+    timed("all standards, no cache", transliteration.transliteration_variants.__wrapped__, names)
+    transliteration.transliteration_variants.cache_clear()
+    timed("transliteration_variants, cold cache", transliteration.transliteration_variants, names)
+    timed("transliteration_variants, warm cache", transliteration.transliteration_variants, names)
+
+    if package_results is not None:
+        # The package writes ъ/ь as an apostrophe, which the legacy scheme drops on purpose
+        mismatches = [(name, expected, got) for name, expected, got in zip(names, package_results, legacy_results)
+                      if expected.replace("'", '') != got]
+        print(f"\nLegacy spelling matches the package on {count - len(mismatches)}/{count} names")
+        for name, expected, got in mismatches[:10]:
+            print(f"  {name}: {expected} != {got}")
+    print(f"Cache: {transliteration.get_cache_stats()}")
+
+
+if __name__ == '__main__':
+    main()
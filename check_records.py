@@ -0,0 +1,156 @@
+import threading
+from enum import IntEnum
+from typing import Any, Dict, Iterable, List, Optional
+
+import russian_email_generator
+from result_store import (
+    OUTCOME_ACCEPT_ALL,
+    OUTCOME_AMBIGUOUS,
+    OUTCOME_ERROR,
+    OUTCOME_GREYLISTED,
+    OUTCOME_INVALID,
+    OUTCOME_LIKELY_VALID,
+    OUTCOME_TIMEOUT,
+    OUTCOME_VALID,
+)
+
+# Pattern number for addresses that don't follow a known pattern
+UNKNOWN_PATTERN = 255
+PATTERN_NUMBERS = {pattern: number for number, pattern in enumerate(russian_email_generator.PATTERN_IDS)}
+
+
+class Outcome(IntEnum):
+    """Outcome of one probed address, small enough to store per candidate."""
+    UNKNOWN = 0
+    VALID = 1
+    INVALID = 2
+    AMBIGUOUS = 3
+    TIMEOUT = 4
+    ACCEPT_ALL = 5
+    ERROR = 6
+    GREYLISTED = 7
+    LIKELY_VALID = 8
+
+    @classmethod
+    def from_name(cls, name: Optional[str], is_valid: bool = False) -> 'Outcome':
+        """Outcome for a result_store outcome string, falling back to is_valid."""
+        if name in OUTCOME_BY_NAME:
+            return OUTCOME_BY_NAME[name]
+        return cls.VALID if is_valid else cls.INVALID
+
+
+OUTCOME_BY_NAME = {
+    OUTCOME_VALID: Outcome.VALID,
+    OUTCOME_INVALID: Outcome.INVALID,
+    OUTCOME_AMBIGUOUS: Outcome.AMBIGUOUS,
+    OUTCOME_TIMEOUT: Outcome.TIMEOUT,
+    OUTCOME_ACCEPT_ALL: Outcome.ACCEPT_ALL,
+    OUTCOME_ERROR: Outcome.ERROR,
+    OUTCOME_GREYLISTED: Outcome.GREYLISTED,
+    OUTCOME_LIKELY_VALID: Outcome.LIKELY_VALID,
+}
+
+# What the results pages show for each outcome
+OUTCOME_LABELS = {
+    Outcome.UNKNOWN: 'Not checked',
+    Outcome.VALID: 'Valid email',
+    Outcome.INVALID: 'Invalid email',
+    Outcome.AMBIGUOUS: 'Could not verify',
+    Outcome.TIMEOUT: 'SMTP verification timeout',
+    Outcome.ACCEPT_ALL: 'Accept-all/unverifiable',
+    Outcome.ERROR: 'Verification error',
+    Outcome.GREYLISTED: 'Greylisted, retry later',
+    Outcome.LIKELY_VALID: 'Likely valid (not SMTP-confirmed)',
+}
+
+
+class DomainTable:
+    """Interns domains as small integer IDs, so a record carries an int instead of a string."""
+
+    def __init__(self):
+        self._ids: Dict[str, int] = {}
+        self._names: List[str] = []
+        self._lock = threading.Lock()
+
+    def id(self, domain: str) -> int:
+        domain_id = self._ids.get(domain)
+        if domain_id is not None:
+            return domain_id
+        with self._lock:
+            if domain not in self._ids:
+                self._ids[domain] = len(self._names)
+                self._names.append(domain)
+            return self._ids[domain]
+
+    def name(self, domain_id: int) -> str:
+        return self._names[domain_id]
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+
+# Shared by every job in the process
+domain_table = DomainTable()
+
+
+class CheckRecord:
+    """One probed address: local part, interned domain ID, pattern number and outcome.
+
+    Replaces the per-address {'email': ..., 'is_valid': ...} dicts. Stored
+    server-side only: in the job store as [pattern, local_part, outcome]
+    lists under the row's domain, and rebuilt from there for the results pages.
+    """
+
+    __slots__ = ('local_part', 'domain_id', 'pattern', 'outcome')
+
+    def __init__(self, local_part: str, domain_id: int, pattern: int = UNKNOWN_PATTERN,
+                 outcome: Outcome = Outcome.UNKNOWN):
+        self.local_part = local_part
+        self.domain_id = domain_id
+        self.pattern = pattern
+        self.outcome = outcome
+
+    @classmethod
+    def create(cls, email: str, outcome: Outcome, pattern: Optional[str] = None) -> 'CheckRecord':
+        local_part, _, domain = email.rpartition('@')
+        return cls(local_part, domain_table.id(domain), pattern_number(pattern), outcome)
+
+    @property
+    def domain(self) -> str:
+        return domain_table.name(self.domain_id)
+
+    @property
+    def email(self) -> str:
+        return f"{self.local_part}@{self.domain}"
+
+    @property
+    def pattern_id(self) -> Optional[str]:
+        if self.pattern < len(russian_email_generator.PATTERN_IDS):
+            return russian_email_generator.PATTERN_IDS[self.pattern]
+        return None
+
+    @property
+    def is_valid(self) -> bool:
+        return self.outcome in (Outcome.VALID, Outcome.LIKELY_VALID)
+
+    @property
+    def status(self) -> str:
+        return OUTCOME_LABELS[self.outcome]
+
+    def __repr__(self) -> str:
+        return f"CheckRecord({self.email!r}, {self.outcome.name})"
+
+
+def pattern_number(pattern: Optional[str]) -> int:
+    return PATTERN_NUMBERS.get(pattern, UNKNOWN_PATTERN)
+
+
+def encode_records(records: Iterable[CheckRecord]) -> List[List[Any]]:
+    """Compact JSON-ready form of a row's records: [pattern, local_part, outcome] each."""
+    return [[record.pattern, record.local_part, int(record.outcome)] for record in records]
+
+
+def decode_records(items: Iterable[List[Any]], domain: str) -> List[CheckRecord]:
+    """Records back from encode_records for a row's domain."""
+    domain_id = domain_table.id(domain)
+    return [CheckRecord(local_part, domain_id, pattern, Outcome(outcome)) for pattern, local_part, outcome in items]
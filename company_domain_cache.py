@@ -0,0 +1,188 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import storage
+
+logger = logging.getLogger("company_domain_cache")
+
+# How long a searched company domain is trusted (seconds)
+COMPANY_DOMAIN_CACHE_TTL = int(os.environ.get('COMPANY_DOMAIN_CACHE_TTL', 30 * 24 * 3600))
+# Searches that found nothing are retried sooner
+COMPANY_DOMAIN_NEGATIVE_TTL = int(os.environ.get('COMPANY_DOMAIN_NEGATIVE_TTL', 24 * 3600))
+
+COMPANY_DOMAIN_SCHEMA = """
+CREATE TABLE IF NOT EXISTS company_domains (
+    company_key TEXT PRIMARY KEY,
+    company_name TEXT NOT NULL,
+    domain TEXT NOT NULL,
+    candidates TEXT NOT NULL,
+    checked_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS company_domain_overrides (
+    company_key TEXT PRIMARY KEY,
+    company_name TEXT NOT NULL,
+    domain TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+"""
+
+# Legal forms dropped from company names, long forms first so they win over their abbreviations
+LEGAL_FORMS = [
+    'общество с ограниченной ответственностью',
+    'публичное акционерное общество',
+    'непубличное акционерное общество',
+    'закрытое акционерное общество',
+    'открытое акционерное общество',
+    'акционерное общество',
+    'индивидуальный предприниматель',
+    'федеральное государственное унитарное предприятие',
+    'муниципальное унитарное предприятие',
+    'группа компаний',
+    'ооо', 'пао', 'нао', 'зао', 'оао', 'ао', 'ип', 'гк', 'фгуп', 'муп',
+    'llc', 'ltd', 'jsc', 'pjsc', 'inc', 'corp', 'gmbh',
+]
+LEGAL_FORM_PATTERN = re.compile(
+    r'(?<!\w)(?:' + '|'.join(re.escape(form) for form in LEGAL_FORMS) + r')(?!\w)\.?', re.IGNORECASE)
+QUOTES_AND_PUNCTUATION = re.compile(r'[«»"\'„“”‘’`,.()]')
+
+
+def strip_legal_form(company_name: str) -> str:
+    """Company name without quotes or legal form, e.g. 'ООО «Ромашка»' -> 'Ромашка'."""
+    name = LEGAL_FORM_PATTERN.sub(' ', company_name)
+    name = QUOTES_AND_PUNCTUATION.sub(' ', name)
+    return ' '.join(name.split())
+
+
+def normalize_company_name(company_name: str) -> str:
+    """Cache key for a company: lower case, no quotes or legal form.
+
+    'ПАО «Газпром нефть»', 'Газпром Нефть' and 'газпром нефть, ПАО' all map to
+    'газпром нефть'.
+    """
+    return strip_legal_form(company_name.lower().replace('ё', 'е'))
+
+
+class CompanyDomainCache:
+    """Durable company name -> domain cache consulted before any web search.
+
+    Each entry keeps the chosen domain, every candidate domain seen in the
+    search results with how often it came up, and when it was searched.
+    Entries expire after COMPANY_DOMAIN_CACHE_TTL (COMPANY_DOMAIN_NEGATIVE_TTL
+    when nothing was found). Manual overrides always win and never expire.
+    """
+
+    def __init__(self, ttl: int = COMPANY_DOMAIN_CACHE_TTL, negative_ttl: int = COMPANY_DOMAIN_NEGATIVE_TTL):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _database(self):
+        try:
+            database = storage.get_database()
+            database.ensure_schema('company_domains', COMPANY_DOMAIN_SCHEMA)
+            return database
+        except Exception as e:
+            logger.warning(f"Company domain cache unavailable: {str(e)}")
+            return None
+
+    def get(self, company_name: str) -> Optional[str]:
+        """Return the domain for a company ('' if a recent search found none), or None on a miss."""
+        key = normalize_company_name(company_name)
+        database = self._database()
+        if database is None or not key:
+            return None
+
+        row = database.query_one("SELECT domain FROM company_domain_overrides WHERE company_key = ?", (key,))
+        if row:
+            self._count(hit=True)
+            return row[0]
+
+        row = database.query_one("SELECT domain, checked_at FROM company_domains WHERE company_key = ?", (key,))
+        if row:
+            domain, checked_at = row
+            ttl = self.ttl if domain else self.negative_ttl
+            if checked_at + ttl > time.time():
+                self._count(hit=True)
+                return domain
+        self._count(hit=False)
+        return None
+
+    def get_entry(self, company_name: str) -> Optional[Dict[str, Any]]:
+        """Return the stored search result for a company, with its candidate counts."""
+        database = self._database()
+        if database is None:
+            return None
+        row = database.query_one(
+            "SELECT company_name, domain, candidates, checked_at FROM company_domains WHERE company_key = ?",
+            (normalize_company_name(company_name),))
+        if not row:
+            return None
+        return {
+            'company_name': row[0],
+            'domain': row[1],
+            'candidates': json.loads(row[2]),
+            'checked_at': row[3]
+        }
+
+    def put(self, company_name: str, domain: str, candidates: Dict[str, int] = None):
+        """Store the outcome of a search: the chosen domain and {candidate: count}."""
+        key = normalize_company_name(company_name)
+        database = self._database()
+        if database is None or not key:
+            return
+        try:
+            database.execute(
+                "INSERT OR REPLACE INTO company_domains (company_key, company_name, domain, candidates, checked_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, company_name, domain or '', json.dumps(candidates or {}, ensure_ascii=False), time.time()))
+        except Exception as e:
+            logger.error(f"Error caching domain for {company_name}: {str(e)}")
+
+    def set_override(self, company_name: str, domain: str):
+        """Pin a company to a domain, e.g. when search keeps picking the wrong site."""
+        database = self._database()
+        if database is None:
+            return
+        database.execute(
+            "INSERT OR REPLACE INTO company_domain_overrides (company_key, company_name, domain, created_at) "
+            "VALUES (?, ?, ?, ?)",
+            (normalize_company_name(company_name), company_name, domain.lower(), time.time()))
+        logger.info(f"Override set: {company_name} -> {domain}")
+
+    def remove_override(self, company_name: str):
+        database = self._database()
+        if database is None:
+            return
+        database.execute("DELETE FROM company_domain_overrides WHERE company_key = ?",
+                         (normalize_company_name(company_name),))
+        logger.info(f"Override removed: {company_name}")
+
+    def list_overrides(self) -> List[Dict[str, Any]]:
+        """Every pinned company, oldest first."""
+        database = self._database()
+        if database is None:
+            return []
+        rows = database.execute(
+            "SELECT company_name, domain, created_at FROM company_domain_overrides ORDER BY created_at")
+        return [{'company_name': row[0], 'domain': row[1], 'created_at': row[2]} for row in rows]
+
+    def _count(self, hit: bool):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses}
+
+
+company_domain_cache = CompanyDomainCache()
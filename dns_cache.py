@@ -0,0 +1,186 @@
+import dns.resolver
+import dns.exception
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Tuple, Any
+
+logger = logging.getLogger("dns_cache")
+
+# Cache settings (seconds)
+DNS_NEGATIVE_TTL = int(os.environ.get('DNS_NEGATIVE_TTL', 300))
+DNS_MIN_TTL = int(os.environ.get('DNS_MIN_TTL', 30))
+DNS_MAX_TTL = int(os.environ.get('DNS_MAX_TTL', 3600))
+DNS_LIFETIME = 5
+
+# Answers that are definitive and therefore safe to cache as negative results
+NEGATIVE_EXCEPTIONS = (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer)
+
+
+class _PendingLookup:
+    """A lookup in flight that other threads asking for the same key wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.records = None
+        self.error = None
+
+
+class DNSCache:
+    """Process-wide, TTL-aware cache for MX and A lookups.
+
+    Positive answers are kept for their record TTL (clamped to min/max), NXDOMAIN
+    and NoAnswer are kept for `negative_ttl`, and concurrent lookups of the same
+    (domain, type) share a single query.
+    """
+
+    def __init__(self, negative_ttl: int = DNS_NEGATIVE_TTL, min_ttl: int = DNS_MIN_TTL,
+                 max_ttl: int = DNS_MAX_TTL, lifetime: float = DNS_LIFETIME):
+        self.negative_ttl = negative_ttl
+        self.min_ttl = min_ttl
+        self.max_ttl = max_ttl
+        self.lifetime = lifetime
+        # (domain, rdtype) -> (expires_at, records, negative exception class or None)
+        self._entries: Dict[Tuple[str, str], Tuple[float, List[str], Any]] = {}
+        self._pending: Dict[Tuple[str, str], _PendingLookup] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.negative_hits = 0
+        self.coalesced = 0
+
+    def resolve(self, domain: str, rdtype: str) -> List[str]:
+        """Resolve a record type for a domain, raising NXDOMAIN/NoAnswer like dnspython.
+
+        Returns:
+            MX: exchange host names ordered by preference
+            A: IP addresses
+        """
+        key = (domain.lower().rstrip('.'), rdtype.upper())
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > time.time():
+                expires_at, records, negative = entry
+                if negative:
+                    self.negative_hits += 1
+                    raise negative()
+                self.hits += 1
+                return list(records)
+
+            pending = self._pending.get(key)
+            if pending:
+                self.coalesced += 1
+                owner = False
+            else:
+                self.misses += 1
+                pending = _PendingLookup()
+                self._pending[key] = pending
+                owner = True
+
+        if not owner:
+            pending.done.wait()
+            if pending.error is not None:
+                raise pending.error
+            return list(pending.records)
+
+        try:
+            records, ttl = self._query(*key)
+            pending.records = records
+            self._store(key, ttl, records, None)
+            return list(records)
+        except NEGATIVE_EXCEPTIONS as e:
+            pending.error = e
+            self._store(key, self.negative_ttl, [], type(e))
+            raise
+        except Exception as e:
+            # Timeouts and server failures are transient, don't cache them
+            pending.error = e
+            raise
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+            pending.done.set()
+
+    def get_cached(self, domain: str, rdtype: str):
+        """Return cached records without querying, or None on a miss.
+
+        Raises the cached NXDOMAIN/NoAnswer for negative entries. Used by the
+        asyncio verifier, which does its own non-blocking queries.
+        """
+        key = (domain.lower().rstrip('.'), rdtype.upper())
+        with self._lock:
+            entry = self._entries.get(key)
+            if not entry or entry[0] <= time.time():
+                self.misses += 1
+                return None
+            expires_at, records, negative = entry
+            if negative:
+                self.negative_hits += 1
+                raise negative()
+            self.hits += 1
+            return list(records)
+
+    def put(self, domain: str, rdtype: str, answer=None, negative=None):
+        """Store a dnspython answer, or a negative result given its exception class."""
+        key = (domain.lower().rstrip('.'), rdtype.upper())
+        if negative is not None:
+            self._store(key, self.negative_ttl, [], negative)
+            return []
+        records, ttl = self._parse_answer(answer, key[1])
+        self._store(key, ttl, records, None)
+        return records
+
+    def _query(self, domain: str, rdtype: str) -> Tuple[List[str], int]:
+        logger.debug("DNS cache miss, querying %s for %s", rdtype, domain)
+        answer = dns.resolver.resolve(domain, rdtype, lifetime=self.lifetime)
+        return self._parse_answer(answer, rdtype)
+
+    def _parse_answer(self, answer, rdtype: str) -> Tuple[List[str], int]:
+        ttl = answer.rrset.ttl if answer.rrset is not None else self.min_ttl
+        if rdtype == 'MX':
+            ordered = sorted(answer, key=lambda r: r.preference)
+            records = [str(r.exchange).rstrip('.') for r in ordered]
+        else:
+            records = [r.to_text() for r in answer]
+        return records, ttl
+
+    def _store(self, key: Tuple[str, str], ttl: int, records: List[str], negative):
+        ttl = min(max(ttl, self.min_ttl), self.max_ttl)
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, records, negative)
+
+    def get_stats(self) -> Dict[str, int]:
+        """Return hit/miss counters for the cache."""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'negative_hits': self.negative_hits,
+                'coalesced': self.coalesced,
+                'entries': len(self._entries)
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.negative_hits = self.coalesced = 0
+
+
+# Cache shared by the whole process
+resolver_cache = DNSCache()
+
+
+def resolve_mx(domain: str) -> List[str]:
+    """Return the MX hosts for a domain, most preferred first."""
+    return resolver_cache.resolve(domain, 'MX')
+
+
+def resolve_a(domain: str) -> List[str]:
+    """Return the A records for a domain."""
+    return resolver_cache.resolve(domain, 'A')
+
+
+def get_stats() -> Dict[str, int]:
+    return resolver_cache.get_stats()
@@ -2,13 +2,58 @@ import requests
 from bs4 import BeautifulSoup
 import re
 import logging
+import os
 import time
 import random
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from html.parser import HTMLParser
+from typing import Optional
 from urllib.parse import urlparse
 
+from email_verification_tool import has_mx_record
+from company_domain_cache import company_domain_cache, normalize_company_name, strip_legal_form
+from rate_limiter import TokenBucket
+
 # Configure logging
 logger = logging.getLogger("domain_finder")
 
+# Something that looks like a domain in a URL or in visible text, e.g. example.com
+DOMAIN_PATTERN = re.compile(r'(?:[a-zA-Z0-9][-a-zA-Z0-9]*\.)+[a-zA-Z0-9][-a-zA-Z0-9]+')
+GOOGLE_REDIRECT_PATTERN = re.compile(r'[?&](?:url|q)=([^&]+)')
+YANDEX_REDIRECT_PATTERN = re.compile(r'goto/([^&?]+)')
+
+# Links and text pointing at these are the search engine's own, not results
+SEARCH_ENGINE_MARKERS = ('google.', 'yandex.', 'bing.', 'yahoo.')
+SKIPPED_LINK_MARKERS = SEARCH_ENGINE_MARKERS + ('mail.ru', 'vk.com')
+
+RU_TO_LAT = {
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'e',
+    'ж': 'zh', 'з': 'z', 'и': 'i', 'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm',
+    'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u',
+    'ф': 'f', 'х': 'h', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'sch',
+    'ъ': '', 'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu', 'я': 'ya'
+}
+
+# Domains that show up in search results but are never a company's own site
+INVALID_DOMAINS = frozenset([
+    # Search engines and their domains
+    'google.com', 'yandex.ru', 'yandex.com', 'bing.com', 'yahoo.com', 'baidu.com',
+    'duckduckgo.com', 'mail.ru', 'rambler.ru', 'ya.ru',
+    # Common generic domains
+    'example.com', 'domain.com', 'website.com', 'site.com',
+    # Social media
+    'facebook.com', 'twitter.com', 'instagram.com', 'vk.com', 'youtube.com',
+    'linkedin.com', 'pinterest.com', 'reddit.com', 'telegram.org',
+    # Common file hosting
+    'dropbox.com', 'drive.google.com', 'docs.google.com', 'cloud.mail.ru',
+    # Common email providers
+    'gmail.com', 'outlook.com', 'hotmail.com', 'mail.ru', 'yandex.ru',
+    # Common Russian sites that aren't company domains
+    'rbc.ru', 'lenta.ru', 'ria.ru', 'gazeta.ru', 'kommersant.ru',
+    'interfax.ru', 'tass.ru', 'vedomosti.ru', 'iz.ru'
+])
+
 def extract_domain_from_url(url: str) -> str:
     """Extract the domain from a URL."""
     try:
@@ -17,24 +62,24 @@ def extract_domain_from_url(url: str) -> str:
             url = 'http:' + url
         elif not url.startswith(('http://', 'https://')):
             # Check if it's a redirect URL from search engines
-            if 'google.com/url' in url:
+            if 'google.com/url' in url or url.startswith('/url?'):
                 # Extract the actual URL from Google redirect
-                match = re.search(r'url=([^&]+)', url)
+                match = GOOGLE_REDIRECT_PATTERN.search(url)
                 if match:
                     url = match.group(1)
                     url = requests.utils.unquote(url)
             elif 'yandex.ru' in url and '/goto/' in url:
                 # Extract the actual URL from Yandex redirect
-                match = re.search(r'goto/([^&?]+)', url)
+                match = YANDEX_REDIRECT_PATTERN.search(url)
                 if match:
                     url = match.group(1)
                     url = requests.utils.unquote(url)
             else:
                 # Try to extract domain-like pattern directly from text
-                domain_pattern = r'([a-zA-Z0-9][-a-zA-Z0-9]*\.)+[a-zA-Z0-9][-a-zA-Z0-9]+'
-                match = re.search(domain_pattern, url)
+                match = DOMAIN_PATTERN.search(url)
                 if match:
-                    return match.group(0)
+                    domain = match.group(0)
+                    return domain[4:] if domain.startswith('www.') else domain
                 
                 # If no domain pattern found, try to make it a proper URL
                 url = 'http://' + url
@@ -77,48 +122,68 @@ def is_valid_domain(domain: str) -> bool:
         return False
         
     # Check for common invalid domains and search engines
-    invalid_domains = [
-        # Search engines and their domains
-        'google.com', 'yandex.ru', 'yandex.com', 'bing.com', 'yahoo.com', 'baidu.com',
-        'duckduckgo.com', 'mail.ru', 'rambler.ru', 'ya.ru',
-        # Common generic domains
-        'example.com', 'domain.com', 'website.com', 'site.com',
-        # Social media
-        'facebook.com', 'twitter.com', 'instagram.com', 'vk.com', 'youtube.com',
-        'linkedin.com', 'pinterest.com', 'reddit.com', 'telegram.org',
-        # Common file hosting
-        'dropbox.com', 'drive.google.com', 'docs.google.com', 'cloud.mail.ru',
-        # Common email providers
-        'gmail.com', 'outlook.com', 'hotmail.com', 'mail.ru', 'yandex.ru',
-        # Common Russian sites that aren't company domains
-        'rbc.ru', 'lenta.ru', 'ria.ru', 'gazeta.ru', 'kommersant.ru',
-        'interfax.ru', 'tass.ru', 'vedomosti.ru', 'iz.ru'
-    ]
-    
-    if domain.lower() in invalid_domains:
+    if domain.lower() in INVALID_DOMAINS:
         return False
         
     return True
 
-def search_company_domain(company_name: str, lang: str = 'ru') -> str:
-    """Search for a company's domain name using web search."""
-    logger.info(f"Searching for domain of company: {company_name}")
-    
-    # Prepare search query
-    if lang == 'ru':
-        query = f"компания {company_name} официальный сайт"
-    else:
-        query = f"company {company_name} official website"
-    
-    # Add some randomization to avoid being blocked
-    user_agents = [
-        'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-        'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/14.1.1 Safari/605.1.15',
-        'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:89.0) Gecko/20100101 Firefox/89.0'
-    ]
+# Search engines queried for each company, with their result page URL
+SEARCH_ENGINES = {
+    'google': "https://www.google.com/search?q={query}",
+    'yandex': "https://yandex.ru/search/?text={query}",
+}
+
+# Mail server pre-check run on every domain before any candidates are generated
+MX_PRECHECK_ENABLED = os.environ.get('MX_PRECHECK_ENABLED', 'true').lower() == 'true'
+MX_PRECHECK_WORKERS = int(os.environ.get('MX_PRECHECK_WORKERS', 16))
+# TLDs tried, in order, for a company whose domain search found nothing
+FALLBACK_TLDS = ['ru', 'com', 'рф']
+CYRILLIC_PATTERN = re.compile('[а-яё]')
+LATIN_LABEL_INVALID_CHARS = re.compile(r'[^a-z0-9-]')
+
+# Concurrent search requests while discovering domains for a sheet
+DOMAIN_SEARCH_WORKERS = int(os.environ.get('DOMAIN_SEARCH_WORKERS', 8))
+# Requests per second sent to each search engine (adapts down on 429/403)
+SEARCH_ENGINE_RATE = float(os.environ.get('SEARCH_ENGINE_RATE', 0.5))
+SEARCH_ENGINE_BURST = int(os.environ.get('SEARCH_ENGINE_BURST', 2))
+
+USER_AGENTS = [
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/14.1.1 Safari/605.1.15',
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:89.0) Gecko/20100101 Firefox/89.0'
+]
+
+
+def _build_http_session() -> requests.Session:
+    """Session with a connection pool big enough for all search workers."""
+    http = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=len(SEARCH_ENGINES),
+                                            pool_maxsize=max(DOMAIN_SEARCH_WORKERS, 2))
+    http.mount('https://', adapter)
+    http.mount('http://', adapter)
+    return http
+
+
+# Keep-alive connections to the search engines, shared by every search
+http_session = _build_http_session()
+
+# One token bucket per search engine; a 429 or 403 halves that engine's rate
+engine_limits = {
+    engine: TokenBucket(SEARCH_ENGINE_RATE, SEARCH_ENGINE_BURST,
+                        min_rate=SEARCH_ENGINE_RATE / 16, max_rate=SEARCH_ENGINE_RATE)
+    for engine in SEARCH_ENGINES
+}
+
+
+def fetch_search_results(engine: str, query: str) -> str:
+    """Fetch a search engine's result page, waiting for that engine's rate limit.
     
+    Returns:
+        str: The page HTML, or an empty string if the request failed
+    """
+    search_url = SEARCH_ENGINES[engine].format(query=query.replace(' ', '+'))
     headers = {
-        'User-Agent': random.choice(user_agents),
+        'User-Agent': random.choice(USER_AGENTS),
         'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
         'Accept-Language': 'en-US,en;q=0.5',
         'Referer': 'https://www.google.com/',
@@ -127,143 +192,267 @@ def search_company_domain(company_name: str, lang: str = 'ru') -> str:
         'Upgrade-Insecure-Requests': '1',
     }
     
-    # Try different search engines
-    search_urls = [
-        f"https://www.google.com/search?q={query.replace(' ', '+')}",
-        f"https://yandex.ru/search/?text={query.replace(' ', '+')}"
-    ]
+    bucket = engine_limits[engine]
+    delay = bucket.reserve()
+    if delay > 0:
+        time.sleep(delay)
+    
+    logger.info(f"Searching with URL: {search_url}")
+    response = http_session.get(search_url, headers=headers, timeout=10)
+    if response.status_code in (403, 429):
+        # Rate limited or shown a captcha, slow down for this engine
+        bucket.on_throttle()
+        logger.warning(f"{engine} answered {response.status_code}, rate now {bucket.rate:.2f}/s")
+        return ""
+    if response.status_code != 200:
+        return ""
+    bucket.on_success()
+    return response.text
+
+def transliterate_company_name(company_name: str) -> str:
+    """Company name without spaces in Latin letters, as it might appear in a domain."""
+    return ''.join(RU_TO_LAT.get(char, char) for char in company_name.lower().replace(' ', ''))
+
+def is_relevant_domain(domain: str, company_words: list, company_name_no_spaces: str,
+                       transliterated: str) -> bool:
+    """Check that a domain plausibly belongs to the company we searched for."""
+    domain_name = domain.lower().split('.')[0]
+    
+    # Skip domains that are too generic
+    if len(domain_name) <= 3:  # Skip very short domains
+        return False
+    
+    # Check if domain contains company name without spaces
+    if company_name_no_spaces in domain_name:
+        return True
+    
+    # Check if any word from company name is in domain
+    if any(len(word) >= 3 and word in domain_name for word in company_words):
+        return True
+    
+    # Check for transliteration (Russian to Latin)
+    return transliterated in domain_name
+
+class SearchResultExtractor(HTMLParser):
+    """Single-pass extractor for search result pages, without building a tree.
+    
+    Collects the same things as the BeautifulSoup path in collect_links_soup:
+    Yandex title/path/organic/green-URL elements, every link's href (minus the
+    search engine's own) and every visible text string, in that order.
+    """
+    
+    VOID_TAGS = frozenset(['area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input',
+                           'link', 'meta', 'param', 'source', 'track', 'wbr'])
+    RAW_TEXT_TAGS = frozenset(['script', 'style', 'template'])
+    
+    def __init__(self, engine: str):
+        super().__init__(convert_charrefs=True)
+        self.yandex = engine == 'yandex'
+        self.title_links = []
+        self.path_items = []
+        self.organic_urls = []
+        self.green_urls = []
+        self.hrefs = []
+        self.texts = []
+        # Open elements as (tag, href); text of Path-Item / greenurl elements is
+        # gathered into [stack depth, target list, text parts] until they close
+        self._stack = []
+        self._captures = []
+        self._raw_text = 0
+    
+    def handle_starttag(self, tag, attrs):
+        attributes = dict(attrs)
+        href = attributes.get('href')
+        if tag == 'a' and href:
+            self.hrefs.append(href)
+        
+        if self.yandex:
+            classes = (attributes.get('class') or '').split()
+            if 'OrganicTitleContentSpan' in classes and self._stack:
+                parent_tag, parent_href = self._stack[-1]
+                if parent_tag == 'a' and parent_href:
+                    self.title_links.append(parent_href)
+            if 'organic__url' in classes and href:
+                self.organic_urls.append(href)
+            if 'Path-Item' in classes:
+                self._captures.append([len(self._stack), self.path_items, []])
+            if 'typo_type_greenurl' in classes:
+                self._captures.append([len(self._stack), self.green_urls, []])
+        
+        if tag in self.VOID_TAGS:
+            return
+        if tag in self.RAW_TEXT_TAGS:
+            self._raw_text += 1
+        self._stack.append((tag, href))
+    
+    def handle_startendtag(self, tag, attrs):
+        # <a href="..."/> still counts as a link, but never opens an element
+        self.handle_starttag(tag, attrs)
+        if tag not in self.VOID_TAGS:
+            self.handle_endtag(tag)
+    
+    def handle_endtag(self, tag):
+        # Close up to the matching open tag; stray end tags are ignored
+        for depth in range(len(self._stack) - 1, -1, -1):
+            if self._stack[depth][0] == tag:
+                break
+        else:
+            return
+        for open_tag, _ in self._stack[depth:]:
+            if open_tag in self.RAW_TEXT_TAGS:
+                self._raw_text -= 1
+        del self._stack[depth:]
+        while self._captures and self._captures[-1][0] >= depth:
+            _, target, parts = self._captures.pop()
+            text = ''.join(parts)
+            if text and '.' in text:
+                target.append(text)
+    
+    def handle_data(self, data):
+        if self._raw_text:
+            return
+        for capture in self._captures:
+            capture[2].append(data)
+        text = data.strip()
+        if text:
+            self.texts.append(text)
+    
+    def links(self) -> list:
+        return self.title_links + self.path_items + self.organic_urls + self.green_urls + [
+            href for href in self.hrefs if not any(marker in href for marker in SKIPPED_LINK_MARKERS)]
+
+
+def collect_links_fast(html: str, engine: str) -> list:
+    """Links and domain-like text from a result page, via the single-pass extractor."""
+    extractor = SearchResultExtractor(engine)
+    extractor.feed(html)
+    extractor.close()
+    links = extractor.links()
+    links.extend(domain_mentions(extractor.texts))
+    return links
+
+def collect_links_soup(html: str, engine: str, parser: str = 'html.parser') -> list:
+    """Links and domain-like text from a result page, via a BeautifulSoup tree."""
+    soup = BeautifulSoup(html, parser)
+    
+    # Extract all links and visible URLs
+    links = []
+    
+    # For Yandex search results
+    if engine == 'yandex':
+        # Look for the visible URL text in search results
+        for url_element in soup.select('.OrganicTitleContentSpan'):
+            parent = url_element.parent
+            if parent and parent.name == 'a' and parent.get('href'):
+                links.append(parent.get('href'))
+        
+        # Also look for the green URL text that Yandex displays
+        for url_element in soup.select('.Path-Item'):
+            url_text = url_element.get_text()
+            if url_text and '.' in url_text:
+                links.append(url_text)
+        
+        # Look for organic URLs
+        for url_element in soup.select('.organic__url'):
+            if url_element.get('href'):
+                links.append(url_element.get('href'))
+        
+        # Look for visible domain text
+        for url_element in soup.select('.typo_type_greenurl'):
+            url_text = url_element.get_text()
+            if url_text and '.' in url_text:
+                links.append(url_text)
+    
+    # For all search engines, get regular links, minus the search engine's own
+    for a_tag in soup.find_all('a', href=True):
+        href = a_tag['href']
+        if not any(marker in href for marker in SKIPPED_LINK_MARKERS):
+            links.append(href)
     
+    # Also look for visible text that looks like a domain (e.g., example.com)
+    links.extend(domain_mentions(soup.stripped_strings))
+    return links
+
+def domain_mentions(texts) -> list:
+    """Domain-like strings in visible text, skipping the search engine's own."""
+    mentions = []
+    for text in texts:
+        if '.' in text and not any(marker in text.lower() for marker in SEARCH_ENGINE_MARKERS):
+            mentions.extend(match for match in DOMAIN_PATTERN.findall(text) if len(match) > 4)
+    return mentions
+
+def parse_search_results(html: str, engine: str, company_name: str, parser: str = None) -> list:
+    """Extract the domains relevant to a company from a search result page.
+    
+    Every occurrence counts, so the returned list may repeat a domain; the
+    most frequent one wins in pick_most_likely_domain.
+    
+    Args:
+        html: Result page HTML
+        engine: Key of SEARCH_ENGINES the page came from
+        company_name: Company that was searched for
+        parser: None for the single-pass extractor, or a BeautifulSoup tree
+            builder ('lxml', 'html.parser') to parse through a full tree
+    """
+    if parser:
+        links = collect_links_soup(html, engine, parser)
+    else:
+        links = collect_links_fast(html, engine)
+    
+    logger.debug("Collected %d links from %s results for %s", len(links), engine, company_name)
+    
+    # Work out the company name variants once per page, not once per link
+    # Words are also tried transliterated, so 'Газпром нефть' matches gazprom-neft.ru
+    company_words = company_name.lower().split()
+    company_words += [word for word in map(transliterate_company_name, company_words) if word not in company_words]
+    company_name_no_spaces = company_name.lower().replace(' ', '')
+    transliterated = transliterate_company_name(company_name)
+    
+    # The same domain shows up many times on a page; decide about each one once
+    verdicts = {}
     domains_found = []
+    for link in links:
+        # If the link is already a domain-like string
+        if '.' in link and '/' not in link and ' ' not in link:
+            domain = link.lower()
+        else:
+            domain = extract_domain_from_url(link)
+        if not domain:
+            continue
+        
+        relevant = verdicts.get(domain)
+        if relevant is None:
+            relevant = is_valid_domain(domain) and is_relevant_domain(
+                domain, company_words, company_name_no_spaces, transliterated)
+            verdicts[domain] = relevant
+            if relevant:
+                logger.debug("Found relevant domain: %s for company %s", domain, company_name)
+        if relevant:
+            domains_found.append(domain)
     
-    for search_url in search_urls:
-        try:
-            logger.info(f"Searching with URL: {search_url}")
-            response = requests.get(search_url, headers=headers, timeout=10)
-            
-            if response.status_code == 200:
-                soup = BeautifulSoup(response.text, 'html.parser')
-                
-                # Extract all links and visible URLs
-                links = []
-                
-                # For Yandex search results
-                if 'yandex.ru' in search_url:
-                    # Look for the visible URL text in search results
-                    for url_element in soup.select('.OrganicTitleContentSpan'):
-                        parent = url_element.parent
-                        if parent and parent.name == 'a' and parent.get('href'):
-                            links.append(parent.get('href'))
-                            logger.debug(f"Found Yandex title link: {parent.get('href')}")
-                    
-                    # Also look for the green URL text that Yandex displays
-                    for url_element in soup.select('.Path-Item'):
-                        url_text = url_element.get_text()
-                        if url_text and '.' in url_text:
-                            links.append(url_text)
-                            logger.debug(f"Found Yandex path item: {url_text}")
-                    
-                    # Look for organic URLs
-                    for url_element in soup.select('.organic__url'):
-                        if url_element.get('href'):
-                            links.append(url_element.get('href'))
-                            logger.debug(f"Found Yandex organic URL: {url_element.get('href')}")
-                    
-                    # Look for visible domain text
-                    for url_element in soup.select('.typo_type_greenurl'):
-                        url_text = url_element.get_text()
-                        if url_text and '.' in url_text:
-                            links.append(url_text)
-                            logger.debug(f"Found Yandex green URL: {url_text}")
-                
-                # For all search engines, get regular links
-                for a_tag in soup.find_all('a', href=True):
-                    href = a_tag['href']
-                    # Filter out search engine and common sites
-                    if any(se in href for se in ['google.', 'yandex.', 'bing.', 'yahoo.', 'mail.ru', 'vk.com']):
-                        continue
-                    links.append(href)
-                    logger.debug(f"Found regular link: {href}")
-                
-                # Also look for visible text that looks like a domain
-                for text in soup.stripped_strings:
-                    if '.' in text and not any(se in text.lower() for se in ['google.', 'yandex.', 'bing.', 'yahoo.']):
-                        # Check if it looks like a domain (e.g., example.com)
-                        domain_pattern = r'([a-zA-Z0-9][-a-zA-Z0-9]*\.)+[a-zA-Z0-9][-a-zA-Z0-9]+'
-                        matches = re.findall(domain_pattern, text)
-                        for match in matches:
-                            if len(match) > 4:  # Avoid very short matches
-                                links.append(match)
-                                logger.debug(f"Found domain in text: {match}")
-                
-                # Extract domains from links
-                for link in links:
-                    # If the link is already a domain-like string
-                    if '.' in link and '/' not in link and ' ' not in link:
-                        domain = link.lower()
-                        logger.debug(f"Using link as domain directly: {domain}")
-                    else:
-                        domain = extract_domain_from_url(link)
-                        logger.debug(f"Extracted domain from link: {domain} (from {link})")
-                    
-                    if domain and is_valid_domain(domain):
-                        # Additional check: domain should contain part of the company name
-                        # or company name should be part of the domain (for short company names)
-                        company_words = company_name.lower().split()
-                        domain_parts = domain.lower().split('.')
-                        
-                        # Skip domains that are too generic
-                        if len(domain_parts[0]) <= 3:  # Skip very short domains
-                            logger.debug(f"Skipping too short domain: {domain}")
-                            continue
-                        
-                        # For company names with multiple words, check if they're combined in the domain
-                        company_name_no_spaces = company_name.lower().replace(' ', '')
-                        domain_name = domain_parts[0].lower()
-                        
-                        # Check if domain contains company name or vice versa
-                        domain_relevant = False
-                        
-                        # Check if domain contains company name without spaces
-                        if company_name_no_spaces in domain_name:
-                            domain_relevant = True
-                            logger.debug(f"Domain {domain} contains company name without spaces: {company_name_no_spaces}")
-                        
-                        # Check if any word from company name is in domain
-                        for word in company_words:
-                            if len(word) >= 3 and word in domain_name:
-                                domain_relevant = True
-                                logger.debug(f"Domain {domain} contains company word: {word}")
-                                break
-                        
-                        # Check for transliteration (Russian to Latin)
-                        # Simple check for common Russian-to-Latin mappings
-                        ru_to_lat = {
-                            'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'e',
-                            'ж': 'zh', 'з': 'z', 'и': 'i', 'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm',
-                            'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u',
-                            'ф': 'f', 'х': 'h', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'sch',
-                            'ъ': '', 'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu', 'я': 'ya'
-                        }
-                        
-                        # Transliterate company name
-                        transliterated = ''
-                        for char in company_name_no_spaces:
-                            transliterated += ru_to_lat.get(char.lower(), char)
-                        
-                        if transliterated in domain_name:
-                            domain_relevant = True
-                            logger.debug(f"Domain {domain} contains transliterated company name: {transliterated}")
-                        
-                        if domain_relevant:
-                            logger.info(f"Found relevant domain: {domain} for company {company_name}")
-                            domains_found.append(domain)
-            
-            # Add delay between requests
-            time.sleep(random.uniform(1, 3))
-            
-        except Exception as e:
-            logger.error(f"Error searching for domain: {str(e)}")
+    return domains_found
+
+def search_engine_domains(company_name: str, engine: str, lang: str = 'ru') -> Optional[list]:
+    """Query one search engine for a company and return the relevant domains it lists.
     
+    Returns None when no result page came back (throttled, blocked or failed),
+    so callers can tell "found nothing" from "couldn't search".
+    """
+    # Prepare search query
+    if lang == 'ru':
+        query = f"компания {company_name} официальный сайт"
+    else:
+        query = f"company {company_name} official website"
+    
+    try:
+        html = fetch_search_results(engine, query)
+        return parse_search_results(html, engine, company_name) if html else None
+    except Exception as e:
+        logger.error(f"Error searching for domain: {str(e)}")
+        return None
+
+def pick_most_likely_domain(company_name: str, domains_found: list) -> str:
+    """Return the domain found most often across search results, or '' if none."""
     # Count domain occurrences and sort by frequency
     domain_counts = {}
     for domain in domains_found:
@@ -288,17 +477,159 @@ def search_company_domain(company_name: str, lang: str = 'ru') -> str:
     logger.warning(f"No domain found for company: {company_name}")
     return ""
 
-def find_missing_domains(entries: list) -> list:
+def discover_company_domains(company_names: list, lang: str = 'ru',
+                             max_workers: int = DOMAIN_SEARCH_WORKERS) -> dict:
+    """Search domains for many companies at once.
+    
+    The persistent company domain cache (and its manual overrides) is checked
+    first; only companies it doesn't know are searched. Every (company, search
+    engine) pair is fetched concurrently over the pooled HTTP session; each
+    engine's token bucket keeps us under its rate limit.
+    
+    Args:
+        company_names: Company names, already deduplicated
+        lang: Query language ('ru' or 'en')
+        max_workers: Concurrent search requests
+        
+    Returns:
+        Dict mapping each company name to its most likely domain ('' if none found)
+    """
+    results = {}
+    to_search = []
+    for company_name in company_names:
+        cached = company_domain_cache.get(company_name)
+        if cached is None:
+            to_search.append(company_name)
+        else:
+            logger.debug("Using cached domain for %s: %s", company_name, cached or '(none found)')
+            results[company_name] = cached
+    if not to_search:
+        return results
+    logger.info(f"Searching domains for {len(to_search)} companies with {max_workers} workers "
+                f"({len(results)} served from cache)")
+    
+    domains_found = {company_name: [] for company_name in to_search}
+    # Companies at least one engine returned a result page for
+    searched = set()
+    with ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="domain-search") as executor:
+        futures = {
+            executor.submit(search_engine_domains, strip_legal_form(company_name) or company_name,
+                            engine, lang): company_name
+            for company_name in to_search
+            for engine in SEARCH_ENGINES
+        }
+        for future in as_completed(futures):
+            found = future.result()
+            if found is not None:
+                searched.add(futures[future])
+                domains_found[futures[future]].extend(found)
+    
+    for company_name, found in domains_found.items():
+        results[company_name] = pick_most_likely_domain(company_name, found)
+        if company_name in searched:
+            company_domain_cache.put(company_name, results[company_name], dict(Counter(found)))
+        else:
+            # Every engine failed or throttled us; don't remember "no domain" for a search that never ran
+            logger.warning(f"No search engine answered for {company_name}, not caching the result")
+    return results
+
+def search_company_domain(company_name: str, lang: str = 'ru') -> str:
+    """Search for a company's domain name using web search."""
+    logger.info(f"Searching for domain of company: {company_name}")
+    return discover_company_domains([company_name], lang).get(company_name, "")
+
+def clean_domain(domain_or_url: str) -> str:
+    """Normalise a domain typed into the sheet (scheme, www. and paths removed)."""
+    domain = domain_or_url.lower()
+    domain = re.sub(r'^https?://', '', domain)
+    domain = re.sub(r'^www\.', '', domain)
+    return domain.split('/')[0]  # Remove paths
+
+def fallback_domains(company_name: str) -> list:
+    """Domains to try when search finds nothing: the company name under .ru, .com and .рф.
+    
+    'ООО "Ромашка"' gives romashka.ru, romashka.com and xn--80aa3agjl3d.xn--p1ai.
+    """
+    base = normalize_company_name(company_name).replace(' ', '')
+    if len(base) <= 3:  # Only if the company name is reasonably long
+        return []
+    
+    latin = LATIN_LABEL_INVALID_CHARS.sub('', transliterate_company_name(base)).strip('-')
+    candidates = []
+    for tld in FALLBACK_TLDS:
+        if tld == 'рф':
+            # Cyrillic .рф domains, in the punycode form DNS understands
+            if CYRILLIC_PATTERN.search(base):
+                try:
+                    candidates.append(f"{base}.{tld}".encode('idna').decode('ascii'))
+                except UnicodeError:
+                    pass
+        elif latin:
+            candidates.append(f"{latin}.{tld}")
+    return list(dict.fromkeys(candidates))
+
+def check_mail_domains(domains: list, max_workers: int = MX_PRECHECK_WORKERS) -> dict:
+    """Check concurrently which domains have a mail server (MX, or an A record to fall back on).
+    
+    Returns:
+        Dict mapping each domain to True/False
+    """
+    domains = list(dict.fromkeys(domain for domain in domains if domain))
+    if not domains:
+        return {}
+    logger.info(f"Checking mail servers for {len(domains)} domains with {max_workers} workers")
+    with ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="mx-precheck") as executor:
+        verdicts = dict(zip(domains, executor.map(lambda domain: has_mx_record(domain, retries=2), domains)))
+    logger.info(f"{sum(verdicts.values())} of {len(domains)} domains have a mail server")
+    return verdicts
+
+def find_missing_domains(entries: list, check_mx: bool = MX_PRECHECK_ENABLED) -> list:
     """Find missing domains for company names in the entries list.
     
+    Company names are normalised and deduplicated first, then looked up in
+    the company domain cache or searched concurrently, so a company that
+    appears on fifty rows is only looked up once.
+    
+    With check_mx, every domain (from the sheet, from search, or made up from
+    the company name) is then checked for a mail server in one concurrent
+    pass. A company nothing was found for gets the first of .ru, .com and .рф
+    that has one, and rows whose domain has no mail server get an empty domain
+    so no candidates are generated or probed for them.
+    
     Args:
         entries: List of (first_name, last_name, domain/company) tuples
+        check_mx: Run the mail server pre-check
         
     Returns:
-        List of (first_name, last_name, domain) tuples with domains filled in
+        List of (first_name, last_name, domain) tuples with domains filled in,
+        in the same order as entries
     """
     logger.info(f"Finding missing domains for {len(entries)} entries")
     
+    # Company names that still need a domain, each once ('ООО "Ромашка"' and 'Ромашка' are the same company)
+    companies_by_key = {}
+    for first_name, last_name, domain_or_company in entries:
+        if domain_or_company and '.' not in domain_or_company and domain_or_company.strip():
+            companies_by_key.setdefault(normalize_company_name(domain_or_company), domain_or_company.strip())
+    found_by_name = discover_company_domains(list(companies_by_key.values()))
+    company_domains = {key: found_by_name.get(name, "") for key, name in companies_by_key.items()}
+    
+    # Made-up domains for companies search found nothing for
+    company_fallbacks = {key: fallback_domains(companies_by_key[key])
+                         for key, domain in company_domains.items() if not domain}
+    
+    # One concurrent mail server check for every domain we might use
+    has_mail = {}
+    if check_mx:
+        domains_to_check = [clean_domain(domain_or_company) for _, _, domain_or_company in entries
+                            if domain_or_company and '.' in domain_or_company]
+        domains_to_check += [domain for domain in company_domains.values() if domain]
+        domains_to_check += [domain for fallbacks in company_fallbacks.values() for domain in fallbacks]
+        has_mail = check_mail_domains(domains_to_check)
+    
+    def usable(domain):
+        return not check_mx or has_mail.get(domain, False)
+    
     result_entries = []
     for entry in entries:
         first_name, last_name, domain_or_company = entry
@@ -306,27 +637,33 @@ def find_missing_domains(entries: list) -> list:
         # Check if the third column is already a valid domain
         if domain_or_company and '.' in domain_or_company:
             # Looks like a domain, clean it up
-            domain = domain_or_company.lower()
-            domain = re.sub(r'^https?://', '', domain)
-            domain = re.sub(r'^www\.', '', domain)
-            domain = domain.split('/')[0]  # Remove paths
-            
+            domain = clean_domain(domain_or_company)
+            if not usable(domain):
+                logger.warning(f"Dropping {first_name} {last_name}: {domain} has no mail server")
+                domain = ""
             result_entries.append((first_name, last_name, domain))
             continue
         
-        # If not a domain, treat as company name and search for domain
-        if domain_or_company:
-            domain = search_company_domain(domain_or_company)
-            if domain:
+        # If not a domain, treat as company name and use the domain we searched for
+        if domain_or_company and domain_or_company.strip():
+            key = normalize_company_name(domain_or_company)
+            domain = company_domains.get(key, "")
+            if domain and usable(domain):
                 result_entries.append((first_name, last_name, domain))
                 logger.info(f"Found domain {domain} for company {domain_or_company}")
+            elif domain:
+                logger.warning(f"Dropping {first_name} {last_name}: {domain} has no mail server")
+                result_entries.append((first_name, last_name, ""))
             else:
-                # If we couldn't find a domain, try a simpler approach - just add .ru to the company name
-                company_name_simple = domain_or_company.lower().replace(' ', '')
-                if len(company_name_simple) > 3:  # Only if the company name is reasonably long
-                    domain = f"{company_name_simple}.ru"
+                # If we couldn't find a domain, try the company name under the usual TLDs
+                fallbacks = company_fallbacks.get(key, [])
+                domain = next((candidate for candidate in fallbacks if usable(candidate)), "")
+                if domain:
                     result_entries.append((first_name, last_name, domain))
                     logger.info(f"Using simple domain {domain} for company {domain_or_company}")
+                elif fallbacks:
+                    logger.warning(f"Dropping {first_name} {last_name}: none of {fallbacks} has a mail server")
+                    result_entries.append((first_name, last_name, ""))
                 else:
                     # Keep the original entry if no domain found
                     result_entries.append(entry)
@@ -336,4 +673,4 @@ def find_missing_domains(entries: list) -> list:
             result_entries.append(entry)
             logger.warning(f"No company name or domain provided for {first_name} {last_name}")
     
-    return result_entries 
\ No newline at end of file
+    return result_entries
@@ -1,25 +1,35 @@
 import re
 import dns.resolver
+import dns_cache
+import storage
+from log_config import EventLogger
+from rate_limiter import rate_limiter
+from result_store import (
+    OUTCOME_ACCEPT_ALL,
+    OUTCOME_AMBIGUOUS,
+    OUTCOME_ERROR,
+    OUTCOME_GREYLISTED,
+    OUTCOME_INVALID,
+    OUTCOME_LIKELY_VALID,
+    OUTCOME_TIMEOUT,
+    OUTCOME_VALID,
+    VALID_OUTCOMES,
+    result_store,
+)
 import smtplib
 import socket
 import logging
 import time
-from typing import Tuple, List, Dict, Any
+import threading
+from contextlib import contextmanager, nullcontext
+from typing import Tuple, List, Dict, Any, Callable, ContextManager
 import random
+import string
 import os
 
-# Configure more detailed logging
-handlers = [logging.StreamHandler()]
-# Only add file logging in development environment
-if os.environ.get('VERCEL_ENV') != 'production':
-    handlers.append(logging.FileHandler("email_verification.log"))
-
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=handlers
-)
 logger = logging.getLogger("email_verifier")
+# Per-probe and per-candidate events, which happen far too often for plain INFO lines
+events = EventLogger("email_verifier")
 
 def is_valid_syntax(email: str) -> bool:
     # Enhanced pattern with more strict rules
@@ -38,14 +48,18 @@ def has_mx_record(domain: str, retries: int = 3) -> bool:
         try:
             logging.debug(f"MX record check attempt {attempt + 1} for {domain}")
             try:
-                mx_records = dns.resolver.resolve(domain, 'MX', lifetime=5)
+                mx_records = dns_cache.resolve_mx(domain)
                 if mx_records:
                     return True
             except dns.resolver.NoAnswer:
                 # Try A record as fallback
-                a_records = dns.resolver.resolve(domain, 'A', lifetime=5)
+                a_records = dns_cache.resolve_a(domain)
                 if a_records:
                     return True
+        except dns_cache.NEGATIVE_EXCEPTIONS as e:
+            # NXDOMAIN / no records is a definitive answer, retrying won't change it
+            logging.info(f"No mail records for {domain}: {str(e)}")
+            return False
         except Exception as e:
             if attempt == retries - 1:
                 logging.error(f"Failed to resolve records for {domain}: {str(e)}")
@@ -53,77 +67,532 @@ def has_mx_record(domain: str, retries: int = 3) -> bool:
             time.sleep(1)  # Wait before retry
     return False
 
-def email_exists(email: str) -> Tuple[bool, str]:
-    logger.info(f"Verifying email existence: {email}")
+# Providers that block SMTP probing and get heuristic checks instead
+MAILRU_DOMAINS = ['mail.ru', 'inbox.ru', 'list.ru', 'bk.ru', 'internet.ru']
+YANDEX_DOMAINS = ['yandex.ru', 'yandex.com', 'ya.ru']
+
+# SMTP dialogue settings shared by all probes
+SMTP_HELO_HOSTNAME = 'mail.google.com'
+SMTP_MAIL_FROM = 'postmaster@gmail.com'
+SMTP_TIMEOUT = 10
+
+# Session reuse settings: one connection per MX host, reset with RSET between recipients
+SMTP_SESSION_REUSE = os.environ.get('SMTP_SESSION_REUSE', 'true').lower() == 'true'
+SMTP_MAX_RECIPIENTS_PER_SESSION = int(os.environ.get('SMTP_MAX_RECIPIENTS_PER_SESSION', 20))
+SMTP_SESSION_IDLE_TIMEOUT = int(os.environ.get('SMTP_SESSION_IDLE_TIMEOUT', 30))
+
+
+class SMTPSession:
+    """A reusable SMTP connection to a single MX host used for RCPT TO probes.
+
+    The connection is opened lazily (EHLO, STARTTLS, EHLO, MAIL FROM) and every
+    following recipient is probed after an RSET + MAIL FROM instead of a new
+    TCP/TLS handshake. After `max_recipients` probes the connection is recycled,
+    and if the server drops it or refuses the reset we reconnect once and retry
+    the recipient. A MAIL FROM refused on a fresh connection raises
+    SMTPSenderRefused.
+    """
+
+    def __init__(self, mx_host: str, max_recipients: int = SMTP_MAX_RECIPIENTS_PER_SESSION,
+                 timeout: int = SMTP_TIMEOUT):
+        self.mx_host = mx_host
+        self.max_recipients = max(1, max_recipients)
+        self.timeout = timeout
+        self.server = None
+        self.recipients_sent = 0
+        self.last_used = 0.0
+
+    @property
+    def is_connected(self) -> bool:
+        return self.server is not None
+
+    @property
+    def is_exhausted(self) -> bool:
+        return self.recipients_sent >= self.max_recipients
+
+    def connect(self):
+        """Open the connection and start a mail transaction."""
+        self.close()
+        events.debug("smtp connect", mx_host=self.mx_host)
+        server = smtplib.SMTP(self.mx_host, port=25, timeout=self.timeout)
+        server.set_debuglevel(0)
+        try:
+            server.ehlo(SMTP_HELO_HOSTNAME)
+            events.debug("smtp ehlo ok", mx_host=self.mx_host)
+
+            if server.has_extn('STARTTLS'):
+                events.debug("smtp starttls", mx_host=self.mx_host)
+                server.starttls()
+                server.ehlo(SMTP_HELO_HOSTNAME)
+
+            events.debug("smtp mail from", mx_host=self.mx_host)
+            code, message = server.mail(SMTP_MAIL_FROM)
+            # Without an open transaction every RCPT would get a 503, which
+            # looks like an answer about the recipient rather than about us
+            if not 200 <= code < 300:
+                raise smtplib.SMTPSenderRefused(code, message, SMTP_MAIL_FROM)
+        except Exception:
+            server.close()
+            raise
+
+        self.server = server
+        self.recipients_sent = 0
+        self.last_used = time.time()
+
+    def reset(self) -> bool:
+        """Reset the current transaction so the next recipient starts clean.
+
+        Returns False if the server refused RSET or MAIL FROM, in which case the
+        connection is no good for further probes.
+        """
+        code, _ = self.server.rset()
+        if not 200 <= code < 300:
+            return False
+        code, _ = self.server.mail(SMTP_MAIL_FROM)
+        return 200 <= code < 300
+
+    def probe(self, email: str) -> Tuple[int, bytes]:
+        """Send RCPT TO for a single address and return the server's (code, message).
+
+        Reconnects once if the server has dropped the connection in the meantime.
+        """
+        for attempt in range(2):
+            try:
+                if not self.is_connected or self.is_exhausted:
+                    self.connect()
+                elif self.recipients_sent > 0 and not self.reset():
+                    events.info("smtp reset refused, reconnecting", mx_host=self.mx_host)
+                    self.connect()
+
+                events.debug("smtp rcpt to", mx_host=self.mx_host, email=email)
+                code, message = self.server.rcpt(email)
+                self.recipients_sent += 1
+                self.last_used = time.time()
+
+                # 421 means the server is closing the channel
+                if code == 421:
+                    self.close()
+                return code, message
+            except (smtplib.SMTPServerDisconnected, ConnectionResetError, BrokenPipeError) as e:
+                self.close()
+                if attempt == 1:
+                    raise smtplib.SMTPServerDisconnected(str(e))
+                events.info("smtp reconnect", mx_host=self.mx_host)
+
+    def close(self):
+        """Close the connection, politely if the server is still listening."""
+        if self.server is None:
+            return
+        try:
+            self.server.quit()
+        except Exception:
+            try:
+                self.server.close()
+            except Exception:
+                pass
+        self.server = None
+        self.recipients_sent = 0
+
+
+class SMTPSessionPool:
+    """Pool of idle SMTP sessions keyed by MX host.
+
+    Sequential probes against the same MX (the common case: all variations of
+    one person) therefore run over a single connection.
+    """
+
+    def __init__(self, max_recipients: int = SMTP_MAX_RECIPIENTS_PER_SESSION,
+                 idle_timeout: int = SMTP_SESSION_IDLE_TIMEOUT):
+        self.max_recipients = max_recipients
+        self.idle_timeout = idle_timeout
+        self._idle: Dict[str, List[SMTPSession]] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, mx_host: str) -> SMTPSession:
+        """Take an idle session for the host, or create a new one."""
+        with self._lock:
+            sessions = self._idle.get(mx_host, [])
+            while sessions:
+                smtp_session = sessions.pop()
+                if time.time() - smtp_session.last_used < self.idle_timeout:
+                    return smtp_session
+                # Idle for too long, the server has most likely dropped it
+                smtp_session.close()
+        return SMTPSession(mx_host, max_recipients=self.max_recipients)
+
+    def release(self, smtp_session: SMTPSession):
+        """Return a session to the pool once the caller is done with it."""
+        if not smtp_session.is_connected or smtp_session.is_exhausted:
+            smtp_session.close()
+            return
+        with self._lock:
+            self._idle.setdefault(smtp_session.mx_host, []).append(smtp_session)
+
+    @contextmanager
+    def session(self, mx_host: str):
+        smtp_session = self.acquire(mx_host)
+        try:
+            yield smtp_session
+        except Exception:
+            smtp_session.close()
+            raise
+        finally:
+            self.release(smtp_session)
+
+    def close_all(self):
+        """Close every idle session, e.g. at the end of a run."""
+        with self._lock:
+            sessions = [s for host_sessions in self._idle.values() for s in host_sessions]
+            self._idle.clear()
+        for smtp_session in sessions:
+            smtp_session.close()
+
+
+# Process-wide pool used by email_exists when session reuse is enabled
+smtp_session_pool = SMTPSessionPool()
+
+
+def close_smtp_sessions():
+    """Close all pooled SMTP connections."""
+    smtp_session_pool.close_all()
+
+
+def smtp_probe(email: str, mx_record: str, reuse_session: bool = None, paced: bool = False) -> Tuple[int, bytes]:
+    """Send RCPT TO for an address to the given MX host and return (code, message).
+
+    Waits for the host's adaptive rate limit first, unless the caller already
+    did (`paced`), and reports the reply back to it.
+    """
+    if reuse_session is None:
+        reuse_session = SMTP_SESSION_REUSE
+    if not paced:
+        rate_limiter.wait(mx_record)
+    try:
+        if reuse_session:
+            with smtp_session_pool.session(mx_record) as smtp_session:
+                code, message = smtp_session.probe(email)
+        else:
+            # One-shot connection for this recipient only
+            smtp_session = SMTPSession(mx_record, max_recipients=1)
+            try:
+                code, message = smtp_session.probe(email)
+            finally:
+                smtp_session.close()
+    except (smtplib.SMTPServerDisconnected, ConnectionResetError, BrokenPipeError):
+        rate_limiter.report(mx_record, dropped=True)
+        raise
+    rate_limiter.report(mx_record, code)
+    return code, message
+
+
+# Catch-all (accept-all) detection
+ACCEPT_ALL_REASON = "Accept-all domain (unverifiable)"
+ACCEPT_ALL_STATUS = "Accept-all/unverifiable"
+
+# Statuses of rows that have no valid email
+NO_VALID_EMAIL_STATUS = 'No valid email found'
+NO_DOMAIN_STATUS = 'No domain found'
+NO_MAIL_SERVER_STATUS = 'Invalid domain (no mail server)'
+
+CATCH_ALL_CACHE_TTL = int(os.environ.get('CATCH_ALL_CACHE_TTL', 7 * 24 * 3600))
+# Inconclusive probes (timeouts, 4xx) are only remembered in memory, and briefly
+CATCH_ALL_INCONCLUSIVE_TTL = 600
+
+CATCH_ALL_SCHEMA = """
+CREATE TABLE IF NOT EXISTS domain_verdicts (
+    domain TEXT PRIMARY KEY,
+    is_catch_all INTEGER NOT NULL,
+    mx_host TEXT,
+    checked_at REAL NOT NULL
+);
+"""
+
+
+class CatchAllCache:
+    """Per-domain accept-all verdicts, kept for the run and persisted across runs.
+
+    A domain is probed once with a random local part nobody would own; if the
+    server answers 250 it accepts everything and per-address probes tell us
+    nothing there.
+    """
+
+    def __init__(self, ttl: int = CATCH_ALL_CACHE_TTL, persist: bool = True):
+        self.ttl = ttl
+        self.persist = persist
+        # domain -> (verdict, expires_at); verdict None means inconclusive
+        self._verdicts: Dict[str, Tuple[Any, float]] = {}
+        self._domain_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def _database(self):
+        if not self.persist:
+            return None
+        try:
+            database = storage.get_database()
+            database.ensure_schema('domain_verdicts', CATCH_ALL_SCHEMA)
+            return database
+        except Exception as e:
+            logger.warning(f"Catch-all verdicts will not be persisted: {str(e)}")
+            self.persist = False
+            return None
+
+    def get(self, domain: str):
+        """Return the known verdict: True, False, or None if unknown/inconclusive."""
+        domain = domain.lower()
+        with self._lock:
+            entry = self._verdicts.get(domain)
+        if entry and entry[1] > time.time():
+            return entry[0]
+
+        database = self._database()
+        if database is not None:
+            row = database.query_one(
+                "SELECT is_catch_all, checked_at FROM domain_verdicts WHERE domain = ?", (domain,))
+            if row and row[1] + self.ttl > time.time():
+                verdict = bool(row[0])
+                with self._lock:
+                    self._verdicts[domain] = (verdict, row[1] + self.ttl)
+                return verdict
+        return None
+
+    def put(self, domain: str, verdict, mx_host: str = ''):
+        domain = domain.lower()
+        now = time.time()
+        ttl = self.ttl if verdict is not None else CATCH_ALL_INCONCLUSIVE_TTL
+        with self._lock:
+            self._verdicts[domain] = (verdict, now + ttl)
+
+        database = self._database() if verdict is not None else None
+        if database is not None:
+            database.execute(
+                "INSERT OR REPLACE INTO domain_verdicts (domain, is_catch_all, mx_host, checked_at) "
+                "VALUES (?, ?, ?, ?)", (domain, int(verdict), mx_host, now))
+
+    def is_known(self, domain: str) -> bool:
+        with self._lock:
+            entry = self._verdicts.get(domain.lower())
+        return bool(entry and entry[1] > time.time()) or self.get(domain) is not None
+
+    def domain_lock(self, domain: str) -> threading.Lock:
+        with self._lock:
+            return self._domain_locks.setdefault(domain.lower(), threading.Lock())
+
+
+catch_all_cache = CatchAllCache()
+
+
+def random_local_part() -> str:
+    """A local part that no real mailbox is going to have."""
+    alphabet = string.ascii_lowercase + string.digits
+    return random.choice(string.ascii_lowercase) + ''.join(random.choices(alphabet, k=19))
+
+
+def interpret_catch_all_probe(code: int):
+    """Map the RCPT TO reply for a random address to a catch-all verdict."""
+    if code == 250:
+        return True
+    if code in [550, 551, 553, 554]:
+        return False
+    return None
+
+
+def is_catch_all_domain(domain: str, mx_record: str = None,
+                        slot: Callable[[], ContextManager] = nullcontext) -> bool:
+    """Check (once per domain) whether the domain's mail server accepts any recipient.
+
+    Args:
+        domain: Domain to check
+        mx_record: The domain's MX host, if already resolved
+        slot: Context manager factory held only around the probe itself, after
+            the rate limit has been waited for
+
+    Returns:
+        bool: True only if the server accepted a random address; unknown or
+        inconclusive results count as False so normal probing goes ahead
+    """
+    domain = domain.lower()
+    if domain in MAILRU_DOMAINS or domain in YANDEX_DOMAINS:
+        return False
+
+    with catch_all_cache.domain_lock(domain):
+        if catch_all_cache.is_known(domain):
+            return bool(catch_all_cache.get(domain))
+
+        verdict = None
+        try:
+            if mx_record is None:
+                mx_record = dns_cache.resolve_mx(domain)[0]
+            probe_email = f"{random_local_part()}@{domain}"
+            logger.info(f"Probing {domain} for catch-all with {probe_email}")
+            rate_limiter.wait(mx_record)
+            with slot():
+                code, message = smtp_probe(probe_email, mx_record, paced=True)
+            verdict = interpret_catch_all_probe(code)
+            logger.info(f"Catch-all probe for {domain}: code={code}, catch-all={verdict}")
+        except Exception as e:
+            logger.warning(f"Catch-all probe failed for {domain}: {str(e)}")
+
+        catch_all_cache.put(domain, verdict, mx_record or '')
+        return bool(verdict)
+
+
+# Greylisting: temporary rejections that succeed when the same probe is repeated later
+GREYLIST_CODES = (450, 451)
+GREYLIST_RETRY_DELAY = int(os.environ.get('GREYLIST_RETRY_DELAY', 300))
+GREYLIST_MAX_DELAY = int(os.environ.get('GREYLIST_MAX_DELAY', 1800))
+GREYLIST_MAX_RETRIES = int(os.environ.get('GREYLIST_MAX_RETRIES', 3))
+
+# "try again in 5 minutes", "greylisted for 300 seconds", "retry after 60s"
+GREYLIST_DELAY_PATTERN = re.compile(r'(\d+)\s*(seconds?|secs?|s|minutes?|mins?|m)\b', re.IGNORECASE)
+
+
+def greylist_retry_after(message) -> int:
+    """Seconds to wait before retrying a greylisted recipient.
+
+    Uses the delay the server suggests in its reply text when there is one,
+    otherwise GREYLIST_RETRY_DELAY, capped at GREYLIST_MAX_DELAY.
+    """
+    if isinstance(message, bytes):
+        message = message.decode('utf-8', errors='replace')
+    match = GREYLIST_DELAY_PATTERN.search(message or '')
+    if not match:
+        return min(GREYLIST_RETRY_DELAY, GREYLIST_MAX_DELAY)
+    delay = int(match.group(1))
+    if match.group(2).lower().startswith('m'):
+        delay *= 60
+    # A little slack so we don't come back a moment too early
+    return min(delay + 5, GREYLIST_MAX_DELAY)
+
+
+def classify_rcpt_response(email: str, code: int) -> Tuple[bool, str]:
+    """Turn an RCPT TO response code into the (exists, reason) result."""
+    if code == 250:
+        exists, reason = True, "Valid"
+    elif code in [550, 551, 553, 554]:
+        exists, reason = False, "Invalid recipient"
+    elif code in GREYLIST_CODES:
+        exists, reason = False, f"Greylisted: {code}"
+    else:
+        exists, reason = False, f"Ambiguous response: {code}"
+    events.sampled("rcpt result", email=email, code=code, reason=reason)
+    return exists, reason
+
+
+def rcpt_outcome(code: int) -> str:
+    """Map an RCPT TO response code to its outcome class."""
+    if code == 250:
+        return OUTCOME_VALID
+    if code in [550, 551, 553, 554]:
+        return OUTCOME_INVALID
+    if code in GREYLIST_CODES:
+        return OUTCOME_GREYLISTED
+    return OUTCOME_AMBIGUOUS
+
+
+def probe_email(email: str, reuse_session: bool = None, paced: bool = False) -> Dict[str, Any]:
+    """Check whether the mail server for the address accepts it as a recipient.
+
+    Args:
+        email: Email address to check
+        reuse_session: Probe over a pooled connection to the MX host instead of
+            opening a new one. Defaults to SMTP_SESSION_REUSE.
+        paced: The MX host's rate limit was already waited for (see
+            wait_for_probe_turn); only counts for the first attempt
+
+    Returns:
+        Dict with 'exists', 'reason', 'outcome', 'smtp_code', 'mx_host' and
+        'retry_after' (seconds until a greylisted probe is worth repeating)
+    """
+    events.debug("probe", email=email)
     domain = email.split('@')[1]
     retries = 2
+    if reuse_session is None:
+        reuse_session = SMTP_SESSION_REUSE
+
+    def result(exists, reason, outcome, smtp_code=None, mx_host='', retry_after=None):
+        return {'exists': exists, 'reason': reason, 'outcome': outcome,
+                'smtp_code': smtp_code, 'mx_host': mx_host, 'retry_after': retry_after}
     
     # Special handling for Russian email providers
-    if domain in ['mail.ru', 'inbox.ru', 'list.ru', 'bk.ru', 'internet.ru']:
-        # Mail.ru group has specific verification behavior
-        logger.info(f"Using special Mail.ru verification for {email}")
-        return check_russian_mailru(email)
-    elif domain in ['yandex.ru', 'yandex.com', 'ya.ru']:
-        # Yandex has specific verification behavior
-        logger.info(f"Using special Yandex verification for {email}")
-        return check_russian_yandex(email)
+    if domain in MAILRU_DOMAINS or domain in YANDEX_DOMAINS:
+        if domain in MAILRU_DOMAINS:
+            # Mail.ru group has specific verification behavior
+            events.debug("probe mail.ru", email=email)
+            exists, reason = check_russian_mailru(email)
+        else:
+            # Yandex has specific verification behavior
+            events.debug("probe yandex", email=email)
+            exists, reason = check_russian_yandex(email)
+        # Heuristics only, so they're stored as likely valid and trusted briefly
+        return result(exists, reason, OUTCOME_LIKELY_VALID if exists else OUTCOME_INVALID)
     
     for attempt in range(retries):
         try:
-            logger.info(f"Attempt {attempt+1} to verify {email}")
-            mx_records = dns.resolver.resolve(domain, 'MX', lifetime=5)
-            mx_record = str(mx_records[0].exchange).rstrip('.')
-            logger.info(f"Found MX record for {domain}: {mx_record}")
+            mx_record = dns_cache.resolve_mx(domain)[0]
+            events.debug("probe attempt", email=email, attempt=attempt + 1, mx_host=mx_record)
+            
+            # A server that accepts everything can't confirm this address
+            if is_catch_all_domain(domain, mx_record):
+                events.debug("probe skipped, accept-all", email=email, domain=domain)
+                return result(False, ACCEPT_ALL_REASON, OUTCOME_ACCEPT_ALL, mx_host=mx_record)
             
             try:
-                logger.info(f"Connecting to SMTP server: {mx_record}")
-                server = smtplib.SMTP(mx_record, port=25, timeout=10)
-                server.set_debuglevel(0)
+                code, message = smtp_probe(email, mx_record, reuse_session, paced=paced and attempt == 0)
+                events.debug("rcpt response", email=email, code=code, reply=message)
                 
-                server.ehlo('mail.google.com')
-                logger.info(f"EHLO successful for {mx_record}")
-                
-                if server.has_extn('STARTTLS'):
-                    logger.info(f"Starting TLS for {mx_record}")
-                    server.starttls()
-                    server.ehlo('mail.google.com')
-                
-                logger.info(f"Sending MAIL FROM command")
-                server.mail('postmaster@gmail.com')
-                logger.info(f"Sending RCPT TO command for {email}")
-                code, message = server.rcpt(email)
-                logger.info(f"RCPT TO response: code={code}, message={message}")
-                server.quit()
-                
-                if code == 250:
-                    logger.info(f"Email {email} is valid (code 250)")
-                    return True, "Valid"
-                elif code in [550, 551, 553, 554]:
-                    logger.info(f"Email {email} is invalid (code {code})")
-                    return False, "Invalid recipient"
-                else:
-                    logger.info(f"Email {email} returned ambiguous response: {code}")
-                    return False, f"Ambiguous response: {code}"
+                exists, reason = classify_rcpt_response(email, code)
+                retry_after = greylist_retry_after(message) if code in GREYLIST_CODES else None
+                return result(exists, reason, rcpt_outcome(code), code, mx_record, retry_after)
                     
             except smtplib.SMTPServerDisconnected as e:
-                logger.warning(f"Server disconnected while verifying {email}: {str(e)}")
-                return False, "Server disconnected"
+                events.warning("server disconnected", email=email, mx_host=mx_record, error=str(e))
+                return result(False, "Server disconnected", OUTCOME_AMBIGUOUS, mx_host=mx_record)
                 
             except (smtplib.SMTPRecipientsRefused,
                     smtplib.SMTPResponseException,
                     socket.timeout,
                     ConnectionRefusedError) as e:
-                logger.warning(f"Error while verifying {email}: {str(e)}")
-                return False, str(e)
+                events.warning("probe error", email=email, mx_host=mx_record, error=str(e))
+                return result(False, str(e), OUTCOME_AMBIGUOUS, getattr(e, 'smtp_code', None), mx_record)
                 
         except Exception as e:
-            logger.error(f"Exception while verifying {email}: {str(e)}", exc_info=True)
+            events.error("probe exception", exc_info=True, email=email, attempt=attempt + 1, error=str(e))
             if attempt == retries - 1:
-                return False, str(e)
+                return result(False, str(e), OUTCOME_ERROR)
             time.sleep(1)
     
-    logger.warning(f"Verification failed for {email} after all attempts")
-    return False, "Verification failed"
+    events.warning("probe failed after all attempts", email=email)
+    return result(False, "Verification failed", OUTCOME_ERROR)
+
+
+def wait_for_probe_turn(domain: str, slot: Callable[[], ContextManager] = nullcontext) -> bool:
+    """Wait for the rate limit of the domain's MX host ahead of probing an address there.
+
+    Settles the catch-all check first (it waits for its own token), so the
+    token taken here is the one the address's probe uses. Mail.ru/Yandex and
+    accept-all domains are answered without an RCPT, so they don't wait.
+
+    Returns:
+        bool: True if a token was taken and probe_email can go ahead `paced`
+    """
+    domain = domain.lower()
+    if domain in MAILRU_DOMAINS or domain in YANDEX_DOMAINS:
+        return False
+    try:
+        mx_record = dns_cache.resolve_mx(domain)[0]
+    except Exception:
+        # probe_email reports the failed lookup
+        return False
+    if is_catch_all_domain(domain, mx_record, slot):
+        return False
+    rate_limiter.wait(mx_record)
+    return True
+
+
+def email_exists(email: str, reuse_session: bool = None) -> Tuple[bool, str]:
+    """Check whether the mail server for the address accepts it; see probe_email."""
+    probe = probe_email(email, reuse_session)
+    return probe['exists'], probe['reason']
 
 def check_russian_mailru(email: str) -> Tuple[bool, str]:
     """Special handling for Mail.ru group email providers."""
@@ -175,93 +644,123 @@ def check_russian_yandex(email: str) -> Tuple[bool, str]:
     except Exception as e:
         return False, f"Yandex verification error: {str(e)}"
 
-def verify_email(email: str, timeout: int = 30) -> bool:
-    """Verify a single email address and return True if valid, False otherwise.
-    
+def status_for_result(outcome: str, reason: str) -> str:
+    """Human-readable status string used by verify_emails for a probe result."""
+    if outcome in VALID_OUTCOMES:
+        return 'Valid email'
+    if outcome == OUTCOME_ACCEPT_ALL:
+        return ACCEPT_ALL_STATUS
+    if outcome == OUTCOME_TIMEOUT:
+        return 'SMTP verification timeout'
+    if outcome == OUTCOME_GREYLISTED:
+        return 'Greylisted, retry later'
+    return f'Invalid email: {reason}'
+
+
+def check_email(email: str, timeout: int = 30,
+                slot: Callable[[], ContextManager] = nullcontext) -> Dict[str, Any]:
+    """Verify a single email address and return the full result.
+
+    Fresh results from the persistent result store are returned without
+    touching the network; new SMTP results are written back to it. The mail
+    server's rate limit is waited for before `slot` is taken and before the
+    timeout starts, so a paced probe neither holds a slot nor times out.
+
     Args:
         email: Email address to verify
-        timeout: Maximum time in seconds to spend on verification
-        
+        timeout: Maximum time in seconds to spend on the SMTP probe
+        slot: Context manager factory (e.g. the caller's concurrency limits)
+            held while the probe runs
+
     Returns:
-        bool: True if the email is valid, False otherwise
+        Dict with 'email', 'is_valid', 'outcome', 'status', 'reason',
+        'smtp_code', 'mx_host', 'cached' and 'retry_after'
     """
-    logger.info(f"Verifying single email: {email} with {timeout}s timeout")
-    
-    if not email:  # Skip empty emails
-        logger.info("Empty email provided")
-        return False
-    
-    start_time = time.time()
-    
+    def result(outcome, status, reason='', smtp_code=None, mx_host='', cached=False, retry_after=None):
+        return {'email': email, 'is_valid': outcome in VALID_OUTCOMES, 'outcome': outcome,
+                'status': status, 'reason': reason, 'smtp_code': smtp_code,
+                'mx_host': mx_host, 'cached': cached, 'retry_after': retry_after}
+
     # Basic validation
     if not is_valid_syntax(email):
-        logger.info(f"Email {email} has invalid syntax")
-        return False
+        events.sampled("check result", email=email, outcome=OUTCOME_INVALID, reason='Invalid syntax')
+        return result(OUTCOME_INVALID, 'Invalid syntax')
     
     domain = email.split('@')[1]
-    logger.info(f"Extracted domain: {domain}")
     
     # Domain checks
     if domain.endswith(('.local', '.test', '.example', '.invalid')):
-        logger.info(f"Domain {domain} is invalid (reserved TLD)")
-        return False
+        events.sampled("check result", email=email, outcome=OUTCOME_INVALID, reason='Invalid domain')
+        return result(OUTCOME_INVALID, 'Invalid domain')
+
+    # Reuse a result we still trust from an earlier run or another person
+    stored = result_store.lookup(email)
+    if stored:
+        events.sampled("check result", email=email, outcome=stored['outcome'], cached=True)
+        return result(stored['outcome'], status_for_result(stored['outcome'], stored['reason']),
+                      stored['reason'], stored['smtp_code'], stored['mx_host'], cached=True)
         
     if not has_mx_record(domain):
-        logger.info(f"Domain {domain} has no mail server")
-        return False
-    
-    # Add random delay to avoid being blocked
-    delay = random.uniform(1, 3)
-    logger.info(f"Adding delay of {delay:.2f} seconds before SMTP check")
-    time.sleep(delay)
-    
-    # Check if we've exceeded the timeout
-    if time.time() - start_time > timeout:
-        logger.warning(f"Timeout exceeded for {email}, skipping SMTP verification")
-        return False
+        events.sampled("check result", email=email, outcome=OUTCOME_INVALID, reason='No mail server')
+        return result(OUTCOME_INVALID, 'Invalid domain (no mail server)')
     
     # SMTP verification
-    logger.info(f"Performing SMTP verification for {email}")
+    events.debug("check smtp", email=email)
     try:
-        # Set a timeout for the SMTP verification
-        remaining_time = timeout - (time.time() - start_time)
-        if remaining_time <= 0:
-            logger.warning(f"No time left for SMTP verification of {email}")
-            return False
-            
+        # Pace against the mail server before taking a slot or starting the clock
+        paced = wait_for_probe_turn(domain, slot)
+
         # Use a separate thread with timeout for email verification
-        import threading
         import queue
         
         result_queue = queue.Queue()
         
         def verify_with_timeout():
             try:
-                exists, reason = email_exists(email)
-                result_queue.put((exists, reason))
+                result_queue.put(probe_email(email, paced=paced))
             except Exception as e:
-                logger.error(f"Error in verification thread: {str(e)}")
-                result_queue.put((False, f"Error: {str(e)}"))
-        
-        verification_thread = threading.Thread(target=verify_with_timeout)
-        verification_thread.daemon = True
-        verification_thread.start()
+                events.error("verification thread error", email=email, error=str(e))
+                result_queue.put({'exists': False, 'reason': f"Error: {str(e)}", 'outcome': OUTCOME_ERROR,
+                                  'smtp_code': None, 'mx_host': '', 'retry_after': None})
         
-        try:
-            exists, reason = result_queue.get(timeout=remaining_time)
-            if exists:
-                logger.info(f"Email {email} is valid: {reason}")
-                return True
-            else:
-                logger.info(f"Email {email} is invalid: {reason}")
-                return False
-        except queue.Empty:
-            logger.warning(f"SMTP verification timed out for {email}")
-            return False
+        with slot():
+            verification_thread = threading.Thread(target=verify_with_timeout)
+            verification_thread.daemon = True
+            verification_thread.start()
+
+            try:
+                probe = result_queue.get(timeout=timeout)
+            except queue.Empty:
+                events.warning("smtp timeout", email=email, timeout=timeout)
+                result_store.record(email, OUTCOME_TIMEOUT, reason='SMTP verification timeout')
+                return result(OUTCOME_TIMEOUT, 'SMTP verification timeout')
+
+        events.sampled("check result", email=email, outcome=probe['outcome'], reason=probe['reason'])
+        result_store.record(email, probe['outcome'], probe['smtp_code'], probe['reason'], probe['mx_host'])
+        return result(probe['outcome'], status_for_result(probe['outcome'], probe['reason']),
+                      probe['reason'], probe['smtp_code'], probe['mx_host'],
+                      retry_after=probe.get('retry_after'))
             
     except Exception as e:
         logger.error(f"Unexpected error during verification of {email}: {str(e)}")
+        return result(OUTCOME_ERROR, f'Error: {str(e)}', str(e))
+
+def verify_email(email: str, timeout: int = 30) -> bool:
+    """Verify a single email address and return True if valid, False otherwise.
+    
+    Args:
+        email: Email address to verify
+        timeout: Maximum time in seconds to spend on verification
+        
+    Returns:
+        bool: True if the email is valid, False otherwise
+    """
+    events.debug("verify", email=email, timeout=timeout)
+    
+    if not email:  # Skip empty emails
         return False
+    
+    return check_email(email, timeout)['is_valid']
 
 def verify_emails(emails: List[str], timeout_per_email: int = 30) -> List[Tuple[str, str]]:
     """Verify a list of emails and return results.
@@ -270,96 +769,20 @@ def verify_emails(emails: List[str], timeout_per_email: int = 30) -> List[Tuple[
         emails: List of email addresses to verify
         timeout_per_email: Maximum time in seconds to spend on each email verification
     """
-    logger.info(f"Starting verification of {len(emails)} emails with {timeout_per_email}s timeout per email")
+    # Called once per candidate by _verify_entry, so these are debug events
+    events.debug("verify batch", emails=len(emails), timeout=timeout_per_email)
     results = []
     for email in emails:
         if not email:  # Skip empty emails
-            logger.info("Skipping empty email")
-            continue
-            
-        logger.info(f"Verifying email: {email}")
-        start_time = time.time()
-        
-        # Basic validation
-        if not is_valid_syntax(email):
-            logger.info(f"Email {email} has invalid syntax")
-            results.append((email, 'Invalid syntax'))
-            continue
-        
-        domain = email.split('@')[1]
-        logger.info(f"Extracted domain: {domain}")
-        
-        # Domain checks
-        if domain.endswith(('.local', '.test', '.example', '.invalid')):
-            logger.info(f"Domain {domain} is invalid (reserved TLD)")
-            results.append((email, 'Invalid domain'))
             continue
             
-        if not has_mx_record(domain):
-            logger.info(f"Domain {domain} has no mail server")
-            results.append((email, 'Invalid domain (no mail server)'))
-            continue
-        
-        # Add random delay to avoid being blocked
-        delay = random.uniform(1, 3)
-        logger.info(f"Adding delay of {delay:.2f} seconds before SMTP check")
-        time.sleep(delay)
-        
-        # Check if we've exceeded the timeout
-        if time.time() - start_time > timeout_per_email:
-            logger.warning(f"Timeout exceeded for {email}, skipping SMTP verification")
-            results.append((email, 'Verification timeout'))
-            continue
-        
-        # SMTP verification
-        logger.info(f"Performing SMTP verification for {email}")
-        try:
-            # Set a timeout for the SMTP verification
-            remaining_time = timeout_per_email - (time.time() - start_time)
-            if remaining_time <= 0:
-                logger.warning(f"No time left for SMTP verification of {email}")
-                results.append((email, 'Verification timeout'))
-                continue
-                
-            # Use a separate thread with timeout for email verification
-            import threading
-            import queue
-            
-            result_queue = queue.Queue()
-            
-            def verify_with_timeout():
-                try:
-                    exists, reason = email_exists(email)
-                    result_queue.put((exists, reason))
-                except Exception as e:
-                    logger.error(f"Error in verification thread: {str(e)}")
-                    result_queue.put((False, f"Error: {str(e)}"))
-            
-            verification_thread = threading.Thread(target=verify_with_timeout)
-            verification_thread.daemon = True
-            verification_thread.start()
-            
-            try:
-                exists, reason = result_queue.get(timeout=remaining_time)
-                if exists:
-                    logger.info(f"Email {email} is valid: {reason}")
-                    results.append((email, 'Valid email'))
-                else:
-                    logger.info(f"Email {email} is invalid: {reason}")
-                    results.append((email, f'Invalid email: {reason}'))
-            except queue.Empty:
-                logger.warning(f"SMTP verification timed out for {email}")
-                results.append((email, 'SMTP verification timeout'))
-                
-        except Exception as e:
-            logger.error(f"Unexpected error during verification of {email}: {str(e)}")
-            results.append((email, f'Error: {str(e)}'))
+        results.append((email, check_email(email, timeout_per_email)['status']))
     
-    logger.info(f"Completed verification of {len(emails)} emails")
+    events.debug("verify batch done", emails=len(emails))
     return results
 
 def batch_verify_emails(email_batches: List[List[str]], timeout_per_email: int = 30) -> Dict[str, str]:
-    """Verify batches of emails with proper rate limiting."""
+    """Verify batches of emails; pacing per mail server is left to the rate limiter."""
     all_results = {}
     
     for batch_index, email_batch in enumerate(email_batches):
@@ -371,21 +794,86 @@ def batch_verify_emails(email_batches: List[List[str]], timeout_per_email: int =
         # Store results
         for email, status in batch_results:
             all_results[email] = status
-            
-        # Add delay between batches to avoid rate limiting
-        if batch_index < len(email_batches) - 1:
-            delay = random.uniform(5, 10)
-            logger.info(f"Adding delay of {delay:.2f} seconds between batches")
-            time.sleep(delay)
     
     return all_results
 
+def group_entries_by_domain(entries: List[Tuple[str, str, str]]) -> List[Tuple[str, List[int]]]:
+    """Plan a run: group row indices by domain, domains in order of first appearance.
+    
+    Args:
+        entries: List of (first_name, last_name, domain) tuples
+        
+    Returns:
+        List of (domain, row indices) pairs; rows keep sheet order within a group
+    """
+    groups: Dict[str, List[int]] = {}
+    for index, (first_name, last_name, domain) in enumerate(entries):
+        key = (domain or '').strip().lower()
+        groups.setdefault(key, []).append(index)
+    return list(groups.items())
+
+def _verify_entry(first_name: str, last_name: str, domain: str,
+                  email_variations_func,
+                  timeout_per_email: int,
+                  stop_on_first_valid: bool) -> Dict[str, Any]:
+    """Verify the generated emails of one person; returns their result (valid_email '' if none found)."""
+    logger.info(f"Processing entry: {first_name} {last_name} at {domain}")
+    
+    # Generate email variations
+    email_variations = email_variations_func(first_name, last_name, domain)
+    events.debug("candidates", first_name=first_name, last_name=last_name, count=len(email_variations))
+    
+    # Verify emails one by one
+    valid_emails = []
+    
+    for email in email_variations:
+        # Verify single email
+        email_results = verify_emails([email], timeout_per_email=timeout_per_email)
+        
+        if email_results and 'Valid' in email_results[0][1]:
+            logger.info(f"Found valid email: {email}")
+            valid_emails.append((email, email_results[0][1]))
+            
+            # If we should stop on first valid email, break the loop
+            if stop_on_first_valid:
+                logger.info(f"Stopping verification for {first_name} {last_name} after finding valid email")
+                break
+    
+    if not valid_emails:
+        logger.warning(f"No valid emails found for {first_name} {last_name} at {domain}")
+        return entry_result(first_name, last_name, domain, NO_VALID_EMAIL_STATUS)
+    
+    # Sort by most likely to be valid
+    valid_emails.sort(key=lambda x: 0 if 'Valid email' in x[1] else 1)
+    
+    # Add best email to results
+    best_email, status = valid_emails[0]
+    logger.info(f"Best email for {first_name} {last_name}: {best_email} ({status})")
+    
+    return entry_result(first_name, last_name, domain, status, best_email)
+
+def entry_result(first_name: str, last_name: str, domain: str, status: str, valid_email: str = '') -> Dict[str, Any]:
+    """One row of process_name_entries' output."""
+    return {
+        'first_name': first_name,
+        'last_name': last_name,
+        'domain': domain,
+        'valid_email': valid_email,
+        'status': status
+    }
+
 def process_name_entries(entries: List[Tuple[str, str, str]], 
                          email_variations_func,
                          timeout_per_email: int = 30,
                          stop_on_first_valid: bool = True) -> List[Dict[str, Any]]:
     """Process a list of name entries and verify generated emails.
     
+    Rows are verified domain by domain: the MX lookup and catch-all probe run
+    once per domain, and all of a domain's candidates go through its pooled
+    SMTP session back to back. Results are still returned in row order, one
+    per row: rows without a valid email have valid_email '' and a status saying
+    why (no valid email, no domain, no mail server, accept-all/unverifiable).
+    
     Args:
         entries: List of (first_name, last_name, domain) tuples
         email_variations_func: Function to generate email variations
@@ -395,55 +883,34 @@ def process_name_entries(entries: List[Tuple[str, str, str]],
     logger.info(f"Processing {len(entries)} name entries with {timeout_per_email}s timeout per email")
     logger.info(f"Stop on first valid email: {stop_on_first_valid}")
     
-    results = []
+    results_by_row: Dict[int, Dict[str, Any]] = {}
+    groups = group_entries_by_domain(entries)
+    logger.info(f"Planned {len(groups)} domain groups")
     
-    # Process each name entry individually for better control
-    for entry in entries:
-        first_name, last_name, domain = entry
-        logger.info(f"Processing entry: {first_name} {last_name} at {domain}")
-        
-        # Generate email variations
-        email_variations = email_variations_func(first_name, last_name, domain)
-        logger.info(f"Generated {len(email_variations)} variations: {email_variations}")
-        
-        # Verify emails one by one
-        valid_emails = []
-        
-        for email in email_variations:
-            logger.info(f"Verifying email: {email}")
-            
-            # Verify single email
-            email_results = verify_emails([email], timeout_per_email=timeout_per_email)
-            
-            if email_results and 'Valid' in email_results[0][1]:
-                logger.info(f"Found valid email: {email}")
-                valid_emails.append((email, email_results[0][1]))
-                
-                # If we should stop on first valid email, break the loop
-                if stop_on_first_valid:
-                    logger.info(f"Stopping verification for {first_name} {last_name} after finding valid email")
-                    break
-            else:
-                logger.info(f"Email {email} is not valid")
+    for domain, row_indices in groups:
+        # Domain-level checks, once for the whole group
+        group_status = None
+        if not domain:
+            group_status = NO_DOMAIN_STATUS
+        elif not has_mx_record(domain):
+            group_status = NO_MAIL_SERVER_STATUS
+        elif is_catch_all_domain(domain):
+            group_status = ACCEPT_ALL_STATUS
+        if group_status:
+            logger.warning(f"{domain or '(missing domain)'}: {group_status}, "
+                           f"not probing {len(row_indices)} entries")
+            for index in row_indices:
+                first_name, last_name, entry_domain = entries[index]
+                results_by_row[index] = entry_result(first_name, last_name, entry_domain, group_status)
+            continue
         
-        # Add to results if we found valid emails
-        if valid_emails:
-            # Sort by most likely to be valid
-            valid_emails.sort(key=lambda x: 0 if 'Valid email' in x[1] else 1)
-            
-            # Add best email to results
-            best_email, status = valid_emails[0]
-            logger.info(f"Best email for {first_name} {last_name}: {best_email} ({status})")
-            
-            results.append({
-                'first_name': first_name,
-                'last_name': last_name,
-                'domain': domain,
-                'valid_email': best_email,
-                'status': status
-            })
-        else:
-            logger.warning(f"No valid emails found for {first_name} {last_name} at {domain}")
+        for index in row_indices:
+            first_name, last_name, entry_domain = entries[index]
+            results_by_row[index] = _verify_entry(first_name, last_name, entry_domain, email_variations_func,
+                                                  timeout_per_email, stop_on_first_valid)
     
-    logger.info(f"Completed processing with {len(results)} valid results")
+    close_smtp_sessions()
+    results = [results_by_row[index] for index in sorted(results_by_row)]
+    logger.info(f"Completed processing with {sum(1 for result in results if result['valid_email'])} "
+                f"valid results out of {len(results)} entries")
     return results
@@ -1,14 +1,64 @@
 import gspread
 from oauth2client.service_account import ServiceAccountCredentials
-from typing import List, Tuple, Dict, Any
+from typing import List, Tuple, Dict, Any, Iterable, Iterator
 import re
 import json
 import os
+import random
 import tempfile
+import threading
+import time
 import logging
 
+from check_records import CheckRecord, Outcome
+
 logger = logging.getLogger("google_sheets")
 
+# Rows fetched per request when reading an input sheet
+SHEET_READ_CHUNK_ROWS = int(os.environ.get('SHEET_READ_CHUNK_ROWS', 1000))
+# Input columns: first name, last name, domain or company
+INPUT_COLUMNS = ('A', 'C')
+
+# Result rows buffered before they're written, and the longest a row waits in the buffer (seconds)
+RESULTS_WRITE_BATCH_ROWS = int(os.environ.get('RESULTS_WRITE_BATCH_ROWS', 200))
+RESULTS_WRITE_INTERVAL = float(os.environ.get('RESULTS_WRITE_INTERVAL', 10))
+# Sheets allows 60 write requests per minute per user; stay well under it
+SHEETS_MIN_REQUEST_INTERVAL = float(os.environ.get('SHEETS_MIN_REQUEST_INTERVAL', 1.5))
+SHEETS_MAX_RETRIES = 6
+SHEETS_MAX_BACKOFF = 64
+# Quota and transient server errors worth retrying
+SHEETS_RETRY_CODES = (429, 500, 502, 503)
+
+RESULT_HEADERS = ["First Name", "Last Name", "Domain", "Valid Email", "Status", "Entry"]
+RESULT_SHEET_INITIAL_ROWS = 1000
+
+def iter_name_entries(rows: Iterable[List[str]], first_row: int = 2) -> Iterator[Tuple[int, Tuple[str, str, str]]]:
+    """Yield (sheet_row, (first_name, last_name, domain_or_company)) for each data row that has both names.
+    
+    Rows are parsed one at a time, so the entries can be streamed straight
+    into the job store without building a list. sheet_row counts from
+    first_row, the sheet row the first of `rows` was read from, and keeps
+    counting over skipped rows.
+    """
+    for sheet_row, row in enumerate(rows, first_row):
+        if len(row) >= 2 and row[0] and row[1]:  # Must have first and last name
+            # Get domain or company name from third column if available
+            domain_or_company = row[2].strip() if len(row) > 2 and row[2] else ""
+            yield sheet_row, (row[0].strip(), row[1].strip(), domain_or_company)
+
+def sheets_request(call):
+    """Run a Sheets API call, retrying with exponential backoff on quota (429) and 5xx errors."""
+    for attempt in range(SHEETS_MAX_RETRIES):
+        try:
+            return call()
+        except gspread.exceptions.APIError as e:
+            status = getattr(e.response, 'status_code', None)
+            if status not in SHEETS_RETRY_CODES or attempt == SHEETS_MAX_RETRIES - 1:
+                raise
+            delay = min(SHEETS_MAX_BACKOFF, 2 ** attempt) + random.uniform(0, 1)
+            logger.warning(f"Sheets API returned {status}, retrying in {delay:.1f}s")
+            time.sleep(delay)
+
 class GoogleSheetsHandler:
     def __init__(self, credentials_source: str):
         """Initialize the Google Sheets handler with credentials.
@@ -80,49 +130,115 @@ class GoogleSheetsHandler:
             logger.error(f"Error reading Google Sheet: {str(e)}")
             raise ValueError(f"Error reading Google Sheet: {str(e)}")
     
+    def open_worksheet(self, sheet_url: str, worksheet: str = None):
+        """Open a worksheet by title or 1-based number; the first one if none is given."""
+        sheet = self.client.open_by_url(sheet_url)
+        if worksheet is None or str(worksheet).strip() == '':
+            return sheet.get_worksheet(0)
+        worksheet = str(worksheet).strip()
+        try:
+            return sheet.worksheet(worksheet)
+        except gspread.exceptions.WorksheetNotFound:
+            if worksheet.isdigit() and int(worksheet) >= 1:
+                selected = sheet.get_worksheet(int(worksheet) - 1)
+                if selected is not None:
+                    return selected
+            raise ValueError(f"Worksheet not found: {worksheet}")
+    
+    def read_header(self, sheet_url: str, worksheet: str = None) -> List[str]:
+        """Read just the first row of a worksheet."""
+        try:
+            selected = self.open_worksheet(sheet_url, worksheet)
+            return sheets_request(lambda: selected.row_values(1))
+        except Exception as e:
+            logger.error(f"Error reading sheet header: {str(e)}")
+            raise ValueError(f"Error reading sheet header: {str(e)}")
+    
+    def iter_rows(self, sheet_url: str, worksheet: str = None, start_row: int = 2,
+                  chunk_rows: int = SHEET_READ_CHUNK_ROWS) -> Iterator[List[str]]:
+        """Yield the input columns of a worksheet row by row, fetching chunk_rows at a time.
+        
+        Each request asks for one A1 range (e.g. A2:C1001), and the next range is
+        only fetched once the caller has consumed the previous one, so memory
+        stays flat however long the sheet is. The API leaves trailing empty rows
+        out of a range; they're yielded as [] so the n-th row yielded is always
+        sheet row start_row + n.
+        
+        Args:
+            sheet_url: Spreadsheet URL
+            worksheet: Worksheet title or 1-based number; the first worksheet if None
+            start_row: First sheet row to read (2 skips the header); pass a later
+                row to resume a partly imported sheet
+            chunk_rows: Rows per request
+        """
+        selected = self.open_worksheet(sheet_url, worksheet)
+        first_column, last_column = INPUT_COLUMNS
+        row_count = selected.row_count
+        row = max(1, start_row)
+        chunk_rows = max(1, chunk_rows)
+        logger.info(f"Reading {selected.title} from row {row} in chunks of {chunk_rows} rows")
+        
+        while row <= row_count:
+            end_row = min(row + chunk_rows - 1, row_count)
+            cell_range = f"{first_column}{row}:{last_column}{end_row}"
+            values = sheets_request(lambda: selected.get(cell_range))
+            logger.debug(f"Read {len(values)} rows from {cell_range}")
+            yield from values
+            # Rows missing from the end of the range are empty ones
+            for _ in range(end_row - row + 1 - len(values)):
+                yield []
+            row = end_row + 1
+    
+    def read_name_entries(self, sheet_url: str, worksheet: str = None, start_row: int = 2,
+                          chunk_rows: int = SHEET_READ_CHUNK_ROWS) -> Iterator[Tuple[int, Tuple[str, str, str]]]:
+        """Yield (sheet_row, (first_name, last_name, domain_or_company)) from a worksheet, read in ranged chunks."""
+        return iter_name_entries(self.iter_rows(sheet_url, worksheet, start_row, chunk_rows), max(1, start_row))
+    
     def write_results_to_sheet(self, sheet_url: str, results: List[Dict[str, Any]]) -> str:
         """Write verification results to a new sheet."""
         try:
-            # Open the spreadsheet
-            logger.info(f"Opening spreadsheet for writing: {sheet_url}")
-            sheet = self.client.open_by_url(sheet_url)
-            
-            # Create a new worksheet for results
-            result_sheet_title = f"Results_{sheet.title}"
-            try:
-                # Try to get the sheet if it exists
-                result_sheet = sheet.worksheet(result_sheet_title)
-                # Clear existing content
-                result_sheet.clear()
-                logger.info(f"Cleared existing result sheet: {result_sheet_title}")
-            except gspread.exceptions.WorksheetNotFound:
-                # Create a new sheet if it doesn't exist
-                result_sheet = sheet.add_worksheet(title=result_sheet_title, rows="1000", cols="20")
-                logger.info(f"Created new result sheet: {result_sheet_title}")
-            
-            # Prepare headers
-            headers = ["First Name", "Last Name", "Domain", "Valid Email", "Status"]
-            
-            # Prepare data rows
-            rows = [headers]
+            writer = self.open_result_writer(sheet_url, clear=True)
             for result in results:
-                rows.append([
+                writer.add_row([
                     result.get('first_name', ''),
                     result.get('last_name', ''),
                     result.get('domain', ''),
                     result.get('valid_email', ''),
-                    result.get('status', '')
+                    result.get('status', ''),
+                    ''
                 ])
-            
-            # Update the sheet
-            result_sheet.update(rows)
+            writer.close()
             logger.info(f"Updated result sheet with {len(results)} results")
             
-            return f"Results written to sheet: {result_sheet_title}"
+            return f"Results written to sheet: {writer.title}"
         except Exception as e:
             logger.error(f"Error writing to Google Sheet: {str(e)}")
             return f"Error writing to Google Sheet: {str(e)}"
     
+    def open_result_writer(self, sheet_url: str, clear: bool = True) -> 'ResultSheetWriter':
+        """Open (or create) the Results_<title> worksheet and return an incremental writer for it.
+        
+        Args:
+            sheet_url: Spreadsheet the results belong to
+            clear: Start the result sheet over; pass False when resuming a job so
+                rows written before the interruption are kept
+        """
+        logger.info(f"Opening spreadsheet for writing: {sheet_url}")
+        sheet = self.client.open_by_url(sheet_url)
+        result_sheet_title = f"Results_{sheet.title}"
+        try:
+            # Try to get the sheet if it exists
+            result_sheet = sheet.worksheet(result_sheet_title)
+            if clear:
+                result_sheet.clear()
+                logger.info(f"Cleared existing result sheet: {result_sheet_title}")
+        except gspread.exceptions.WorksheetNotFound:
+            # Create a new sheet if it doesn't exist; it grows as results come in
+            result_sheet = sheet.add_worksheet(title=result_sheet_title, rows=RESULT_SHEET_INITIAL_ROWS,
+                                               cols=len(RESULT_HEADERS))
+            logger.info(f"Created new result sheet: {result_sheet_title}")
+        return ResultSheetWriter(result_sheet)
+    
     def parse_input_sheet(self, data: List[List[str]]) -> List[Tuple[str, str, str]]:
         """Parse input sheet data into a list of (first_name, last_name, domain) tuples."""
         results = []
@@ -148,4 +264,129 @@ class GoogleSheetsHandler:
                 results.append((first_name, last_name, domain))
         
         logger.info(f"Parsed {len(results)} name entries from sheet")
-        return results 
\ No newline at end of file
+        return results 
+
+class ResultSheetWriter:
+    """Appends result rows to a worksheet in batches while a job runs.
+    
+    Rows are buffered and written by a background thread every
+    RESULTS_WRITE_BATCH_ROWS rows or RESULTS_WRITE_INTERVAL seconds, whichever
+    comes first, so a crash only loses the last batch. The worksheet is grown
+    (doubling) before a batch would run past its last row. Requests are spaced
+    SHEETS_MIN_REQUEST_INTERVAL apart, and 429 / 5xx responses are retried
+    with exponential backoff; rows that still can't be written stay buffered
+    for the next attempt.
+    """
+    
+    def __init__(self, worksheet, batch_rows: int = RESULTS_WRITE_BATCH_ROWS,
+                 flush_interval: float = RESULTS_WRITE_INTERVAL):
+        self.worksheet = worksheet
+        self.title = worksheet.title
+        self.batch_rows = max(1, batch_rows)
+        self.flush_interval = flush_interval
+        self.rows_written = 0
+        self._buffer: List[List[Any]] = []
+        self._condition = threading.Condition()
+        self._closed = False
+        self._last_request = 0.0
+        self._last_flush = time.monotonic()
+        
+        # One read to find where earlier results end (none after a clear)
+        existing = self._request(lambda: self.worksheet.col_values(1))
+        if not existing:
+            self._request(lambda: self.worksheet.update(range_name='A1', values=[RESULT_HEADERS]))
+            existing = [RESULT_HEADERS[0]]
+        self.next_row = len(existing) + 1
+        self.row_count = self.worksheet.row_count
+        
+        self._thread = threading.Thread(target=self._run, daemon=True, name=f"sheet-writer-{self.title}")
+        self._thread.start()
+    
+    def add_row(self, row: List[Any]):
+        with self._condition:
+            self._buffer.append(row)
+            if len(self._buffer) >= self.batch_rows:
+                self._condition.notify()
+    
+    def add_result(self, sheet_row: int, entry: Tuple[str, str, str],
+                   checked: List[CheckRecord], valid: List[Dict[str, str]]):
+        """Queue the result of one sheet row: a line per valid email, or one line saying why there's none.
+        
+        The Entry column gets sheet_row, the row's number in the input sheet.
+        """
+        first_name, last_name, domain = entry
+        if valid:
+            for record in valid:
+                self.add_row([first_name, last_name, domain, record['email'], 'Valid', sheet_row])
+            return
+        if not domain or '.' not in domain:
+            status = 'No domain found'
+        elif checked and checked[-1].outcome != Outcome.INVALID:
+            # Say why there's no answer (accept-all, greylisted, timed out ...)
+            status = checked[-1].status
+        else:
+            status = 'No valid email found'
+        self.add_row([first_name, last_name, domain, '', status, sheet_row])
+    
+    def close(self) -> int:
+        """Write whatever is still buffered and stop the writer thread.
+        
+        Returns:
+            int: Rows that could not be written, 0 if the sheet is complete
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+        if self._buffer:
+            logger.error(f"{len(self._buffer)} result rows could not be written to {self.title}")
+        return len(self._buffer)
+    
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._closed and len(self._buffer) < self.batch_rows and (
+                        not self._buffer or time.monotonic() - self._last_flush < self.flush_interval):
+                    self._condition.wait(timeout=1.0)
+                closed = self._closed
+            self._flush()
+            if closed:
+                return
+    
+    def _flush(self):
+        with self._condition:
+            rows, self._buffer = self._buffer, []
+        self._last_flush = time.monotonic()
+        if not rows:
+            return
+        try:
+            self._write(rows)
+        except Exception as e:
+            logger.error(f"Error writing {len(rows)} result rows to {self.title}: {str(e)}")
+            with self._condition:
+                self._buffer[:0] = rows
+    
+    def _write(self, rows: List[List[Any]]):
+        last_row = self.next_row + len(rows) - 1
+        if last_row > self.row_count:
+            added = max(last_row - self.row_count, self.row_count)
+            self._request(lambda: self.worksheet.add_rows(added))
+            self.row_count += added
+            logger.info(f"Grew {self.title} to {self.row_count} rows")
+        
+        end_column = chr(ord('A') + len(RESULT_HEADERS) - 1)
+        cell_range = f"A{self.next_row}:{end_column}{last_row}"
+        self._request(lambda: self.worksheet.update(range_name=cell_range, values=rows))
+        self.next_row = last_row + 1
+        self.rows_written += len(rows)
+        logger.info(f"Wrote {len(rows)} result rows to {self.title} ({self.rows_written} so far)")
+    
+    def _request(self, call):
+        """Run a Sheets API call spaced SHEETS_MIN_REQUEST_INTERVAL after the previous one."""
+        def paced_call():
+            wait = self._last_request + SHEETS_MIN_REQUEST_INTERVAL - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            self._last_request = time.monotonic()
+            return call()
+        return sheets_request(paced_call)
@@ -0,0 +1,554 @@
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import storage
+from check_records import CheckRecord, decode_records, encode_records
+import verification_engine
+
+logger = logging.getLogger("jobs")
+
+# Row states
+ROW_PENDING = 'pending'
+ROW_DONE = 'done'
+
+# Job states that mean the job was interrupted and should be picked up again
+RESUMABLE_STATUSES = ('initializing', 'finding_domains', 'running')
+
+# Rows inserted per statement when a job is created from a sheet
+JOB_INSERT_BATCH = 1000
+
+# Seconds a previewed sheet job waits to be started before it's deleted
+JOB_DRAFT_TTL = int(os.environ.get('JOB_DRAFT_TTL', 24 * 3600))
+
+# Cap on SMTP probes in flight across all jobs
+MAX_OUTBOUND_CONNECTIONS = int(os.environ.get('MAX_OUTBOUND_CONNECTIONS', 16))
+
+# A running job's owner refreshes its heartbeat this often (seconds)
+JOB_HEARTBEAT_INTERVAL = int(os.environ.get('JOB_HEARTBEAT_INTERVAL', 30))
+# A job whose heartbeat is older than this is considered orphaned and can be claimed by another process
+JOB_CLAIM_TIMEOUT = int(os.environ.get('JOB_CLAIM_TIMEOUT', 120))
+
+# Identifies this process in jobs.owner; every gunicorn worker / serverless instance gets its own
+PROCESS_OWNER = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+JOBS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    sheet_url TEXT,
+    params TEXT NOT NULL,
+    total INTEGER NOT NULL,
+    domains_resolved INTEGER NOT NULL DEFAULT 0,
+    error_message TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    owner TEXT,
+    heartbeat REAL,
+    results_unwritten INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS job_rows (
+    job_id TEXT NOT NULL,
+    row_index INTEGER NOT NULL,
+    first_name TEXT,
+    last_name TEXT,
+    domain_or_company TEXT,
+    domain TEXT,
+    state TEXT NOT NULL,
+    result TEXT,
+    sheet_row INTEGER,
+    PRIMARY KEY (job_id, row_index)
+);
+"""
+
+
+class JobStore:
+    """Persists sheet jobs so they survive a restart of the Flask process.
+
+    A job keeps its input rows, the domain resolved for each row, each row's
+    state and the partial results written as rows complete, so an interrupted
+    job resumes after the last completed row instead of starting over.
+    """
+
+    def _database(self) -> storage.Database:
+        database = storage.get_database()
+        database.ensure_schema('jobs', JOBS_SCHEMA)
+        return database
+
+    def create_job(self, name_entries: Iterable[Tuple[str, str, str]], sheet_url: str = '',
+                   params: Dict[str, Any] = None, status: str = 'initializing', numbered: bool = False) -> str:
+        """Store a new job with its input rows and return its ID.
+        
+        name_entries can be a generator; rows are written JOB_INSERT_BATCH at a
+        time, so a 100k-row sheet never has to be held in memory. With numbered,
+        they are (sheet_row, entry) pairs as read_name_entries yields them, and
+        results refer back to the sheet row. Jobs created with status 'draft'
+        wait for start_job and are never auto-resumed.
+        """
+        job_id = uuid.uuid4().hex[:12]
+        now = time.time()
+        database = self._database()
+        database.execute(
+            "INSERT INTO jobs (id, status, sheet_url, params, total, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (job_id, status, sheet_url, json.dumps(params or {}), 0, now, now))
+        
+        entries = iter(name_entries)
+        total = 0
+        while True:
+            batch = list(islice(entries, JOB_INSERT_BATCH))
+            if not batch:
+                break
+            if not numbered:
+                batch = [(None, entry) for entry in batch]
+            database.executemany(
+                "INSERT INTO job_rows (job_id, row_index, first_name, last_name, domain_or_company, state, sheet_row) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(job_id, total + i, first, last, domain_or_company, ROW_PENDING, sheet_row)
+                 for i, (sheet_row, (first, last, domain_or_company)) in enumerate(batch)])
+            total += len(batch)
+        database.execute("UPDATE jobs SET total = ? WHERE id = ?", (total, job_id))
+        logger.info(f"Created job {job_id} with {total} rows")
+        return job_id
+    
+    def start_job(self, job_id: str, params: Dict[str, Any]):
+        """Turn a draft job into one the scheduler runs (and resumes), with its final params."""
+        self._database().execute(
+            "UPDATE jobs SET status = ?, params = ?, updated_at = ? WHERE id = ?",
+            ('initializing', json.dumps(params), time.time(), job_id))
+
+    def delete_expired_drafts(self, max_age: int = JOB_DRAFT_TTL) -> int:
+        """Delete draft jobs (previews nobody started) older than max_age seconds; returns how many."""
+        database = self._database()
+        job_ids = [row[0] for row in database.execute(
+            "SELECT id FROM jobs WHERE status = 'draft' AND created_at < ?", (time.time() - max_age,))]
+        if job_ids:
+            database.executemany("DELETE FROM job_rows WHERE job_id = ?", [(job_id,) for job_id in job_ids])
+            database.executemany("DELETE FROM jobs WHERE id = ?", [(job_id,) for job_id in job_ids])
+            logger.info(f"Deleted {len(job_ids)} expired draft jobs")
+        return len(job_ids)
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self._database().query_one(
+            "SELECT id, status, sheet_url, params, total, domains_resolved, error_message, created_at, updated_at, "
+            "results_unwritten FROM jobs WHERE id = ?", (job_id,))
+        if not row:
+            return None
+        return {
+            'id': row[0],
+            'status': row[1],
+            'sheet_url': row[2],
+            'params': json.loads(row[3]),
+            'total': row[4],
+            'domains_resolved': bool(row[5]),
+            'error_message': row[6] or '',
+            'created_at': row[7],
+            'updated_at': row[8],
+            'results_unwritten': bool(row[9])
+        }
+
+    def set_results_unwritten(self, job_id: str, unwritten: bool):
+        """Flag a job whose Results sheet is missing rows, so its next run writes the sheet again."""
+        self._database().execute(
+            "UPDATE jobs SET results_unwritten = ? WHERE id = ?", (int(unwritten), job_id))
+
+    def set_status(self, job_id: str, status: str, error_message: str = ''):
+        self._database().execute(
+            "UPDATE jobs SET status = ?, error_message = ?, updated_at = ? WHERE id = ?",
+            (status, error_message, time.time(), job_id))
+
+    def get_entries(self, job_id: str) -> List[Tuple[str, str, str]]:
+        """Return the rows as (first_name, last_name, domain) with resolved domains where known."""
+        rows = self._database().execute(
+            "SELECT first_name, last_name, COALESCE(domain, domain_or_company) FROM job_rows "
+            "WHERE job_id = ? ORDER BY row_index", (job_id,))
+        return [tuple(row) for row in rows]
+
+    def preview_entries(self, job_id: str, limit: int = 10) -> List[Tuple[str, str, str]]:
+        """First few rows as read from the sheet, for the preview page."""
+        rows = self._database().execute(
+            "SELECT first_name, last_name, domain_or_company FROM job_rows "
+            "WHERE job_id = ? ORDER BY row_index LIMIT ?", (job_id, limit))
+        return [tuple(row) for row in rows]
+    
+    def has_company_names(self, job_id: str) -> bool:
+        """Whether any row names a company instead of a domain."""
+        row = self._database().query_one(
+            "SELECT 1 FROM job_rows WHERE job_id = ? AND domain_or_company != '' "
+            "AND instr(domain_or_company, '.') = 0 LIMIT 1", (job_id,))
+        return row is not None
+    
+    def get_original_entries(self, job_id: str) -> List[Tuple[str, str, str]]:
+        """Return the rows as they were read from the sheet."""
+        rows = self._database().execute(
+            "SELECT first_name, last_name, domain_or_company FROM job_rows "
+            "WHERE job_id = ? ORDER BY row_index", (job_id,))
+        return [tuple(row) for row in rows]
+
+    def set_domains(self, job_id: str, entries: List[Tuple[str, str, str]], row_indices: List[int] = None):
+        """Checkpoint the output of domain discovery so it isn't repeated on resume.
+        
+        Without row_indices, entries are the whole sheet and the job is marked
+        as resolved; with them, only those rows are updated.
+        """
+        database = self._database()
+        if row_indices is None:
+            row_indices = list(range(len(entries)))
+            self.mark_domains_resolved(job_id)
+        database.executemany(
+            "UPDATE job_rows SET domain = ? WHERE job_id = ? AND row_index = ?",
+            [(domain, job_id, i) for i, (first, last, domain) in zip(row_indices, entries)])
+    
+    def mark_domains_resolved(self, job_id: str):
+        self._database().execute(
+            "UPDATE jobs SET domains_resolved = 1, updated_at = ? WHERE id = ?", (time.time(), job_id))
+
+    def iter_pending_batches(self, job_id: str,
+                             batch_size: int) -> Iterator[List[Tuple[int, Tuple[str, str, str], bool]]]:
+        """Yield the rows that haven't completed yet, batch_size at a time, in sheet order.
+        
+        Each item is (row_index, entry, domain_resolved); unresolved rows carry
+        the sheet's domain/company column. Batches are read one query at a time
+        (keyset paging on row_index), so memory stays flat however big the job.
+        """
+        last_index = -1
+        while True:
+            rows = self._database().execute(
+                "SELECT row_index, first_name, last_name, COALESCE(domain, domain_or_company), domain IS NOT NULL "
+                "FROM job_rows WHERE job_id = ? AND state = ? AND row_index > ? ORDER BY row_index LIMIT ?",
+                (job_id, ROW_PENDING, last_index, batch_size))
+            if not rows:
+                return
+            last_index = rows[-1][0]
+            yield [(row[0], (row[1], row[2], row[3]), bool(row[4])) for row in rows]
+    
+    def sheet_rows(self, job_id: str, row_indices: List[int]) -> Dict[int, int]:
+        """{row_index: row number in the source sheet}; jobs not read from a sheet count from 1."""
+        if not row_indices:
+            return {}
+        placeholders = ','.join('?' for _ in row_indices)
+        rows = self._database().execute(
+            f"SELECT row_index, COALESCE(sheet_row, row_index + 1) FROM job_rows "
+            f"WHERE job_id = ? AND row_index IN ({placeholders})", (job_id, *row_indices))
+        return {row_index: sheet_row for row_index, sheet_row in rows}
+
+    def iter_completed_batches(self, job_id: str, batch_size: int
+                               ) -> Iterator[List[Tuple[int, Tuple[str, str, str], List[CheckRecord], List[Dict[str, str]]]]]:
+        """Yield completed rows as (sheet_row, entry, checked, valid), batch_size at a time, in sheet order.
+        
+        Used to write a job's results out again; paged like iter_pending_batches.
+        """
+        last_index = -1
+        while True:
+            rows = self._database().execute(
+                "SELECT row_index, COALESCE(sheet_row, row_index + 1), first_name, last_name, "
+                "COALESCE(domain, domain_or_company), result FROM job_rows "
+                "WHERE job_id = ? AND state = ? AND row_index > ? ORDER BY row_index LIMIT ?",
+                (job_id, ROW_DONE, last_index, batch_size))
+            if not rows:
+                return
+            last_index = rows[-1][0]
+            batch = []
+            for _, sheet_row, first_name, last_name, domain, result in rows:
+                data = json.loads(result) if result else {}
+                checked = decode_records(data.get('checked', []), data.get('domain', ''))
+                batch.append((sheet_row, (first_name, last_name, domain), checked, data.get('valid', [])))
+            yield batch
+
+    def complete_rows(self, job_id: str, rows: List[Tuple[int, str, List[CheckRecord], List[Dict[str, str]]]]):
+        """Checkpoint several finished rows, (row_index, person_key, checked, valid), in one transaction.
+        
+        Checked addresses are stored compactly, as [pattern, local_part, outcome]
+        under the row's domain.
+        """
+        database = self._database()
+        database.executemany(
+            "UPDATE job_rows SET state = ?, result = ? WHERE job_id = ? AND row_index = ?",
+            [(ROW_DONE, self._encode_result(person_key, checked, valid), job_id, row_index)
+             for row_index, person_key, checked, valid in rows])
+        database.execute("UPDATE jobs SET updated_at = ? WHERE id = ?", (time.time(), job_id))
+
+    @staticmethod
+    def _encode_result(person_key: str, checked: List[CheckRecord], valid: List[Dict[str, str]]) -> str:
+        return json.dumps({
+            'person_key': person_key,
+            'domain': checked[0].domain if checked else '',
+            'checked': encode_records(checked),
+            'valid': valid
+        }, ensure_ascii=False, separators=(',', ':'))
+    
+    def completed_count(self, job_id: str) -> int:
+        row = self._database().query_one(
+            "SELECT COUNT(*) FROM job_rows WHERE job_id = ? AND state = ?", (job_id, ROW_DONE))
+        return row[0] if row else 0
+
+    def get_results(self, job_id: str) -> Dict[str, Any]:
+        """Rebuild valid_emails and all_checked_emails ({person_key: [CheckRecord]}), in sheet order."""
+        rows = self._database().execute(
+            "SELECT result FROM job_rows WHERE job_id = ? AND state = ? AND result IS NOT NULL "
+            "ORDER BY row_index", (job_id, ROW_DONE))
+        valid_emails = []
+        all_checked_emails = {}
+        for (result,) in rows:
+            data = json.loads(result)
+            valid_emails.extend(data.get('valid', []))
+            if data.get('person_key'):
+                all_checked_emails.setdefault(data['person_key'], []).extend(
+                    decode_records(data.get('checked', []), data.get('domain', '')))
+        return {'valid_emails': valid_emails, 'all_checked_emails': all_checked_emails}
+
+    def get_valid_emails(self, job_id: str) -> List[Dict[str, str]]:
+        """Valid emails of completed rows in sheet order, without loading every checked address."""
+        rows = self._database().execute(
+            "SELECT json_extract(result, '$.valid') FROM job_rows WHERE job_id = ? AND state = ? "
+            "AND result IS NOT NULL AND json_array_length(result, '$.valid') > 0 ORDER BY row_index",
+            (job_id, ROW_DONE))
+        return [record for (valid,) in rows for record in json.loads(valid)]
+    
+    def resumable_jobs(self) -> List[str]:
+        """IDs of jobs that were interrupted while running and that no live process owns."""
+        placeholders = ','.join('?' for _ in RESUMABLE_STATUSES)
+        rows = self._database().execute(
+            f"SELECT id FROM jobs WHERE status IN ({placeholders}) "
+            f"AND (owner IS NULL OR heartbeat < ?) ORDER BY created_at",
+            (*RESUMABLE_STATUSES, time.time() - JOB_CLAIM_TIMEOUT))
+        return [row[0] for row in rows]
+
+    def claim_job(self, job_id: str, owner: str = PROCESS_OWNER) -> bool:
+        """Take ownership of a job, atomically; False if another live process owns it.
+        
+        A claim is free when nobody owns the job, this process already does, or
+        the owner's heartbeat is older than JOB_CLAIM_TIMEOUT (it died). Only the
+        process whose UPDATE changed the row gets to run the job.
+        """
+        now = time.time()
+        return self._database().update(
+            "UPDATE jobs SET owner = ?, heartbeat = ? WHERE id = ? "
+            "AND (owner IS NULL OR owner = ? OR heartbeat < ?)",
+            (owner, now, job_id, owner, now - JOB_CLAIM_TIMEOUT)) == 1
+
+    def heartbeat(self, job_ids: List[str], owner: str = PROCESS_OWNER):
+        """Tell other processes the jobs this process runs are still alive."""
+        now = time.time()
+        self._database().executemany(
+            "UPDATE jobs SET heartbeat = ? WHERE id = ? AND owner = ?",
+            [(now, job_id, owner) for job_id in job_ids])
+
+    def release_job(self, job_id: str, owner: str = PROCESS_OWNER):
+        self._database().execute(
+            "UPDATE jobs SET owner = NULL, heartbeat = NULL WHERE id = ? AND owner = ?", (job_id, owner))
+
+
+job_store = JobStore()
+
+
+class FairShareLimiter:
+    """Hands out a fixed number of probe slots round-robin between jobs.
+
+    Each job queues its own requests; when a slot frees up it goes to the next
+    job in rotation that is waiting, so a 10,000-row job can't starve a 10-row
+    one that started after it.
+    """
+
+    def __init__(self, capacity: int = MAX_OUTBOUND_CONNECTIONS):
+        self.capacity = max(1, capacity)
+        self.in_use = 0
+        self._condition = threading.Condition()
+        self._waiting: Dict[str, deque] = {}
+        self._rotation: deque = deque()
+
+    def acquire(self, job_id: str):
+        ticket = {'granted': False}
+        with self._condition:
+            self._waiting.setdefault(job_id, deque()).append(ticket)
+            if job_id not in self._rotation:
+                self._rotation.append(job_id)
+            self._grant()
+            while not ticket['granted']:
+                self._condition.wait()
+
+    def release(self):
+        with self._condition:
+            self.in_use -= 1
+            self._grant()
+
+    def _grant(self):
+        granted = False
+        while self.in_use < self.capacity and self._rotation:
+            job_id = self._rotation.popleft()
+            queue = self._waiting[job_id]
+            queue.popleft()['granted'] = True
+            self.in_use += 1
+            granted = True
+            if queue:
+                self._rotation.append(job_id)
+            else:
+                del self._waiting[job_id]
+        if granted:
+            self._condition.notify_all()
+
+    @contextmanager
+    def slot(self, job_id: str):
+        self.acquire(job_id)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._condition:
+            return {
+                'capacity': self.capacity,
+                'in_use': self.in_use,
+                'waiting': {job_id: len(queue) for job_id, queue in self._waiting.items()}
+            }
+
+
+def new_progress(job_id: str, total: int = 0) -> Dict[str, Any]:
+    """Progress dict in the layout the sheet progress page reads."""
+    return {
+        'job_id': job_id,
+        'status': 'initializing',
+        'total': total,
+        'current': 0,
+        'valid_emails': [],
+        'all_checked_emails': {},
+        'current_name': '',
+        'current_email': '',
+        'current_email_index': 0,
+        'total_emails': 0,
+        'error_message': '',
+        'type': 'sheet'
+    }
+
+
+class JobHandle:
+    """A job running in this process: its live progress and cancellation flag."""
+
+    def __init__(self, job_id: str, total: int = 0):
+        self.job_id = job_id
+        self.progress = new_progress(job_id, total)
+        self.stop_event = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+    def should_stop(self) -> bool:
+        return self.stop_event.is_set()
+
+    @property
+    def is_running(self) -> bool:
+        return self.thread is not None and self.thread.is_alive()
+
+
+class JobScheduler:
+    """Registry of jobs running in this process.
+
+    Every job runs on its own thread with its own progress and cancellation.
+    They share one FairShareLimiter (the outbound connection budget) and one
+    set of per-MX semaphores, so adding jobs never adds load on a mail server.
+    """
+
+    def __init__(self, max_connections: int = MAX_OUTBOUND_CONNECTIONS, store: JobStore = job_store):
+        self.limiter = FairShareLimiter(max_connections)
+        self.mx_slots = verification_engine.MXSlots()
+        self.store = store
+        self._jobs: Dict[str, JobHandle] = {}
+        self._lock = threading.Lock()
+        self._heartbeat_thread: Optional[threading.Thread] = None
+
+    def start(self, job_id: str, target: Callable[[JobHandle], None], total: int = 0) -> Optional[JobHandle]:
+        """Run target(handle) for the job on a background thread, unless it already runs.
+        
+        The job is claimed in the job store first, so when several processes
+        (gunicorn workers, serverless instances) try to start or resume the same
+        job only one runs it. Returns None if another process owns it.
+        """
+        with self._lock:
+            handle = self._jobs.get(job_id)
+            if handle and handle.is_running:
+                return handle
+            if not self.store.claim_job(job_id):
+                logger.info(f"Job {job_id} is owned by another process, not starting it here")
+                return None
+            handle = JobHandle(job_id, total)
+            self._jobs[job_id] = handle
+        handle.thread = threading.Thread(target=self._run, args=(handle, target), daemon=True,
+                                         name=f"job-{job_id}")
+        handle.thread.start()
+        self._ensure_heartbeat()
+        logger.info(f"Started job {job_id}")
+        return handle
+
+    def _run(self, handle: JobHandle, target: Callable[[JobHandle], None]):
+        try:
+            target(handle)
+        finally:
+            try:
+                self.store.release_job(handle.job_id)
+            except Exception as e:
+                logger.error(f"Error releasing job {handle.job_id}: {str(e)}")
+            # The job's final status is in the job store now, which is where progress
+            # pages read it from once the handle is gone
+            with self._lock:
+                if self._jobs.get(handle.job_id) is handle:
+                    del self._jobs[handle.job_id]
+
+    def _ensure_heartbeat(self):
+        with self._lock:
+            if self._heartbeat_thread is not None:
+                return
+            self._heartbeat_thread = threading.Thread(target=self._heartbeat_loop, daemon=True,
+                                                      name="job-heartbeat")
+            self._heartbeat_thread.start()
+
+    def _heartbeat_loop(self):
+        # Runs while this process has jobs; started again by the next start()
+        while True:
+            time.sleep(JOB_HEARTBEAT_INTERVAL)
+            with self._lock:
+                # Checked and cleared together, so a job started meanwhile gets a new heartbeat thread
+                job_ids = [job_id for job_id, handle in self._jobs.items() if handle.is_running]
+                if not job_ids:
+                    self._heartbeat_thread = None
+                    return
+            try:
+                self.store.heartbeat(job_ids)
+            except Exception as e:
+                logger.error(f"Error refreshing job heartbeats: {str(e)}")
+
+    def get(self, job_id: str) -> Optional[JobHandle]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> bool:
+        """Ask a running job to stop; returns False if it isn't running here."""
+        handle = self.get(job_id)
+        if not handle or not handle.is_running:
+            return False
+        handle.stop_event.set()
+        handle.progress['status'] = 'stopping'
+        handle.progress['error_message'] = "Processing is being stopped..."
+        logger.info(f"Cancellation requested for job {job_id}")
+        return True
+
+    def engine_options(self, handle: JobHandle) -> Dict[str, Any]:
+        """Keyword arguments that tie a VerificationEngine to the shared limits."""
+        return {
+            'should_stop': handle.should_stop,
+            'mx_slots': self.mx_slots,
+            'probe_slot': lambda: self.limiter.slot(handle.job_id)
+        }
+
+    def running_jobs(self) -> List[str]:
+        with self._lock:
+            return [job_id for job_id, handle in self._jobs.items() if handle.is_running]
+
+
+scheduler = JobScheduler()
@@ -0,0 +1,230 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import threading
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, List
+
+# Level for every logger without a level of its own
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+# Per-subsystem levels, e.g. "domain_finder=DEBUG,email_verifier=WARNING"
+LOG_LEVELS = os.environ.get('LOG_LEVELS', '')
+# 'text' for the usual one-line format, 'json' for one JSON object per line
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'text').lower()
+# Share of per-candidate events (each generated address, RCPT reply, check result)
+# logged at INFO; a subsystem set to DEBUG logs all of them
+LOG_SAMPLE_RATE = float(os.environ.get('LOG_SAMPLE_RATE', 0.01))
+# Records waiting for the writer thread; when it's full new DEBUG/INFO records are
+# dropped instead of making a verification worker wait for the disk (warnings and
+# errors are always kept)
+LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10000))
+# Log files (as shown on the /logs page) are only written outside production
+LOG_TO_FILE = os.environ.get('LOG_TO_FILE', str(os.environ.get('VERCEL_ENV') != 'production')).lower() == 'true'
+
+# Directory the log files go to (the working directory by default)
+LOG_DIR = os.environ.get('LOG_DIR', '')
+APP_LOG_FILE = os.path.join(LOG_DIR, 'app.log')
+VERIFICATION_LOG_FILE = os.path.join(LOG_DIR, 'email_verification.log')
+# Subsystems also written to VERIFICATION_LOG_FILE
+VERIFICATION_LOGGERS = ('email_verifier', 'verification_engine')
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Attributes every LogRecord has, so anything else came in through `extra`
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+def parse_levels(spec: str) -> Dict[str, int]:
+    """{'domain_finder': logging.DEBUG, ...} from "domain_finder=DEBUG,..."; bad entries are ignored."""
+    levels = {}
+    for item in spec.split(','):
+        name, _, level = item.partition('=')
+        level = logging.getLevelName(level.strip().upper())
+        if name.strip() and isinstance(level, int):
+            levels[name.strip()] = level
+    return levels
+
+
+def record_fields(record: logging.LogRecord) -> Dict[str, Any]:
+    return {key: value for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES}
+
+
+class TextFormatter(logging.Formatter):
+    """The usual line, with an event's fields appended as key=value."""
+
+    def formatMessage(self, record: logging.LogRecord) -> str:
+        line = super().formatMessage(record)
+        fields = record_fields(record)
+        if fields:
+            line += ' ' + ' '.join(f"{key}={value}" for key, value in fields.items())
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, message and the event's fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        entry.update(record_fields(record))
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class LoggerNameFilter(logging.Filter):
+    """Passes records from any of the given loggers (and their children)."""
+
+    def __init__(self, names: List[str]):
+        super().__init__()
+        self.names = tuple(names)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return any(record.name == name or record.name.startswith(name + '.') for name in self.names)
+
+
+def put_past_bound(log_queue: queue.Queue, item):
+    """Same as put(), minus the maxsize check, for the few items that must not be dropped."""
+    with log_queue.mutex:
+        log_queue.queue.append(item)
+        log_queue.unfinished_tasks += 1
+        log_queue.not_empty.notify()
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """Hands records to the writer thread without formatting or waiting.
+
+    The standard QueueHandler formats every message on the calling thread;
+    here the record goes onto the queue as it is and the listener formats it,
+    so a verification worker only pays for creating the record. When the queue
+    is full, DEBUG and INFO records (which is where sampled per-candidate
+    events go) are dropped and counted; warnings and errors are queued anyway,
+    past the bound, since they are few and the ones worth keeping.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            if record.levelno < logging.WARNING:
+                self.dropped += 1
+                return
+            put_past_bound(self.queue, record)
+
+
+class WriterThread(QueueListener):
+    """QueueListener whose stop signal gets through even when the queue is full."""
+
+    def enqueue_sentinel(self):
+        put_past_bound(self.queue, self._sentinel)
+
+
+class EventLogger:
+    """Structured events for one subsystem: `events.info("smtp connect", mx_host=host)`.
+
+    Fields go into the record as attributes and are only turned into text by
+    the writer thread, and only if the level is enabled, so a disabled event
+    costs a level check. `sampled` is for per-candidate events that would
+    otherwise flood the log: all of them at DEBUG, a LOG_SAMPLE_RATE share at INFO.
+    """
+
+    def __init__(self, name: str, sample_rate: float = None):
+        self.logger = logging.getLogger(name)
+        self.sample_rate = LOG_SAMPLE_RATE if sample_rate is None else sample_rate
+
+    def log(self, level: int, event: str, fields: Dict[str, Any], exc_info=None):
+        if self.logger.isEnabledFor(level):
+            self.logger.log(level, event, extra=fields, exc_info=exc_info, stacklevel=3)
+
+    def debug(self, event: str, **fields):
+        self.log(logging.DEBUG, event, fields)
+
+    def info(self, event: str, **fields):
+        self.log(logging.INFO, event, fields)
+
+    def warning(self, event: str, **fields):
+        self.log(logging.WARNING, event, fields)
+
+    def error(self, event: str, exc_info=None, **fields):
+        self.log(logging.ERROR, event, fields, exc_info=exc_info)
+
+    def sampled(self, event: str, **fields):
+        """Log a per-candidate event: always at DEBUG, otherwise a sample of them at INFO."""
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.log(logging.DEBUG, event, extra=fields, stacklevel=2)
+        elif self.sample_rate > 0 and self.logger.isEnabledFor(logging.INFO) and random.random() < self.sample_rate:
+            fields['sampled'] = self.sample_rate
+            self.logger.log(logging.INFO, event, extra=fields, stacklevel=2)
+
+
+_listener = None
+_queue_handler = None
+_configure_lock = threading.Lock()
+
+
+def configure_logging(level: str = LOG_LEVEL, levels: str = LOG_LEVELS, log_to_file: bool = LOG_TO_FILE):
+    """Route all logging through a queue to a background writer thread.
+
+    Replaces the root handlers with a NonBlockingQueueHandler; a QueueListener
+    writes to stderr and, outside production, to APP_LOG_FILE (everything) and
+    VERIFICATION_LOG_FILE (VERIFICATION_LOGGERS only). The files are only
+    created once something is written to them. Safe to call more than once.
+    """
+    global _listener, _queue_handler
+    with _configure_lock:
+        if _listener is not None:
+            return
+
+        formatter = JsonFormatter() if LOG_FORMAT == 'json' else TextFormatter(TEXT_FORMAT)
+        handlers: List[logging.Handler] = [logging.StreamHandler()]
+        if log_to_file:
+            if LOG_DIR:
+                os.makedirs(LOG_DIR, exist_ok=True)
+            handlers.append(logging.FileHandler(APP_LOG_FILE, encoding='utf-8', delay=True))
+            verification_handler = logging.FileHandler(VERIFICATION_LOG_FILE, encoding='utf-8', delay=True)
+            verification_handler.addFilter(LoggerNameFilter(VERIFICATION_LOGGERS))
+            handlers.append(verification_handler)
+        for handler in handlers:
+            handler.setFormatter(formatter)
+
+        _queue_handler = NonBlockingQueueHandler(queue.Queue(maxsize=max(1, LOG_QUEUE_SIZE)))
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(_queue_handler)
+        root.setLevel(level)
+        for name, subsystem_level in parse_levels(levels).items():
+            logging.getLogger(name).setLevel(subsystem_level)
+
+        _listener = WriterThread(_queue_handler.queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """Write out whatever is still queued and stop the writer thread."""
+    global _listener
+    with _configure_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+def get_stats() -> Dict[str, int]:
+    if _queue_handler is None:
+        return {'queued': 0, 'dropped': 0}
+    return {'queued': _queue_handler.queue.qsize(), 'dropped': _queue_handler.dropped}
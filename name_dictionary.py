@@ -0,0 +1,146 @@
+import logging
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from transliteration import transliterate
+
+logger = logging.getLogger("name_dictionary")
+
+# Dictionary of first-name spellings and surname endings, and extra files layered
+# on top of it (separated by os.pathsep); entries in later files replace earlier ones
+NAME_DICTIONARY_PATH = os.environ.get(
+    'NAME_DICTIONARY_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'name_variants.txt')
+)
+NAME_DICTIONARY_EXTRA = os.environ.get('NAME_DICTIONARY_EXTRA', '')
+
+# Sections holding surname endings; they all go into one trie
+ENDING_SECTIONS = ('surname_endings', 'feminine_surname_endings', 'patronymic_endings')
+
+# Key of the value stored at a trie node (never a letter)
+_VALUE = ''
+
+
+class SurnameEnding(NamedTuple):
+    ending: str
+    variants: Tuple[str, ...]
+    # Length of the ending's default (most common) transliteration, so it can be cut off a transliterated surname
+    latin_length: int
+
+
+class SuffixTrie:
+    """Word endings stored back to front, so a word's longest known ending is found
+    in one walk from its last letter, O(len(word)) however many endings there are.
+    """
+
+    def __init__(self):
+        self._root: Dict[str, dict] = {}
+        self._size = 0
+
+    def insert(self, ending: str, value) -> None:
+        node = self._root
+        for char in reversed(ending):
+            node = node.setdefault(char, {})
+        if _VALUE not in node:
+            self._size += 1
+        node[_VALUE] = value
+
+    def longest_match(self, word: str):
+        """Value of the longest ending of `word` that's in the trie and shorter than the word, or None."""
+        node = self._root
+        match = None
+        # Stop one letter short: an ending has to leave something of the word in front of it
+        for char in reversed(word[1:]):
+            node = node.get(char)
+            if node is None:
+                break
+            if _VALUE in node:
+                match = node[_VALUE]
+        return match
+
+    def __len__(self) -> int:
+        return self._size
+
+
+def normalize_name(name: str) -> str:
+    """Key a first name is looked up by: lower case, with ё spelled е."""
+    return name.strip().lower().replace('ё', 'е')
+
+
+def parse_dictionary(lines: Iterable[str]) -> Dict[str, Dict[str, Tuple[str, ...]]]:
+    """Parse the `[section]` / `key = variant, variant` format into {section: {key: variants}}."""
+    sections: Dict[str, Dict[str, Tuple[str, ...]]] = {}
+    section = None
+    for line_number, line in enumerate(lines, 1):
+        line = line.split('#', 1)[0].strip()
+        if not line:
+            continue
+        if line.startswith('[') and line.endswith(']'):
+            section = line[1:-1].strip()
+            sections.setdefault(section, {})
+            continue
+        key, separator, value = line.partition('=')
+        if not separator or section is None:
+            raise ValueError(f"Line {line_number}: expected 'key = variants' inside a [section]")
+        variants = tuple(variant.strip().lower() for variant in value.split(',') if variant.strip())
+        sections[section][key.strip().lower()] = variants
+    return sections
+
+
+class NameDictionary:
+    """First-name spellings and surname endings, read from disk the first time they're needed.
+
+    Importing the generator doesn't touch the files, so startup stays fast;
+    the first lookup loads them (once, whichever thread gets there first).
+    """
+
+    def __init__(self, paths: List[str] = None):
+        if paths is None:
+            paths = [NAME_DICTIONARY_PATH] + [path for path in NAME_DICTIONARY_EXTRA.split(os.pathsep) if path]
+        self.paths = paths
+        # (names, ending trie), set once loaded
+        self._loaded: Optional[Tuple[Dict[str, Tuple[str, ...]], SuffixTrie]] = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> Tuple[Dict[str, Tuple[str, ...]], SuffixTrie]:
+        loaded = self._loaded
+        if loaded is not None:
+            return loaded
+        with self._lock:
+            if self._loaded is not None:
+                return self._loaded
+            start = time.perf_counter()
+            names: Dict[str, Tuple[str, ...]] = {}
+            endings: Dict[str, Tuple[str, ...]] = {}
+            for path in self.paths:
+                with open(path, encoding='utf-8') as f:
+                    sections = parse_dictionary(f)
+                for name, variants in sections.get('names', {}).items():
+                    names[normalize_name(name)] = variants
+                for section in ENDING_SECTIONS:
+                    endings.update(sections.get(section, {}))
+
+            trie = SuffixTrie()
+            for ending, variants in endings.items():
+                trie.insert(ending, SurnameEnding(ending, variants, len(transliterate(ending))))
+
+            self._loaded = (names, trie)
+            logger.info(f"Loaded {len(names)} names and {len(trie)} surname endings "
+                        f"in {(time.perf_counter() - start) * 1000:.1f}ms")
+            return self._loaded
+
+    def name_variations(self, name: str) -> Tuple[str, ...]:
+        """Known Latin spellings of a first name, most likely first (empty if we don't know it)."""
+        names, _ = self._load()
+        return names.get(normalize_name(name), ())
+
+    def surname_ending(self, surname: str) -> Optional[SurnameEnding]:
+        """The longest known ending of a surname, or None."""
+        _, endings = self._load()
+        return endings.longest_match(surname.lower())
+
+
+# Shared dictionary, loaded on first use
+name_dictionary = NameDictionary()
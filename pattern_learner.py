@@ -0,0 +1,150 @@
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+import russian_email_generator
+import storage
+
+logger = logging.getLogger("pattern_learner")
+
+# Confirmed hits of one pattern before other patterns are no longer probed at that domain
+PATTERN_RESTRICT_MIN_HITS = int(os.environ.get('PATTERN_RESTRICT_MIN_HITS', 2))
+# Share of a domain's hits the leading pattern needs before we restrict to it
+PATTERN_RESTRICT_MIN_SHARE = float(os.environ.get('PATTERN_RESTRICT_MIN_SHARE', 0.8))
+
+PATTERN_SCHEMA = """
+CREATE TABLE IF NOT EXISTS domain_patterns (
+    domain TEXT NOT NULL,
+    pattern TEXT NOT NULL,
+    hits INTEGER NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (domain, pattern)
+);
+"""
+
+
+def infer_pattern(first_name: str, last_name: str, email: str) -> Optional[str]:
+    """Work out which address pattern (e.g. 'f.last') a confirmed email follows.
+
+    Returns:
+        str: Pattern ID from russian_email_generator.EMAIL_PATTERNS, or None if
+            the address doesn't match any pattern for this person
+    """
+    if '@' not in email:
+        return None
+    domain = email.rsplit('@', 1)[1]
+    email = email.lower()
+    for candidate in russian_email_generator.generate_ranked_candidates(first_name, last_name, domain, top_k=0):
+        if candidate.email.lower() == email:
+            return candidate.pattern
+    return None
+
+
+class PatternLearner:
+    """Learns which address pattern each company uses from confirmed hits.
+
+    Once `i.petrov@firm.ru` is confirmed, everyone else at firm.ru almost
+    certainly follows `f.last`, so their candidates in that pattern are probed
+    first. When one pattern clearly dominates a domain (enough hits, big enough
+    share), the other patterns are dropped altogether. Counts are kept in the
+    shared SQLite database so they carry over to later runs.
+    """
+
+    def __init__(self, restrict_min_hits: int = PATTERN_RESTRICT_MIN_HITS,
+                 restrict_min_share: float = PATTERN_RESTRICT_MIN_SHARE):
+        self.restrict_min_hits = restrict_min_hits
+        self.restrict_min_share = restrict_min_share
+        self._memory: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def _database(self):
+        try:
+            database = storage.get_database()
+            database.ensure_schema('domain_patterns', PATTERN_SCHEMA)
+            return database
+        except Exception as e:
+            logger.warning(f"Pattern store unavailable: {str(e)}")
+            return None
+
+    def get_patterns(self, domain: str) -> Dict[str, int]:
+        """Return {pattern: confirmed hits} for a domain."""
+        domain = domain.lower()
+        with self._lock:
+            if domain in self._memory:
+                return dict(self._memory[domain])
+
+        patterns = {}
+        database = self._database()
+        if database is not None:
+            rows = database.execute("SELECT pattern, hits FROM domain_patterns WHERE domain = ?", (domain,))
+            patterns = {pattern: hits for pattern, hits in rows}
+
+        with self._lock:
+            self._memory.setdefault(domain, patterns)
+            return dict(self._memory[domain])
+
+    def record_hit(self, first_name: str, last_name: str, email: str) -> Optional[str]:
+        """Learn from a confirmed address; returns the pattern it followed, if any."""
+        pattern = infer_pattern(first_name, last_name, email)
+        if not pattern:
+            return None
+        domain = email.rsplit('@', 1)[1].lower()
+
+        self.get_patterns(domain)
+        with self._lock:
+            patterns = self._memory.setdefault(domain, {})
+            patterns[pattern] = patterns.get(pattern, 0) + 1
+
+        database = self._database()
+        if database is not None:
+            try:
+                database.execute(
+                    "INSERT INTO domain_patterns (domain, pattern, hits, updated_at) VALUES (?, ?, 1, ?) "
+                    "ON CONFLICT(domain, pattern) DO UPDATE SET hits = hits + 1, updated_at = excluded.updated_at",
+                    (domain, pattern, time.time()))
+            except Exception as e:
+                logger.error(f"Error storing pattern for {domain}: {str(e)}")
+
+        logger.info(f"Learned pattern '{pattern}' for {domain} from {email}")
+        return pattern
+
+    def dominant_pattern(self, domain: str) -> Optional[str]:
+        """The pattern a domain is confidently known to use, if any."""
+        patterns = self.get_patterns(domain)
+        if not patterns:
+            return None
+        pattern, hits = max(patterns.items(), key=lambda item: item[1])
+        if hits >= self.restrict_min_hits and hits >= self.restrict_min_share * sum(patterns.values()):
+            return pattern
+        return None
+
+    def apply(self, first_name: str, last_name: str, domain: str, emails: List[str]) -> List[str]:
+        """Reorder (or restrict) a person's candidates using what we know about the domain.
+
+        Candidates in learned patterns come first, most confirmed pattern first;
+        the rest keep their original order. If the domain has a dominant
+        pattern, only candidates in that pattern are kept.
+        """
+        patterns = self.get_patterns(domain)
+        if not patterns or not emails:
+            return emails
+
+        pattern_of = {
+            candidate.email: candidate.pattern
+            for candidate in russian_email_generator.generate_ranked_candidates(first_name, last_name, domain, top_k=0)
+        }
+
+        dominant = self.dominant_pattern(domain)
+        if dominant:
+            restricted = [email for email in emails if pattern_of.get(email) == dominant]
+            if restricted:
+                logger.info(f"{domain} uses '{dominant}', probing {len(restricted)} of {len(emails)} candidates")
+                return restricted
+
+        # sorted() is stable, so candidates keep their likelihood order within a pattern
+        return sorted(emails, key=lambda email: -patterns.get(pattern_of.get(email), 0))
+
+
+pattern_learner = PatternLearner()
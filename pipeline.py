@@ -0,0 +1,219 @@
+import logging
+import os
+import queue
+import threading
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import domain_finder
+from check_records import CheckRecord
+import jobs
+import verification_engine
+
+logger = logging.getLogger("pipeline")
+
+# Rows per batch moving between stages
+PIPELINE_BATCH_SIZE = int(os.environ.get('PIPELINE_BATCH_SIZE', 200))
+# Batches each queue holds before the stage feeding it has to wait
+PIPELINE_QUEUE_BATCHES = int(os.environ.get('PIPELINE_QUEUE_BATCHES', 4))
+
+# Marks the end of a stage's output
+_END = object()
+
+
+class SheetPipeline:
+    """Runs a sheet job as a stream: read → resolve domains → generate & verify → emit.
+
+    Each stage runs on its own thread and hands batches of rows to the next
+    through a bounded queue, so a 100k-row job keeps only a few batches in
+    memory and the first results are checkpointed seconds after starting
+    rather than after every company has been searched.
+
+    - read: pending rows from the job store, PIPELINE_BATCH_SIZE at a time
+    - resolve: domain discovery and the MX pre-check for rows that don't have
+      a resolved domain yet, checkpointed so a resumed job skips them
+    - verify: the VerificationEngine, pulling batches as its workers free up;
+      candidates are generated per row right before they are probed
+    - emit: finished rows written back to the job store in batches, and handed
+      to `on_row_done(sheet_row, entry, checked, valid)`, e.g. a
+      ResultSheetWriter writing them back to the sheet; sheet_row is the row's
+      number in the source sheet
+
+    If any stage fails the others are stopped and the error is re-raised from
+    `run`.
+    """
+
+    def __init__(self,
+                 job_id: str,
+                 progress: Dict[str, Any],
+                 engine_options: Dict[str, Any] = None,
+                 timeout: int = 10,
+                 stop_on_first_valid: bool = True,
+                 on_row_done: Callable[[int, Tuple[str, str, str], List[CheckRecord], List[Dict[str, str]]], None] = None,
+                 batch_size: int = PIPELINE_BATCH_SIZE,
+                 queue_batches: int = PIPELINE_QUEUE_BATCHES,
+                 job_store: jobs.JobStore = jobs.job_store):
+        self.job_id = job_id
+        self.progress = progress
+        self.engine_options = dict(engine_options or {})
+        self.timeout = timeout
+        self.stop_on_first_valid = stop_on_first_valid
+        self.on_row_done = on_row_done
+        self.batch_size = max(1, batch_size)
+        self.job_store = job_store
+
+        self._external_stop = self.engine_options.pop('should_stop', lambda: False)
+        self._failed = threading.Event()
+        # Resolved entries of rows handed to the engine and not emitted yet
+        self._entries: Dict[int, Tuple[str, str, str]] = {}
+        self._error: Optional[BaseException] = None
+        self._resolved_queue: queue.Queue = queue.Queue(maxsize=max(1, queue_batches))
+        self._raw_queue: queue.Queue = queue.Queue(maxsize=max(1, queue_batches))
+        # Emit queue holds single rows, so its bound is in rows
+        self._done_queue: queue.Queue = queue.Queue(maxsize=max(1, queue_batches) * self.batch_size)
+
+    def should_stop(self) -> bool:
+        return self._failed.is_set() or self._external_stop()
+
+    def run(self) -> bool:
+        """Run all stages until the job is done, stopped, or a stage fails.
+
+        Returns:
+            bool: False if processing was stopped before all rows were handled
+        """
+        stages = [
+            threading.Thread(target=self._stage, args=(self._read_stage,), daemon=True,
+                             name=f"pipeline-read-{self.job_id}"),
+            threading.Thread(target=self._stage, args=(self._resolve_stage,), daemon=True,
+                             name=f"pipeline-resolve-{self.job_id}"),
+        ]
+        emitter = threading.Thread(target=self._stage, args=(self._emit_stage,), daemon=True,
+                                   name=f"pipeline-emit-{self.job_id}")
+        for thread in stages + [emitter]:
+            thread.start()
+
+        completed = False
+        try:
+            engine = verification_engine.VerificationEngine(
+                self.progress,
+                timeout=self.timeout,
+                stop_on_first_valid=self.stop_on_first_valid,
+                should_stop=self.should_stop,
+                on_entry_done=self._row_done,
+                keep_checked=False,
+                **self.engine_options
+            )
+            completed = engine.run_stream(self._resolved_batches())
+        except Exception as e:
+            self._fail(e)
+        finally:
+            self._put(self._done_queue, _END, force=True)
+            emitter.join()
+            for thread in stages:
+                thread.join(timeout=5)
+
+        if self._error:
+            raise self._error
+        if completed:
+            self.job_store.mark_domains_resolved(self.job_id)
+        return completed and not self.should_stop()
+
+    def _stage(self, target: Callable[[], None]):
+        try:
+            target()
+        except Exception as e:
+            self._fail(e)
+
+    def _fail(self, error: BaseException):
+        logger.error(f"Pipeline for job {self.job_id} failed: {str(error)}")
+        if self._error is None:
+            self._error = error
+        self._failed.set()
+
+    def _put(self, target: queue.Queue, item: Any, force: bool = False) -> bool:
+        """Put an item, waiting for room; gives up when the pipeline stops (unless forced)."""
+        while True:
+            if self.should_stop() and not force:
+                return False
+            try:
+                target.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                if force and self._failed.is_set():
+                    # Nobody may be draining the queue anymore; make room for the end marker
+                    try:
+                        target.get_nowait()
+                    except queue.Empty:
+                        pass
+
+    def _get(self, source: queue.Queue) -> Any:
+        """Take the next item, or _END once the pipeline stops."""
+        while True:
+            if self.should_stop():
+                return _END
+            try:
+                return source.get(timeout=0.5)
+            except queue.Empty:
+                continue
+
+    def _read_stage(self):
+        for batch in self.job_store.iter_pending_batches(self.job_id, self.batch_size):
+            if not self._put(self._raw_queue, batch):
+                return
+        self._put(self._raw_queue, _END)
+
+    def _resolve_stage(self):
+        while True:
+            batch = self._get(self._raw_queue)
+            if batch is _END:
+                break
+
+            unresolved = [(index, entry) for index, entry, resolved in batch if not resolved]
+            if unresolved:
+                # Companies repeated across batches are served by the company domain cache
+                resolved_entries = domain_finder.find_missing_domains([entry for _, entry in unresolved])
+                row_indices = [index for index, _ in unresolved]
+                self.job_store.set_domains(self.job_id, resolved_entries, row_indices)
+                resolved_by_index = dict(zip(row_indices, resolved_entries))
+            else:
+                resolved_by_index = {}
+
+            rows = [(index, resolved_by_index.get(index, entry)) for index, entry, _ in batch]
+            if not self._put(self._resolved_queue, rows):
+                return
+        self._put(self._resolved_queue, _END)
+
+    def _resolved_batches(self) -> Iterator[List[Tuple[int, Tuple[str, str, str]]]]:
+        while True:
+            batch = self._get(self._resolved_queue)
+            if batch is _END:
+                return
+            self._entries.update(batch)
+            yield batch
+
+    def _row_done(self, index: int, person_key: str, checked: List[CheckRecord], valid: List[Dict[str, str]]):
+        # Called from verification workers; blocks them if the writer falls behind
+        self._put(self._done_queue, (index, person_key, checked, valid, self._entries.pop(index, None)), force=True)
+
+    def _emit_stage(self):
+        finished = False
+        while not finished:
+            rows = [self._done_queue.get()]
+            # Write everything that's already waiting in one transaction
+            while len(rows) < self.batch_size:
+                try:
+                    rows.append(self._done_queue.get_nowait())
+                except queue.Empty:
+                    break
+            finished = any(row is _END for row in rows)
+            rows = [row for row in rows if row is not _END]
+            if not rows:
+                continue
+
+            self.job_store.complete_rows(self.job_id, [row[:4] for row in rows])
+            if self.on_row_done:
+                sheet_rows = self.job_store.sheet_rows(self.job_id, [row[0] for row in rows])
+                for index, person_key, checked, valid, entry in rows:
+                    try:
+                        self.on_row_done(sheet_rows.get(index, index + 1), entry, checked, valid)
+                    except Exception as e:
+                        logger.error(f"Error emitting row {index+1}: {str(e)}")
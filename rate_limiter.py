@@ -0,0 +1,144 @@
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict
+
+logger = logging.getLogger("rate_limiter")
+
+# Probes per second allowed against one MX host
+SMTP_RATE_INITIAL = float(os.environ.get('SMTP_RATE_INITIAL', 1.0))
+SMTP_RATE_MIN = float(os.environ.get('SMTP_RATE_MIN', 0.05))
+SMTP_RATE_MAX = float(os.environ.get('SMTP_RATE_MAX', 10.0))
+# Probes that may go out back to back before the rate applies
+SMTP_RATE_BURST = int(os.environ.get('SMTP_RATE_BURST', 3))
+
+# Rate multiplier when a server pushes back, and when it has been healthy for a while
+RATE_BACKOFF_FACTOR = 0.5
+RATE_RECOVERY_FACTOR = 1.2
+# Healthy replies in a row before the rate goes up again
+RATE_RECOVERY_AFTER = 5
+
+# Replies meaning "slow down": closing channel, mailbox busy / greylisted, local error
+THROTTLE_CODES = (421, 450, 451)
+
+
+class TokenBucket:
+    """Token bucket for one MX host whose rate adapts to how the server responds.
+
+    Callers reserve a token and get back how long to wait for it, so the same
+    bucket serves threads (time.sleep) and coroutines (asyncio.sleep). Tokens
+    may go negative: each waiter queues behind the ones before it.
+    """
+
+    def __init__(self, rate: float = SMTP_RATE_INITIAL, burst: int = SMTP_RATE_BURST,
+                 min_rate: float = SMTP_RATE_MIN, max_rate: float = SMTP_RATE_MAX):
+        self.min_rate = min_rate
+        self.max_rate = max(max_rate, min_rate)
+        self.rate = min(max(rate, self.min_rate), self.max_rate)
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.healthy_streak = 0
+        self.probes = 0
+        self.throttled = 0
+        self.waited = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self) -> float:
+        """Take a token and return the number of seconds to wait before using it."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens -= 1
+            self.probes += 1
+            delay = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            self.waited += delay
+            return delay
+
+    def on_throttle(self):
+        """The server pushed back: halve the rate and drop any saved-up burst."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = max(self.min_rate, self.rate * RATE_BACKOFF_FACTOR)
+            self.tokens = min(self.tokens, 0.0)
+            self.healthy_streak = 0
+            self.throttled += 1
+
+    def on_success(self):
+        """A definitive reply: after enough of them in a row, speed up again."""
+        with self._lock:
+            self.healthy_streak += 1
+            if self.healthy_streak >= RATE_RECOVERY_AFTER:
+                self.rate = min(self.max_rate, self.rate * RATE_RECOVERY_FACTOR)
+                self.healthy_streak = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'rate': round(self.rate, 3),
+                'probes': self.probes,
+                'throttled': self.throttled,
+                'waited': round(self.waited, 2)
+            }
+
+
+class AdaptiveRateLimiter:
+    """Per-MX-host token buckets shared by every verification path.
+
+    Before each RCPT probe the caller waits for a token from the bucket of the
+    MX host it talks to; afterwards it reports the reply. 421/450/451 replies
+    and dropped connections halve that host's rate, runs of definitive replies
+    (2xx/5xx) raise it again up to SMTP_RATE_MAX. Other 4xx replies leave it
+    alone.
+    """
+
+    def __init__(self, rate: float = SMTP_RATE_INITIAL, burst: int = SMTP_RATE_BURST,
+                 min_rate: float = SMTP_RATE_MIN, max_rate: float = SMTP_RATE_MAX):
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, mx_host: str) -> TokenBucket:
+        mx_host = mx_host.lower()
+        with self._lock:
+            if mx_host not in self._buckets:
+                self._buckets[mx_host] = TokenBucket(self.rate, self.burst, self.min_rate, self.max_rate)
+            return self._buckets[mx_host]
+
+    def reserve(self, mx_host: str) -> float:
+        """Reserve the next probe slot for a host; returns seconds to wait for it."""
+        return self.bucket(mx_host).reserve()
+
+    def wait(self, mx_host: str):
+        """Block the calling thread until the host's next probe slot."""
+        delay = self.reserve(mx_host)
+        if delay > 0:
+            logger.debug(f"Waiting {delay:.2f}s for a probe slot on {mx_host}")
+            time.sleep(delay)
+
+    def report(self, mx_host: str, code: int = None, dropped: bool = False):
+        """Feed a probe's outcome back: its reply code, or dropped=True for a reset connection."""
+        bucket = self.bucket(mx_host)
+        if dropped or code in THROTTLE_CODES:
+            bucket.on_throttle()
+            logger.info(f"{mx_host} pushed back ({'connection dropped' if dropped else code}), "
+                        f"rate now {bucket.rate:.2f}/s")
+        elif code is not None and (200 <= code < 300 or 500 <= code < 600):
+            bucket.on_success()
+
+    def get_rates(self) -> Dict[str, Dict[str, Any]]:
+        """Current rate and counters for every MX host seen so far."""
+        with self._lock:
+            buckets = dict(self._buckets)
+        return {mx_host: bucket.get_stats() for mx_host, bucket in buckets.items()}
+
+
+# Limiter shared by the whole process
+rate_limiter = AdaptiveRateLimiter()
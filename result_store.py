@@ -0,0 +1,134 @@
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import storage
+
+logger = logging.getLogger("result_store")
+
+# Outcome classes for a probed address
+OUTCOME_VALID = 'valid'
+# Mail.ru/Yandex block probing, so their addresses only pass DNS and syntax heuristics
+OUTCOME_LIKELY_VALID = 'likely_valid'
+OUTCOME_INVALID = 'invalid'
+OUTCOME_AMBIGUOUS = 'ambiguous'
+OUTCOME_TIMEOUT = 'timeout'
+OUTCOME_ACCEPT_ALL = 'accept_all'
+OUTCOME_ERROR = 'error'
+# 450/451: the server wants us to come back later, so it's never worth storing
+OUTCOME_GREYLISTED = 'greylisted'
+# Outcomes that count as finding the person's address
+VALID_OUTCOMES = (OUTCOME_VALID, OUTCOME_LIKELY_VALID)
+
+RESULT_STORE_ENABLED = os.environ.get('RESULT_STORE_ENABLED', 'true').lower() == 'true'
+
+# How long a stored result is trusted, per outcome class (seconds)
+DEFAULT_FRESHNESS = {
+    OUTCOME_VALID: int(os.environ.get('RESULT_FRESHNESS_VALID', 30 * 24 * 3600)),
+    # Not confirmed by the server, so only kept long enough to skip repeats within a run
+    OUTCOME_LIKELY_VALID: int(os.environ.get('RESULT_FRESHNESS_LIKELY_VALID', 3600)),
+    OUTCOME_INVALID: int(os.environ.get('RESULT_FRESHNESS_INVALID', 30 * 24 * 3600)),
+    OUTCOME_AMBIGUOUS: int(os.environ.get('RESULT_FRESHNESS_AMBIGUOUS', 24 * 3600)),
+    OUTCOME_TIMEOUT: int(os.environ.get('RESULT_FRESHNESS_TIMEOUT', 3600)),
+}
+
+RESULT_SCHEMA = """
+CREATE TABLE IF NOT EXISTS email_results (
+    email TEXT PRIMARY KEY,
+    outcome TEXT NOT NULL,
+    smtp_code INTEGER,
+    reason TEXT,
+    mx_host TEXT,
+    checked_at REAL NOT NULL
+);
+"""
+
+
+class ResultStore:
+    """On-disk store of verification outcomes keyed by email address.
+
+    Lets re-runs (and the same address showing up for two people) skip SMTP
+    probes whose answer we already have and still trust. Outcomes without a
+    freshness window (accept-all, errors) are never served from the store.
+    """
+
+    def __init__(self, freshness: Dict[str, int] = None, enabled: bool = RESULT_STORE_ENABLED):
+        self.freshness = dict(DEFAULT_FRESHNESS)
+        if freshness:
+            self.freshness.update(freshness)
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+
+    def _database(self):
+        if not self.enabled:
+            return None
+        try:
+            database = storage.get_database()
+            database.ensure_schema('email_results', RESULT_SCHEMA)
+            return database
+        except Exception as e:
+            logger.warning(f"Result store disabled: {str(e)}")
+            self.enabled = False
+            return None
+
+    def lookup(self, email: str) -> Optional[Dict[str, Any]]:
+        """Return the stored result for an address if it is still fresh."""
+        database = self._database()
+        if database is None:
+            return None
+
+        row = database.query_one(
+            "SELECT outcome, smtp_code, reason, mx_host, checked_at FROM email_results WHERE email = ?",
+            (email.lower(),))
+        if row:
+            outcome, smtp_code, reason, mx_host, checked_at = row
+            window = self.freshness.get(outcome, 0)
+            if checked_at + window > time.time():
+                self.hits += 1
+                return {
+                    'email': email,
+                    'outcome': outcome,
+                    'smtp_code': smtp_code,
+                    'reason': reason,
+                    'mx_host': mx_host,
+                    'checked_at': checked_at
+                }
+        self.misses += 1
+        return None
+
+    def record(self, email: str, outcome: str, smtp_code: int = None, reason: str = '', mx_host: str = ''):
+        """Store the outcome of a probe, replacing any older result for the address."""
+        if outcome not in self.freshness:
+            return
+        database = self._database()
+        if database is None:
+            return
+        try:
+            database.execute(
+                "INSERT OR REPLACE INTO email_results (email, outcome, smtp_code, reason, mx_host, checked_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (email.lower(), outcome, smtp_code, reason, mx_host, time.time()))
+        except Exception as e:
+            logger.error(f"Error storing result for {email}: {str(e)}")
+
+    def record_many(self, results: List[Tuple[str, str, Optional[int], str, str]]):
+        """Store several (email, outcome, smtp_code, reason, mx_host) results in one transaction."""
+        rows = [(email.lower(), outcome, smtp_code, reason or '', mx_host or '', time.time())
+                for email, outcome, smtp_code, reason, mx_host in results if outcome in self.freshness]
+        database = self._database() if rows else None
+        if database is None:
+            return
+        try:
+            database.executemany(
+                "INSERT OR REPLACE INTO email_results (email, outcome, smtp_code, reason, mx_host, checked_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)", rows)
+        except Exception as e:
+            logger.error(f"Error storing {len(rows)} results: {str(e)}")
+
+    def get_stats(self) -> Dict[str, int]:
+        return {'hits': self.hits, 'misses': self.misses}
+
+
+result_store = ResultStore()
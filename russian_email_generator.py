@@ -1,261 +1,310 @@
 import re
-from transliterate import translit
-from typing import List, Tuple
+import csv
+from array import array
+from functools import lru_cache
+from itertools import repeat
+from typing import IO, Iterable, Iterator, List, NamedTuple, Tuple
 import logging
+import os
+
+from log_config import EventLogger
+from name_dictionary import name_dictionary
+from transliteration import TRANSLIT_CACHE_SIZE, transliterate, transliteration_variants
 
 # Get logger
 logger = logging.getLogger("email_generator")
+# Per-name events; generation runs for every row of every sheet
+events = EventLogger("email_generator")
 
-# Common Russian name variations in English
-COMMON_NAME_VARIATIONS = {
-    # Male names
-    'александр': ['alexander', 'alex', 'sasha'],
-    'алексей': ['alexey', 'alexei', 'alex'],
-    'андрей': ['andrey', 'andrei', 'andrew'],
-    'антон': ['anton', 'tony'],
-    'артем': ['artem', 'artyom', 'art'],
-    'борис': ['boris', 'bob'],
-    'вадим': ['vadim', 'vad'],
-    'валерий': ['valery', 'valeri', 'val'],
-    'василий': ['vasily', 'vasili', 'basil', 'vasia'],
-    'виктор': ['victor', 'viktor', 'vic'],
-    'виталий': ['vitaly', 'vitaliy', 'vital'],
-    'владимир': ['vladimir', 'volodya', 'vova', 'vlad'],
-    'владислав': ['vladislav', 'vlad'],
-    'вячеслав': ['vyacheslav', 'slava'],
-    'геннадий': ['gennady', 'gena'],
-    'георгий': ['georgy', 'george', 'gosha'],
-    'григорий': ['grigory', 'grisha', 'greg'],
-    'даниил': ['daniil', 'daniel', 'dan'],
-    'денис': ['denis', 'dennis', 'den'],
-    'дмитрий': ['dmitry', 'dmitri', 'dima'],
-    'евгений': ['evgeny', 'eugene', 'zhenya'],
-    'егор': ['egor', 'yegor'],
-    'иван': ['ivan', 'vanya', 'john'],
-    'игорь': ['igor'],
-    'илья': ['ilya', 'ilia', 'eli'],
-    'кирилл': ['kirill', 'cyril'],
-    'константин': ['konstantin', 'kostya', 'costa'],
-    'лев': ['lev', 'leo'],
-    'леонид': ['leonid', 'leon'],
-    'максим': ['maksim', 'maxim', 'max'],
-    'михаил': ['mikhail', 'michael', 'misha'],
-    'никита': ['nikita', 'nick'],
-    'николай': ['nikolay', 'nikolai', 'nick', 'nicolas'],
-    'олег': ['oleg'],
-    'павел': ['pavel', 'paul', 'pasha'],
-    'петр': ['petr', 'peter', 'petya'],
-    'роман': ['roman', 'roma'],
-    'сергей': ['sergey', 'sergei', 'serge'],
-    'станислав': ['stanislav', 'stas'],
-    'степан': ['stepan', 'stephen', 'steve'],
-    'тимофей': ['timofey', 'tim', 'timothy'],
-    'федор': ['fedor', 'fyodor', 'fred', 'theodore'],
-    'юрий': ['yury', 'yuri', 'george'],
-    
-    # Female names
-    'александра': ['alexandra', 'alex', 'sasha'],
-    'алена': ['alena', 'alyona', 'elena'],
-    'алина': ['alina'],
-    'алиса': ['alisa', 'alice'],
-    'алла': ['alla'],
-    'анастасия': ['anastasia', 'nastya'],
-    'анна': ['anna', 'ann', 'anya'],
-    'валентина': ['valentina', 'valya'],
-    'валерия': ['valeria', 'lera'],
-    'вера': ['vera', 'faith'],
-    'виктория': ['victoria', 'vika'],
-    'галина': ['galina', 'galya'],
-    'дарья': ['daria', 'darya', 'dasha'],
-    'евгения': ['evgenia', 'zhenya'],
-    'екатерина': ['ekaterina', 'katerina', 'katya', 'catherine', 'kate'],
-    'елена': ['elena', 'helen', 'lena'],
-    'елизавета': ['elizaveta', 'liza', 'elizabeth'],
-    'ирина': ['irina', 'irene', 'ira'],
-    'карина': ['karina'],
-    'кристина': ['kristina', 'christina'],
-    'ксения': ['ksenia', 'xenia'],
-    'лариса': ['larisa'],
-    'любовь': ['lyubov', 'luba', 'love'],
-    'людмила': ['lyudmila', 'ludmila', 'mila'],
-    'маргарита': ['margarita', 'rita', 'margaret'],
-    'марина': ['marina'],
-    'мария': ['maria', 'mary', 'masha'],
-    'надежда': ['nadezhda', 'nadya', 'hope'],
-    'наталья': ['natalia', 'natalya', 'natasha'],
-    'нина': ['nina'],
-    'оксана': ['oksana', 'oxana'],
-    'ольга': ['olga', 'olya'],
-    'полина': ['polina'],
-    'светлана': ['svetlana', 'sveta'],
-    'софия': ['sofia', 'sophia', 'sonya'],
-    'татьяна': ['tatiana', 'tatyana', 'tanya'],
-    'юлия': ['yulia', 'julia', 'julie'],
-    'яна': ['yana', 'jana']
-}
-
-# Common Russian surname ending patterns and their variations
-SURNAME_ENDING_VARIATIONS = {
-    'ий': ['iy', 'y', 'i', 'ij', 'yi'],  # e.g., Антоновский -> antonovskiy, antonovsky, etc.
-    'ый': ['y', 'yi', 'yy'],             # e.g., Белый -> bely, belyi
-    'ой': ['oy', 'oi'],                  # e.g., Толстой -> tolstoy, tolstoi
-    'ев': ['ev', 'eff'],                 # e.g., Медведев -> medvedev, medvedeff
-    'ёв': ['yov', 'ev', 'iov'],          # e.g., Королёв -> korolyov, korolev
-    'ов': ['ov', 'off', 'ow'],           # e.g., Иванов -> ivanov, ivanoff
-    'ин': ['in', 'ine'],                 # e.g., Путин -> putin, putine
-    'ын': ['yn', 'in'],                  # e.g., Добрынин -> dobrynin
-    'ая': ['aya', 'aia'],                # e.g., Толстая -> tolstaya, tolstaia
-    'яя': ['yaya', 'iaia'],              # e.g., Зимняя -> zimnyaya, zimniaia
-    'ич': ['ich', 'itch', 'itsch'],      # e.g., Петрович -> petrovich, petrovitch
-    'ыч': ['ych', 'ich'],                # e.g., Никитыч -> nikitych, nikitich
-    'ко': ['ko', 'cko', 'kho'],          # e.g., Шевченко -> shevchenko, shevchenco
-    'ук': ['uk', 'ouk', 'uck'],          # e.g., Шевчук -> shevchuk, shevchuck
-    'юк': ['yuk', 'iuk', 'juk'],         # e.g., Костюк -> kostyuk, kostiuk
-    'ак': ['ak', 'ack'],                 # e.g., Поляк -> polyak, polyack
-    'ек': ['ek', 'eck'],                 # e.g., Чапек -> chapek, chapeck
-    'ик': ['ik', 'ick'],                 # e.g., Новик -> novik, novick
-    'ский': ['sky', 'skiy', 'ski', 'skij', 'skyi'], # e.g., Достоевский -> dostoevsky, dostoevskiy
-    'цкий': ['tsky', 'tskiy', 'tski', 'tskij', 'tskyi'], # e.g., Троцкий -> trotsky, trotskiy
-    'ская': ['skaya', 'skaia'],          # e.g., Достоевская -> dostoevskaya, dostoevskaia
-    'цкая': ['tskaya', 'tskaia'],        # e.g., Троцкая -> trotskaya, trotskaia
-}
+SPECIAL_CHARS_PATTERN = re.compile(r'[^\w\s]')
 
 def clean_name(name: str) -> str:
     """Clean a name by removing special characters and extra spaces."""
-    logger.info(f"Cleaning name: {name}")
-    cleaned = re.sub(r'[^\w\s]', '', name).strip()
-    logger.info(f"Cleaned name: {cleaned}")
-    return cleaned
+    return SPECIAL_CHARS_PATTERN.sub('', name).strip()
 
 def get_name_variations(name: str) -> List[str]:
-    """Get common variations of a Russian name in English."""
-    name_lower = name.lower()
-    
-    # Check if we have predefined variations for this name
-    if name_lower in COMMON_NAME_VARIATIONS:
-        variations = COMMON_NAME_VARIATIONS[name_lower]
-        logger.info(f"Found predefined variations for {name}: {variations}")
-        return variations
+    """Get common variations of a Russian name in English (from data/name_variants.txt)."""
+    variations = name_dictionary.name_variations(name)
+    if variations:
+        events.debug("predefined name variations", first_name=name, variations=variations)
     
-    # If no predefined variations, return empty list
-    return []
+    # Empty if there are no predefined variations
+    return list(variations)
 
 def generate_surname_variations(surname: str) -> List[str]:
-    """Generate variations of a Russian surname based on common ending patterns."""
-    # First get the standard transliteration
-    standard = translit(surname, 'ru', reversed=True).lower()
-    variations = [standard]
+    """Generate variations of a Russian surname based on common ending patterns.
     
-    # Check for common endings and generate variations
-    surname_lower = surname.lower()
+    The most common transliteration comes first, then alternative spellings of
+    the ending (ivanoff), then the surname under the other transliteration
+    standards (khrushchev next to hruschyov).
+    """
+    return list(_surname_variations(surname))
+
+@lru_cache(maxsize=TRANSLIT_CACHE_SIZE)
+def _surname_variations(surname: str) -> Tuple[str, ...]:
+    spellings = transliteration_variants(surname)
+    # First get the most common transliteration; ending lengths are measured in it
+    standard = spellings[0]
+    variations = [standard]
     
-    for ending, variants in SURNAME_ENDING_VARIATIONS.items():
-        if surname_lower.endswith(ending):
-            # Get the base part of the surname (without the ending)
-            base = standard[:-len(ending)]
-            
-            # For endings like "ский", we need special handling
-            if ending in ['ский', 'цкий', 'ская', 'цкая']:
-                # For these endings, we replace the entire ending
-                for variant in variants:
-                    # Create a new variation with the alternative ending
-                    new_variation = base + variant
-                    if new_variation != standard and new_variation not in variations:
-                        variations.append(new_variation)
-            else:
-                # For other endings, we replace just the ending part
-                ending_length = len(translit(ending, 'ru', reversed=True))
-                base = standard[:-ending_length]
-                
-                for variant in variants:
-                    # Create a new variation with the alternative ending
-                    new_variation = base + variant
-                    if new_variation != standard and new_variation not in variations:
-                        variations.append(new_variation)
-            
-            # We found a matching ending, no need to check others
-            break
+    # Swap the longest known ending (ский before ий) for its alternative spellings
+    ending = name_dictionary.surname_ending(surname)
+    if ending:
+        # Get the base part of the surname (without the transliterated ending)
+        base = standard[:-ending.latin_length]
+        for variant in ending.variants:
+            # Create a new variation with the alternative ending
+            new_variation = base + variant
+            if new_variation != standard and new_variation not in variations:
+                variations.append(new_variation)
     
-    logger.info(f"Generated surname variations for {surname}: {variations}")
-    return variations
+    # Spellings under the other standards come after the ending variants
+    variations.extend(spelling for spelling in spellings[1:] if spelling not in variations)
+    return tuple(variations)
 
 def transcribe_name(name: str) -> str:
     """Transcribe a Russian name to Latin alphabet."""
-    logger.info(f"Transcribing name: {name}")
-    # Clean the name first
+    # Clean the name first, then transliterate from Russian to Latin
+    return transliterate(clean_name(name))
+
+def transcribe_name_variants(name: str) -> List[str]:
+    """Every spelling of a name across the transliteration standards, most common first."""
+    return list(transliteration_variants(clean_name(name)))
+
+# Schemes first initials are taken from, most likely first; the legacy spelling
+# gives initials nobody uses (Юрий -> j)
+INITIAL_SCHEMES = ('web', 'bgn')
+
+def first_name_initials(name: str) -> Tuple[str, ...]:
+    """Distinct first letters of a first name under INITIAL_SCHEMES, most likely first."""
     name = clean_name(name)
-    # Transliterate from Russian to Latin
-    try:
-        latin_name = translit(name, 'ru', reversed=True)
-        logger.info(f"Transliterated name: {latin_name}")
-        # Convert to lowercase
-        result = latin_name.lower()
-        logger.info(f"Final transcribed name: {result}")
-        return result
-    except Exception as e:
-        logger.error(f"Error transliterating name '{name}': {str(e)}")
-        # Fallback to just lowercase if transliteration fails
-        return name.lower()
-
-def generate_email_variations(first_name: str, last_name: str, domain: str) -> List[str]:
-    """Generate various email format possibilities for a given name and domain."""
-    logger.info(f"Generating email variations for {first_name} {last_name} at {domain}")
-    
-    # Get standard transliteration
-    first_name_latin = transcribe_name(first_name)
-    
+    return tuple(dict.fromkeys(spelling[0] for spelling in
+                               (transliterate(name, scheme) for scheme in INITIAL_SCHEMES) if spelling))
+
+# Email patterns with their prior probability of being a company's format.
+# Placeholders: {first}, {last}, {f} (first initial), {l} (last initial).
+EMAIL_PATTERNS = {
+    'first.last': ('{first}.{last}', 0.26),
+    'f.last': ('{f}.{last}', 0.16),
+    'flast': ('{f}{last}', 0.12),
+    'last': ('{last}', 0.09),
+    'first': ('{first}', 0.08),
+    'last.f': ('{last}.{f}', 0.06),
+    'first_last': ('{first}_{last}', 0.05),
+    'last.first': ('{last}.{first}', 0.05),
+    'firstl': ('{first}{l}', 0.04),
+    'last_first': ('{last}_{first}', 0.02),
+}
+
+# Relative weight of a first-name variant by its position in the name dictionary
+# (canonical transliteration first, then alternative spellings, nicknames last)
+FIRST_NAME_VARIANT_WEIGHTS = [1.0, 0.45, 0.2, 0.1, 0.05]
+# Weight of the most common surname spelling vs. alternative endings and other standards
+SURNAME_VARIANT_WEIGHTS = [1.0, 0.35, 0.15, 0.08, 0.04]
+
+# Keep only the K most likely candidates per person (0 keeps all)
+MAX_EMAIL_VARIATIONS = int(os.environ.get('MAX_EMAIL_VARIATIONS', 0))
+
+# Pattern IDs by number, for compact storage (CandidateBatch.patterns holds the numbers)
+PATTERN_IDS = tuple(EMAIL_PATTERNS)
+
+
+class EmailCandidate(NamedTuple):
+    email: str
+    pattern: str
+    score: float
+
+
+class LocalParts(NamedTuple):
+    """A person's candidate local parts, most likely first, as parallel columns."""
+    patterns: Tuple[int, ...]
+    local_parts: Tuple[str, ...]
+    scores: Tuple[float, ...]
+
+
+def variant_weight(weights: List[float], position: int) -> float:
+    return weights[position] if position < len(weights) else weights[-1]
+
+
+@lru_cache(maxsize=TRANSLIT_CACHE_SIZE)
+def ranked_local_parts(first_name: str, last_name: str) -> LocalParts:
+    """Score every pattern for every spelling of a name, most likely first.
+
+    Local parts don't depend on the domain, so this is computed once per
+    distinct (first name, last name) pair and shared by every row, domain and
+    job with that name. Without both names there is nothing to score: every
+    candidate would be a fragment like 'i@firm.ru'.
+    """
+    if not clean_name(first_name) or not clean_name(last_name):
+        return LocalParts((), (), ())
+
     # Get common variations of the first name
     first_name_variations = get_name_variations(first_name)
     if not first_name_variations:
-        first_name_variations = [first_name_latin]
-    
-    logger.info(f"First name variations: {first_name_variations}")
+        first_name_variations = transcribe_name_variants(first_name)
     
     # Get surname variations
     last_name_variations = generate_surname_variations(last_name)
     
-    logger.info(f"Last name variations: {last_name_variations}")
-    
-    # Get first letter of first name (use standard transliteration)
-    first_initial = first_name_latin[0] if first_name_latin else ''
+    # First initials as people actually spell their names (Юрий -> y, Харитон -> h, k)
+    first_initials = first_name_initials(first_name)
     
-    # Generate variations
-    variations = []
+    # Score every pattern for every spelling; keep the best score per local part
+    scores = {}
+    for pattern_number, (template, prior) in enumerate(EMAIL_PATTERNS.values()):
+        uses_first = '{first}' in template or '{f}' in template
+        uses_last = '{last}' in template or '{l}' in template
+        first_values = first_name_variations if '{first}' in template else first_initials
+        first_options = list(enumerate(first_values)) if uses_first else [(0, '')]
+        last_options = list(enumerate(last_name_variations)) if uses_last else [(0, '')]
+
+        for first_pos, first_var in first_options:
+            for last_pos, last_var in last_options:
+                local_part = template.format(first=first_var, last=last_var, f=first_var[:1],
+                                             l=last_var[0] if last_var else '')
+                if not local_part or local_part.startswith(('.', '_')) or local_part.endswith(('.', '_')):
+                    continue
+                score = prior
+                if uses_first:
+                    score *= variant_weight(FIRST_NAME_VARIANT_WEIGHTS, first_pos)
+                if uses_last:
+                    score *= variant_weight(SURNAME_VARIANT_WEIGHTS, last_pos)
+
+                if local_part not in scores or scores[local_part][1] < score:
+                    scores[local_part] = (pattern_number, score)
     
-    # Add variations with different first name forms and last name forms
-    for first_var in first_name_variations:
-        for last_var in last_name_variations:
-            # Get first letter of last name for this variation
-            last_initial = last_var[0] if last_var else ''
-            
-            variations.extend([
-                f"{first_var}@{domain}",
-                f"{first_var}.{last_var}@{domain}",
-                f"{last_var}.{first_var}@{domain}",
-                f"{first_var}{last_initial}@{domain}",
-                f"{first_var}_{last_var}@{domain}",
-                f"{last_var}_{first_var}@{domain}",
-            ])
+    # Sorting is stable, so ties keep pattern order
+    ranked = sorted(scores.items(), key=lambda item: item[1][1], reverse=True)
+    return LocalParts(
+        tuple(pattern_number for _, (pattern_number, _) in ranked),
+        tuple(local_part for local_part, _ in ranked),
+        tuple(score for _, (_, score) in ranked)
+    )
+
+
+def generate_ranked_candidates(first_name: str, last_name: str, domain: str,
+                               top_k: int = None) -> List[EmailCandidate]:
+    """Generate email candidates for a person, most likely first.
+
+    Each candidate is scored by the prior of its pattern times the weight of the
+    first-name and surname spellings it uses, so `i.ivanov` is probed long
+    before `sasha_ivanoff`.
+
+    Args:
+        first_name: First name in Russian
+        last_name: Last name in Russian
+        domain: Company domain
+        top_k: Keep only the K best candidates (defaults to MAX_EMAIL_VARIATIONS, 0 = all)
+    """
+    if top_k is None:
+        top_k = MAX_EMAIL_VARIATIONS
     
-    # Add standard variations with last name only
-    for last_var in last_name_variations:
-        variations.extend([
-            f"{last_var}@{domain}",
-            f"{first_initial}{last_var}@{domain}",
-            f"{first_initial}.{last_var}@{domain}",
-            f"{last_var}.{first_initial}@{domain}",
-        ])
+    parts = ranked_local_parts(first_name, last_name)
+    count = min(top_k, len(parts.local_parts)) if top_k else len(parts.local_parts)
+    candidates = [
+        EmailCandidate(f"{parts.local_parts[i]}@{domain}", PATTERN_IDS[parts.patterns[i]], parts.scores[i])
+        for i in range(count)
+    ]
+    events.sampled("candidates generated", first_name=first_name, last_name=last_name, domain=domain,
+                   count=len(candidates))
     
-    # Remove duplicates that might occur with short names
-    unique_variations = list(dict.fromkeys(variations))
-    logger.info(f"Generated {len(unique_variations)} unique email variations")
+    return candidates
+
+
+class CandidateBatch:
+    """Candidates for a whole sheet in columns rather than one string per address.
+
+    Candidate i is `local_parts[i] + '@' + domains[domain_ids[i]]` for sheet
+    row `rows[i]`, following pattern `PATTERN_IDS[patterns[i]]`. Rows keep
+    their order and each row's candidates are most likely first. Row numbers,
+    pattern numbers and domain IDs are packed arrays, local parts are shared
+    strings from the per-name cache, so millions of candidates stay small.
+    """
+
+    __slots__ = ('rows', 'patterns', 'local_parts', 'domain_ids', 'domains')
+
+    def __init__(self):
+        self.rows = array('I')
+        self.patterns = array('B')
+        self.local_parts: List[str] = []
+        self.domain_ids = array('I')
+        self.domains: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def email(self, i: int) -> str:
+        return f"{self.local_parts[i]}@{self.domains[self.domain_ids[i]]}"
+
+    def pattern(self, i: int) -> str:
+        return PATTERN_IDS[self.patterns[i]]
+
+    def iter_emails(self) -> Iterator[Tuple[int, str, str]]:
+        """Yield (row index, pattern ID, email) for every candidate."""
+        for i in range(len(self.rows)):
+            yield self.rows[i], PATTERN_IDS[self.patterns[i]], self.email(i)
+
+    def emails_by_row(self) -> Iterator[Tuple[int, List[str]]]:
+        """Yield (row index, emails most likely first) for every row with candidates."""
+        start = 0
+        while start < len(self.rows):
+            row = self.rows[start]
+            end = start
+            while end < len(self.rows) and self.rows[end] == row:
+                end += 1
+            yield row, [self.email(i) for i in range(start, end)]
+            start = end
+
+    def write_csv(self, file: IO[str]):
+        """Export the candidates (row, pattern, email) without verifying them."""
+        writer = csv.writer(file)
+        writer.writerow(['row', 'pattern', 'email'])
+        writer.writerows(self.iter_emails())
+
+
+def generate_candidates_bulk(entries: Iterable[Tuple[str, str, str]], top_k: int = None) -> CandidateBatch:
+    """Generate candidates for every (first_name, last_name, domain) row at once.
+
+    Each distinct name pair is transliterated and scored once however many rows
+    share it, and each distinct domain is stored once. Rows missing a name or
+    a domain get no candidates.
+
+    Args:
+        entries: (first_name, last_name, domain) tuples, e.g. a whole sheet
+        top_k: Keep only the K best candidates per row (defaults to MAX_EMAIL_VARIATIONS, 0 = all)
+
+    Returns:
+        CandidateBatch: Columnar candidates, rows in input order
+    """
+    if top_k is None:
+        top_k = MAX_EMAIL_VARIATIONS
+    batch = CandidateBatch()
+    domain_ids = {}
+    for row, (first_name, last_name, domain) in enumerate(entries):
+        if not first_name or not last_name or not domain:
+            continue
+        domain_id = domain_ids.get(domain)
+        if domain_id is None:
+            domain_id = domain_ids[domain] = len(batch.domains)
+            batch.domains.append(domain)
+        
+        parts = ranked_local_parts(first_name, last_name)
+        count = min(top_k, len(parts.local_parts)) if top_k else len(parts.local_parts)
+        batch.rows.extend(repeat(row, count))
+        batch.patterns.extend(parts.patterns[:count])
+        batch.local_parts.extend(parts.local_parts[:count])
+        batch.domain_ids.extend(repeat(domain_id, count))
     
-    return unique_variations
+    logger.info(f"Generated {len(batch)} candidates for {len(domain_ids)} domains")
+    return batch
+
+def generate_email_variations(first_name: str, last_name: str, domain: str, top_k: int = None) -> List[str]:
+    """Generate various email format possibilities for a given name and domain, most likely first."""
+    return [candidate.email for candidate in generate_ranked_candidates(first_name, last_name, domain, top_k)]
 
 def process_name_entry(entry: Tuple[str, str, str]) -> List[str]:
     """Process a single name entry (first name, last name, domain) and return email variations."""
     first_name, last_name, domain = entry
-    logger.info(f"Processing name entry: {first_name} {last_name} at {domain}")
     
     # Clean and validate inputs
     if not first_name or not last_name or not domain:
@@ -264,5 +313,4 @@ def process_name_entry(entry: Tuple[str, str, str]) -> List[str]:
     
     # Generate email variations
     variations = generate_email_variations(first_name, last_name, domain)
-    logger.info(f"Generated {len(variations)} variations for {first_name} {last_name}")
     return variations 
\ No newline at end of file
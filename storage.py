@@ -0,0 +1,80 @@
+import logging
+import os
+import sqlite3
+import threading
+from typing import Any, Iterable, List, Optional, Sequence
+
+logger = logging.getLogger("storage")
+
+# Vercel only allows writes under /tmp
+if os.environ.get('VERCEL_ENV') == 'production':
+    DEFAULT_DATABASE_PATH = '/tmp/email_finder.db'
+else:
+    DEFAULT_DATABASE_PATH = 'email_finder.db'
+
+DATABASE_PATH = os.environ.get('EMAIL_FINDER_DB', DEFAULT_DATABASE_PATH)
+
+
+class Database:
+    """Small thread-safe wrapper around a SQLite file shared by the caches and stores.
+
+    Each feature creates its own tables with `ensure_schema`, so everything the
+    app remembers between runs lives in one file.
+    """
+
+    def __init__(self, path: str = DATABASE_PATH):
+        self.path = path
+        self._lock = threading.RLock()
+        self._schemas = set()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        logger.info(f"Opened database: {path}")
+
+    def ensure_schema(self, name: str, script: str):
+        """Run a CREATE TABLE IF NOT EXISTS script once per process."""
+        with self._lock:
+            if name in self._schemas:
+                return
+            self.connection.executescript(script)
+            self._schemas.add(name)
+
+    def execute(self, sql: str, params: Sequence[Any] = ()) -> List[tuple]:
+        with self._lock:
+            with self.connection:
+                return self.connection.execute(sql, params).fetchall()
+
+    def update(self, sql: str, params: Sequence[Any] = ()) -> int:
+        """Run an UPDATE/DELETE and return how many rows it changed."""
+        with self._lock:
+            with self.connection:
+                return self.connection.execute(sql, params).rowcount
+
+    def executemany(self, sql: str, rows: Iterable[Sequence[Any]]):
+        with self._lock:
+            with self.connection:
+                self.connection.executemany(sql, rows)
+
+    def query_one(self, sql: str, params: Sequence[Any] = ()) -> Optional[tuple]:
+        rows = self.execute(sql, params)
+        return rows[0] if rows else None
+
+    def close(self):
+        with self._lock:
+            self.connection.close()
+
+
+_database: Optional[Database] = None
+_database_lock = threading.Lock()
+
+
+def get_database() -> Database:
+    """Return the process-wide database, opening it on first use."""
+    global _database
+    with _database_lock:
+        if _database is None:
+            _database = Database()
+        return _database
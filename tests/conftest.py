@@ -0,0 +1,43 @@
+import os
+import sys
+
+import pytest
+
+# The modules live at the top of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Tests never write log files
+os.environ.setdefault('LOG_TO_FILE', 'false')
+
+
+class FakeClock:
+    """Stands in for the `time` module so TTLs can be tested without sleeping."""
+
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.now += seconds
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """A fresh SQLite file behind storage.get_database() for the test."""
+    import storage
+    db = storage.Database(str(tmp_path / 'email_finder.db'))
+    monkeypatch.setattr(storage, '_database', db)
+    yield db
+    db.close()
@@ -0,0 +1,102 @@
+import asyncio
+import threading
+
+import pytest
+
+import async_verifier
+import email_verification_tool
+from async_verifier import AsyncSMTPSession, AsyncVerifier
+from email_verification_tool import NO_DOMAIN_STATUS, NO_VALID_EMAIL_STATUS, CatchAllCache
+from result_store import OUTCOME_INVALID, OUTCOME_VALID, result_store
+
+MAILBOXES = {'i.petrov@firm.ru', 'anna.smirnova@firm.ru'}
+
+
+@pytest.fixture
+def probed(monkeypatch, database):
+    """firm.ru and mail.ru resolve, RCPT is answered from MAILBOXES; returns the probed addresses."""
+    probed = []
+
+    async def resolve(domain, rdtype):
+        return [f'mx.{domain}']
+
+    async def probe(self, email):
+        probed.append(email)
+        return (250, 'ok') if email in MAILBOXES else (550, 'no such user')
+
+    monkeypatch.setattr(async_verifier, 'async_resolve', resolve)
+    monkeypatch.setattr(AsyncSMTPSession, 'probe', probe)
+    monkeypatch.setattr(async_verifier, 'catch_all_cache', CatchAllCache())
+    monkeypatch.setattr(async_verifier.rate_limiter, 'reserve', lambda mx_host: 0.0)
+    monkeypatch.setattr(async_verifier.rate_limiter, 'report', lambda *args, **kwargs: None)
+    return probed
+
+
+def variations(first_name, last_name, domain):
+    return [f'{first_name}.{last_name}@{domain}', f'{first_name[0]}.{last_name}@{domain}']
+
+
+def test_verify_emails_keeps_input_order(probed):
+    emails = ['i.petrov@firm.ru', 'bad syntax', 'nobody@firm.ru', 'x@host.test']
+    results = asyncio.run(AsyncVerifier(max_in_flight=4).verify_emails(emails))
+    assert results == [('i.petrov@firm.ru', 'Valid email'), ('bad syntax', 'Invalid syntax'),
+                       ('nobody@firm.ru', 'Invalid email: Invalid recipient'), ('x@host.test', 'Invalid domain')]
+
+
+def test_process_name_entries_returns_a_row_per_entry(probed):
+    entries = [('ivan', 'petrov', 'firm.ru'), ('oleg', 'sidorov', ''), ('oleg', 'sidorov', 'firm.ru')]
+    results = asyncio.run(AsyncVerifier(max_in_flight=2).process_name_entries(entries, variations))
+
+    assert [(row['first_name'], row['valid_email'], row['status']) for row in results] == [
+        ('ivan', 'i.petrov@firm.ru', 'Valid email'),
+        ('oleg', '', NO_DOMAIN_STATUS),
+        ('oleg', '', NO_VALID_EMAIL_STATUS),
+    ]
+
+
+def test_results_are_written_to_the_store_in_batches(probed, monkeypatch):
+    monkeypatch.setattr(async_verifier, 'ASYNC_RESULT_FLUSH_ROWS', 2)
+    writes = []
+    record_many = result_store.record_many
+    monkeypatch.setattr(result_store, 'record_many', lambda rows: writes.append(len(rows)) or record_many(rows))
+
+    asyncio.run(AsyncVerifier().verify_emails(['i.petrov@firm.ru', 'nobody@firm.ru', 'anna.smirnova@firm.ru']))
+
+    assert writes == [2, 1]
+    assert result_store.lookup('i.petrov@firm.ru')['outcome'] == OUTCOME_VALID
+    assert result_store.lookup('nobody@firm.ru')['outcome'] == OUTCOME_INVALID
+    # Stored results are answered without probing again
+    probed.clear()
+    asyncio.run(AsyncVerifier().verify_emails(['i.petrov@firm.ru']))
+    assert probed == []
+
+
+def test_mailru_heuristics_run_off_the_event_loop(probed, monkeypatch):
+    threads = []
+
+    def has_mx_record(domain):
+        threads.append(threading.current_thread())
+        return True
+
+    monkeypatch.setattr(email_verification_tool, 'has_mx_record', has_mx_record)
+    results = asyncio.run(AsyncVerifier().verify_emails(['ivan.petrov@mail.ru']))
+
+    assert results == [('ivan.petrov@mail.ru', 'Valid email')]
+    assert probed == []
+    assert threads and threading.main_thread() not in threads
+
+
+def test_rate_limit_is_waited_for_outside_the_mx_slot(probed, monkeypatch):
+    verifier = AsyncVerifier(max_per_mx=1)
+    slot_taken = []
+
+    def reserve(mx_host):
+        slot_taken.append(verifier._mx_slot(mx_host).locked())
+        return 0.0
+
+    monkeypatch.setattr(async_verifier.rate_limiter, 'reserve', reserve)
+    asyncio.run(verifier.verify_emails(['i.petrov@firm.ru']))
+
+    # One token for the catch-all probe, one for the address, neither while holding the slot
+    assert slot_taken == [False, False]
+    assert len(probed) == 2
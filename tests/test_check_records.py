@@ -0,0 +1,55 @@
+import pytest
+
+from check_records import (UNKNOWN_PATTERN, CheckRecord, Outcome, decode_records, domain_table,
+                           encode_records)
+from result_store import OUTCOME_LIKELY_VALID, OUTCOME_TIMEOUT
+
+
+def test_record_keeps_the_address_in_parts():
+    record = CheckRecord.create('i.petrov@firm.ru', Outcome.VALID, 'f.last')
+
+    assert record.email == 'i.petrov@firm.ru'
+    assert record.local_part == 'i.petrov'
+    assert domain_table.name(record.domain_id) == 'firm.ru'
+    assert record.pattern_id == 'f.last'
+    assert record.is_valid
+    assert record.status == 'Valid email'
+
+
+def test_domains_are_interned_once():
+    first = CheckRecord.create('i.petrov@interned.ru', Outcome.INVALID)
+    second = CheckRecord.create('a.smirnova@interned.ru', Outcome.INVALID)
+    assert first.domain_id == second.domain_id
+    assert domain_table.id('interned.ru') == first.domain_id
+
+
+def test_unknown_patterns():
+    record = CheckRecord.create('boss@firm.ru', Outcome.INVALID, 'no-such-pattern')
+    assert record.pattern == UNKNOWN_PATTERN
+    assert record.pattern_id is None
+    assert not record.is_valid
+
+
+@pytest.mark.parametrize('name, is_valid, outcome', [
+    (OUTCOME_TIMEOUT, False, Outcome.TIMEOUT),
+    (OUTCOME_LIKELY_VALID, False, Outcome.LIKELY_VALID),
+    (None, True, Outcome.VALID),
+    ('something-else', False, Outcome.INVALID),
+])
+def test_outcome_from_name(name, is_valid, outcome):
+    assert Outcome.from_name(name, is_valid) is outcome
+
+
+def test_encode_and_decode_round_trip():
+    records = [CheckRecord.create('ivan.petrov@firm.ru', Outcome.INVALID, 'first.last'),
+               CheckRecord.create('i.petrov@firm.ru', Outcome.VALID, 'f.last'),
+               CheckRecord.create('boss@firm.ru', Outcome.ACCEPT_ALL)]
+
+    encoded = encode_records(records)
+    assert encoded[1] == [records[1].pattern, 'i.petrov', int(Outcome.VALID)]
+
+    decoded = decode_records(encoded, 'firm.ru')
+    assert [(r.email, r.pattern_id, r.outcome) for r in decoded] == [
+        ('ivan.petrov@firm.ru', 'first.last', Outcome.INVALID),
+        ('i.petrov@firm.ru', 'f.last', Outcome.VALID),
+        ('boss@firm.ru', None, Outcome.ACCEPT_ALL)]
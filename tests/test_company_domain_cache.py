@@ -0,0 +1,46 @@
+import pytest
+
+import company_domain_cache
+from company_domain_cache import CompanyDomainCache, normalize_company_name
+
+
+@pytest.fixture
+def cache(database, clock, monkeypatch):
+    monkeypatch.setattr(company_domain_cache, 'time', clock)
+    return CompanyDomainCache(ttl=100, negative_ttl=10)
+
+
+@pytest.mark.parametrize('company_name', ['ПАО «Газпром нефть»', 'Газпром Нефть', 'газпром нефть, ПАО',
+                                          'Публичное акционерное общество "Газпром нефть"'])
+def test_legal_forms_and_quotes_are_ignored(company_name):
+    assert normalize_company_name(company_name) == 'газпром нефть'
+
+
+def test_found_domains_expire_after_the_ttl(cache, clock):
+    cache.put('ООО «Ромашка»', 'romashka.ru', {'romashka.ru': 3, 'romashka-shop.ru': 1})
+    assert cache.get('Ромашка') == 'romashka.ru'
+    assert cache.get_entry('ромашка')['candidates'] == {'romashka.ru': 3, 'romashka-shop.ru': 1}
+
+    clock.advance(101)
+    assert cache.get('Ромашка') is None
+    assert cache.get_stats() == {'hits': 1, 'misses': 1}
+
+
+def test_searches_that_found_nothing_are_retried_sooner(cache, clock):
+    cache.put('Ромашка', '')
+    assert cache.get('Ромашка') == ''
+    clock.advance(11)
+    assert cache.get('Ромашка') is None
+
+
+def test_overrides_win_and_never_expire(cache, clock):
+    cache.put('Ромашка', 'romashka-shop.ru')
+    cache.set_override('ООО Ромашка', 'Romashka.ru')
+    clock.advance(1000)
+
+    assert cache.get('ромашка') == 'romashka.ru'
+    assert [(row['company_name'], row['domain']) for row in cache.list_overrides()] == [('ООО Ромашка', 'romashka.ru')]
+
+    cache.remove_override('Ромашка')
+    assert cache.list_overrides() == []
+    assert cache.get('Ромашка') is None
@@ -0,0 +1,168 @@
+import threading
+import time
+
+import dns.exception
+import dns.resolver
+import pytest
+
+import dns_cache
+from dns_cache import DNSCache
+
+
+class ScriptedCache(DNSCache):
+    """DNSCache answering from a dict instead of the network, counting queries."""
+
+    def __init__(self, answers, **kwargs):
+        super().__init__(**kwargs)
+        self.answers = answers
+        self.queries = []
+
+    def _query(self, domain, rdtype):
+        self.queries.append((domain, rdtype))
+        answer = self.answers[(domain, rdtype)]
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+
+@pytest.fixture(autouse=True)
+def fake_time(clock, monkeypatch):
+    monkeypatch.setattr(dns_cache, 'time', clock)
+    return clock
+
+
+def test_positive_answer_is_cached_for_its_ttl(clock):
+    cache = ScriptedCache({('example.com', 'MX'): (['mx1.example.com'], 120)}, min_ttl=30, max_ttl=3600)
+
+    assert cache.resolve('Example.COM.', 'mx') == ['mx1.example.com']
+    clock.advance(119)
+    assert cache.resolve('example.com', 'MX') == ['mx1.example.com']
+    assert len(cache.queries) == 1
+
+    clock.advance(2)
+    cache.resolve('example.com', 'MX')
+    assert len(cache.queries) == 2
+    assert cache.get_stats()['hits'] == 1
+
+
+@pytest.mark.parametrize('record_ttl, expected_ttl', [(5, 30), (86400, 3600), (600, 600)])
+def test_ttl_is_clamped(clock, record_ttl, expected_ttl):
+    cache = ScriptedCache({('example.com', 'A'): (['1.2.3.4'], record_ttl)}, min_ttl=30, max_ttl=3600)
+    cache.resolve('example.com', 'A')
+
+    clock.advance(expected_ttl - 1)
+    cache.resolve('example.com', 'A')
+    assert len(cache.queries) == 1
+
+    clock.advance(1)
+    cache.resolve('example.com', 'A')
+    assert len(cache.queries) == 2
+
+
+@pytest.mark.parametrize('error', [dns.resolver.NXDOMAIN, dns.resolver.NoAnswer])
+def test_definitive_negative_answers_are_cached(clock, error):
+    cache = ScriptedCache({('missing.example', 'MX'): error()}, negative_ttl=300)
+
+    with pytest.raises(error):
+        cache.resolve('missing.example', 'MX')
+    with pytest.raises(error):
+        cache.resolve('missing.example', 'MX')
+    assert len(cache.queries) == 1
+    assert cache.get_stats()['negative_hits'] == 1
+    with pytest.raises(error):
+        cache.get_cached('missing.example', 'MX')
+
+    clock.advance(300)
+    with pytest.raises(error):
+        cache.resolve('missing.example', 'MX')
+    assert len(cache.queries) == 2
+
+
+def test_transient_failures_are_not_cached():
+    cache = ScriptedCache({('flaky.example', 'MX'): dns.exception.Timeout()})
+
+    for _ in range(2):
+        with pytest.raises(dns.exception.Timeout):
+            cache.resolve('flaky.example', 'MX')
+    assert len(cache.queries) == 2
+    assert cache.get_cached('flaky.example', 'MX') is None
+
+
+def test_concurrent_lookups_share_one_query():
+    release = threading.Event()
+    started = threading.Event()
+
+    class SlowCache(ScriptedCache):
+        def _query(self, domain, rdtype):
+            started.set()
+            release.wait(5)
+            return super()._query(domain, rdtype)
+
+    cache = SlowCache({('example.com', 'MX'): (['mx.example.com'], 300)})
+    results = []
+
+    def lookup():
+        results.append(cache.resolve('example.com', 'MX'))
+
+    threads = [threading.Thread(target=lookup) for _ in range(5)]
+    threads[0].start()
+    assert started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    # Wait until the other four are parked on the pending lookup
+    for _ in range(500):
+        if cache.get_stats()['coalesced'] == 4:
+            break
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert results == [['mx.example.com']] * 5
+    assert len(cache.queries) == 1
+    assert cache.get_stats()['coalesced'] == 4
+
+
+def test_waiters_get_the_owners_error():
+    release = threading.Event()
+    started = threading.Event()
+
+    class SlowCache(ScriptedCache):
+        def _query(self, domain, rdtype):
+            started.set()
+            release.wait(5)
+            return super()._query(domain, rdtype)
+
+    cache = SlowCache({('missing.example', 'MX'): dns.resolver.NXDOMAIN()})
+    errors = []
+
+    def lookup():
+        try:
+            cache.resolve('missing.example', 'MX')
+        except dns.resolver.NXDOMAIN as e:
+            errors.append(e)
+
+    owner = threading.Thread(target=lookup)
+    owner.start()
+    assert started.wait(5)
+    waiter = threading.Thread(target=lookup)
+    waiter.start()
+    for _ in range(500):
+        if cache.get_stats()['coalesced'] == 1:
+            break
+        time.sleep(0.01)
+    release.set()
+    owner.join(5)
+    waiter.join(5)
+
+    assert len(errors) == 2
+    assert len(cache.queries) == 1
+
+
+def test_put_and_get_cached_for_the_async_resolver():
+    cache = DNSCache()
+    assert cache.get_cached('example.com', 'MX') is None
+
+    cache.put('missing.example', 'MX', negative=dns.resolver.NXDOMAIN)
+    with pytest.raises(dns.resolver.NXDOMAIN):
+        cache.get_cached('missing.example', 'MX')
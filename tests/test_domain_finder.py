@@ -0,0 +1,126 @@
+import os
+import threading
+import time
+
+import pytest
+
+import domain_finder
+from company_domain_cache import CompanyDomainCache
+
+FIXTURES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks', 'fixtures')
+
+
+def fixture_html(name):
+    with open(os.path.join(FIXTURES, f'{name}.html'), encoding='utf-8') as file:
+        return file.read()
+
+
+@pytest.mark.parametrize('page, engine, company_name, expected', [
+    ('google_gazprom_neft', 'google', 'Газпром нефть', 'gazprom-neft.ru'),
+    ('yandex_gazprom_neft', 'yandex', 'Газпром нефть', 'gazprom-neft.ru'),
+    ('google_romashka', 'google', 'Ромашка', 'romashka.ru'),
+    ('yandex_romashka', 'yandex', 'Ромашка', 'romashka.ru'),
+])
+def test_result_pages_give_the_company_domain(page, engine, company_name, expected):
+    html = fixture_html(page)
+    domains = domain_finder.parse_search_results(html, engine, company_name)
+
+    assert domain_finder.pick_most_likely_domain(company_name, domains) == expected
+    assert not any(marker in domain for domain in domains for marker in domain_finder.SKIPPED_LINK_MARKERS)
+    # The single-pass extractor finds the same links as a full BeautifulSoup parse
+    assert domain_finder.parse_search_results(html, engine, company_name, parser='html.parser') == domains
+
+
+def test_fallback_domains_cover_the_usual_tlds():
+    assert domain_finder.fallback_domains('ООО "Ромашка"') == ['romashka.ru', 'romashka.com',
+                                                               'xn--80aa3agjl3d.xn--p1ai']
+    assert domain_finder.fallback_domains('ИП') == []
+
+
+@pytest.fixture
+def cache(database, monkeypatch):
+    cache = CompanyDomainCache()
+    monkeypatch.setattr(domain_finder, 'company_domain_cache', cache)
+    return cache
+
+
+@pytest.fixture
+def searches(monkeypatch):
+    """Stand-in for the search engines; records (company, engine) and the peak concurrency."""
+    state = {'calls': [], 'in_flight': 0, 'peak': 0, 'results': {}}
+    lock = threading.Lock()
+
+    def search_engine_domains(company_name, engine, lang='ru'):
+        with lock:
+            state['calls'].append((company_name, engine))
+            state['in_flight'] += 1
+            state['peak'] = max(state['peak'], state['in_flight'])
+        time.sleep(0.05)
+        with lock:
+            state['in_flight'] -= 1
+        return state['results'].get(company_name, [])
+
+    monkeypatch.setattr(domain_finder, 'search_engine_domains', search_engine_domains)
+    return state
+
+
+def test_companies_are_searched_concurrently_and_cached(cache, searches):
+    searches['results'] = {'Ромашка': ['romashka.ru', 'romashka.ru', 'romashka-shop.ru'], 'Лютик': []}
+
+    found = domain_finder.discover_company_domains(['ООО Ромашка', 'Лютик'], max_workers=4)
+
+    assert found == {'ООО Ромашка': 'romashka.ru', 'Лютик': ''}
+    # Legal forms are stripped from the query; both engines are asked about both companies at once
+    assert sorted(searches['calls']) == [('Лютик', 'google'), ('Лютик', 'yandex'),
+                                         ('Ромашка', 'google'), ('Ромашка', 'yandex')]
+    assert searches['peak'] == 4
+    assert cache.get_entry('Ромашка')['candidates'] == {'romashka.ru': 4, 'romashka-shop.ru': 2}
+
+    searches['calls'].clear()
+    assert domain_finder.discover_company_domains(['Ромашка', 'Лютик']) == {'Ромашка': 'romashka.ru', 'Лютик': ''}
+    assert searches['calls'] == []
+
+
+def test_failed_searches_are_not_cached(cache, monkeypatch):
+    monkeypatch.setattr(domain_finder, 'search_engine_domains', lambda company_name, engine, lang='ru': None)
+    assert domain_finder.discover_company_domains(['Ромашка']) == {'Ромашка': ''}
+    assert cache.get('Ромашка') is None
+
+
+def test_overrides_skip_the_search(cache, searches):
+    cache.set_override('Ромашка', 'romashka.ru')
+    assert domain_finder.discover_company_domains(['ООО «Ромашка»']) == {'ООО «Ромашка»': 'romashka.ru'}
+    assert searches['calls'] == []
+
+
+def test_domains_without_a_mail_server_are_dropped_before_any_candidates(cache, searches, monkeypatch):
+    searches['results'] = {'Ромашка': ['romashka.ru'], 'Лютик': []}
+    with_mail = {'firm.ru', 'romashka.ru', 'lyutik.com'}
+    checked = []
+
+    def has_mx_record(domain, retries=3):
+        checked.append(domain)
+        return domain in with_mail
+
+    monkeypatch.setattr(domain_finder, 'has_mx_record', has_mx_record)
+    entries = [('Иван', 'Петров', 'https://www.Firm.ru/about'), ('Анна', 'Смирнова', 'dead.ru'),
+               ('Олег', 'Сидоров', 'ООО Ромашка'), ('Мария', 'Иванова', 'Лютик'), ('Пётр', 'Кузнецов', '')]
+
+    assert domain_finder.find_missing_domains(entries) == [
+        ('Иван', 'Петров', 'firm.ru'), ('Анна', 'Смирнова', ''), ('Олег', 'Сидоров', 'romashka.ru'),
+        # Nothing found for Лютик, so the first of its made-up domains with a mail server
+        ('Мария', 'Иванова', 'lyutik.com'), ('Пётр', 'Кузнецов', '')]
+    # Every domain was checked once, in one pass
+    assert sorted(checked) == sorted(set(checked))
+    assert 'lyutik.ru' in checked
+
+
+def test_each_company_is_searched_once_per_sheet(cache, searches, monkeypatch):
+    monkeypatch.setattr(domain_finder, 'has_mx_record', lambda domain, retries=3: True)
+    searches['results'] = {'Ромашка': ['romashka.ru']}
+    entries = [('Иван', 'Петров', 'Ромашка'), ('Анна', 'Смирнова', 'https://www.Firm.ru/about'),
+               ('Олег', 'Сидоров', 'ООО «Ромашка»')]
+
+    assert domain_finder.find_missing_domains(entries) == [
+        ('Иван', 'Петров', 'romashka.ru'), ('Анна', 'Смирнова', 'firm.ru'), ('Олег', 'Сидоров', 'romashka.ru')]
+    assert sorted(searches['calls']) == [('Ромашка', 'google'), ('Ромашка', 'yandex')]
@@ -0,0 +1,203 @@
+import smtplib
+import time
+from contextlib import contextmanager
+
+import pytest
+
+import dns_cache
+import email_verification_tool
+from email_verification_tool import CatchAllCache, SMTPSession, SMTPSessionPool
+
+
+class FakeMailServer:
+    """Stand-in for the mail servers smtplib.SMTP connects to; logs every command."""
+
+    def __init__(self):
+        self.mailboxes = {'ivan.petrov@firm.ru'}
+        # Reply to RCPT for unknown addresses (250 makes the server accept-all)
+        self.unknown_code = 550
+        self.rset_code = 250
+        self.commands = []
+        self.connections = 0
+        self.drop_next_rcpt = False
+
+    def connect(self, host, port=25, timeout=None):
+        self.connections += 1
+        return FakeConnection(self)
+
+
+class FakeConnection:
+    def __init__(self, server: FakeMailServer):
+        self.server = server
+
+    def set_debuglevel(self, level):
+        pass
+
+    def ehlo(self, name=None):
+        return 250, b'hello'
+
+    def has_extn(self, name):
+        return False
+
+    def mail(self, sender):
+        self.server.commands.append('MAIL')
+        return 250, b'ok'
+
+    def rcpt(self, email):
+        if self.server.drop_next_rcpt:
+            self.server.drop_next_rcpt = False
+            raise smtplib.SMTPServerDisconnected("connection lost")
+        self.server.commands.append(f'RCPT {email}')
+        if email in self.server.mailboxes:
+            return 250, b'ok'
+        return self.server.unknown_code, b'no such user'
+
+    def rset(self):
+        self.server.commands.append('RSET')
+        return self.server.rset_code, b''
+
+    def quit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def server(monkeypatch):
+    server = FakeMailServer()
+    monkeypatch.setattr(email_verification_tool.smtplib, 'SMTP', server.connect)
+    # No pooled connections to another test's server
+    monkeypatch.setattr(email_verification_tool, 'smtp_session_pool', SMTPSessionPool())
+    return server
+
+
+@pytest.fixture
+def paced(monkeypatch):
+    """Records rate-limit waits instead of sleeping."""
+    waits = []
+    monkeypatch.setattr(email_verification_tool.rate_limiter, 'wait', waits.append)
+    monkeypatch.setattr(email_verification_tool.rate_limiter, 'report', lambda *args, **kwargs: None)
+    return waits
+
+
+@pytest.fixture
+def firm(monkeypatch, database, server, paced):
+    """firm.ru resolving to the fake server, with fresh catch-all verdicts."""
+    monkeypatch.setattr(dns_cache, 'resolve_mx', lambda domain: ['mx.firm.ru'])
+    monkeypatch.setattr(email_verification_tool, 'has_mx_record', lambda domain: True)
+    monkeypatch.setattr(email_verification_tool, 'catch_all_cache', CatchAllCache())
+    return server
+
+
+def test_session_resets_between_recipients_instead_of_reconnecting(server):
+    session = SMTPSession('mx.firm.ru', max_recipients=3)
+
+    assert session.probe('ivan.petrov@firm.ru')[0] == 250
+    assert session.probe('i.petrov@firm.ru')[0] == 550
+    assert session.probe('petrov@firm.ru')[0] == 550
+    assert server.connections == 1
+    assert server.commands == ['MAIL', 'RCPT ivan.petrov@firm.ru', 'RSET', 'MAIL', 'RCPT i.petrov@firm.ru',
+                               'RSET', 'MAIL', 'RCPT petrov@firm.ru']
+
+    # Used up: the next recipient gets a new connection
+    session.probe('ipetrov@firm.ru')
+    assert server.connections == 2
+
+
+def test_refused_reset_reconnects(server):
+    server.rset_code = 502
+    session = SMTPSession('mx.firm.ru')
+    session.probe('ivan.petrov@firm.ru')
+    assert session.probe('i.petrov@firm.ru')[0] == 550
+    assert server.connections == 2
+
+
+def test_dropped_connection_is_retried_once(server):
+    session = SMTPSession('mx.firm.ru')
+    session.probe('i.petrov@firm.ru')
+    server.drop_next_rcpt = True
+    assert session.probe('ivan.petrov@firm.ru')[0] == 250
+    assert server.connections == 2
+
+
+def test_pool_hands_out_idle_sessions_per_host(server):
+    pool = SMTPSessionPool()
+    with pool.session('mx.firm.ru') as first:
+        first.probe('ivan.petrov@firm.ru')
+    with pool.session('mx.firm.ru') as second:
+        second.probe('i.petrov@firm.ru')
+    with pool.session('mx.other.ru') as other:
+        pass
+
+    assert second is first
+    assert other is not first
+    assert server.connections == 1
+    pool.close_all()
+
+
+
+def test_catch_all_is_probed_once_and_remembered_across_runs(firm):
+    firm.unknown_code = 250
+    assert email_verification_tool.is_catch_all_domain('Firm.ru')
+    assert email_verification_tool.is_catch_all_domain('firm.ru')
+    assert sum(command.startswith('RCPT') for command in firm.commands) == 1
+
+    # A new process reads the verdict back instead of probing again
+    assert CatchAllCache().get('firm.ru') is True
+
+
+def test_inconclusive_catch_all_probes_are_not_persisted(firm):
+    firm.unknown_code = 451
+    assert not email_verification_tool.is_catch_all_domain('firm.ru')
+    assert email_verification_tool.catch_all_cache.is_known('firm.ru')
+    assert CatchAllCache().get('firm.ru') is None
+
+
+def test_accept_all_rows_are_reported_without_probing_each_address(firm):
+    firm.unknown_code = 250
+    entries = [('Иван', 'Петров', 'firm.ru'), ('Анна', 'Смирнова', '')]
+    results = email_verification_tool.process_name_entries(
+        entries, lambda first_name, last_name, domain: [f'i.petrov@{domain}'])
+
+    assert [(row['valid_email'], row['status']) for row in results] == [
+        ('', email_verification_tool.ACCEPT_ALL_STATUS), ('', email_verification_tool.NO_DOMAIN_STATUS)]
+    assert 'RCPT i.petrov@firm.ru' not in firm.commands
+
+
+def test_accept_all_domains_are_not_probed_per_address(firm):
+    firm.unknown_code = 250
+    result = email_verification_tool.check_email('i.petrov@firm.ru')
+    assert result['outcome'] == email_verification_tool.OUTCOME_ACCEPT_ALL
+    assert not result['is_valid']
+    assert 'RCPT i.petrov@firm.ru' not in firm.commands
+
+
+def test_rate_limit_is_waited_for_outside_the_slot(firm, paced, monkeypatch):
+    held = []
+    in_slot = []
+
+    @contextmanager
+    def slot():
+        held.append(True)
+        yield
+        held.pop()
+
+    def wait(mx_host):
+        paced.append(mx_host)
+        in_slot.append(bool(held))
+
+    monkeypatch.setattr(email_verification_tool.rate_limiter, 'wait', wait)
+
+    result = email_verification_tool.check_email('ivan.petrov@firm.ru', slot=slot)
+    assert result['is_valid']
+    # One wait for the catch-all probe, one for the address, neither inside the slot
+    assert paced == ['mx.firm.ru', 'mx.firm.ru']
+    assert in_slot == [False, False]
+    assert sum(command.startswith('RCPT') for command in firm.commands) == 2
+
+
+def test_waiting_for_the_rate_limit_is_not_a_timeout(firm, monkeypatch):
+    monkeypatch.setattr(email_verification_tool.rate_limiter, 'wait', lambda mx_host: time.sleep(0.3))
+    result = email_verification_tool.check_email('ivan.petrov@firm.ru', timeout=0.25)
+    assert result['outcome'] == email_verification_tool.OUTCOME_VALID
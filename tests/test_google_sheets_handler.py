@@ -0,0 +1,137 @@
+import re
+
+import pytest
+
+import google_sheets_handler
+from check_records import CheckRecord, Outcome
+from google_sheets_handler import GoogleSheetsHandler, ResultSheetWriter, iter_name_entries
+
+
+class FakeWorksheet:
+    """A worksheet held in memory; answers ranges the way the Sheets API does."""
+
+    def __init__(self, rows=(), row_count=20, title='Sheet1'):
+        self.rows = [list(row) for row in rows]
+        self.row_count = row_count
+        self.title = title
+        self.ranges_read = []
+        self.updates = []
+
+    def get(self, cell_range):
+        self.ranges_read.append(cell_range)
+        first, last = map(int, re.findall(r'\d+', cell_range))
+        values = [row[:3] for row in self.rows[first - 1:last]]
+        # Trailing empty rows are left out of the response
+        while values and not any(values[-1]):
+            values.pop()
+        return values
+
+    def col_values(self, column):
+        return [row[column - 1] for row in self.rows if len(row) >= column and row[column - 1]]
+
+    def update(self, range_name, values):
+        self.updates.append(range_name)
+        first = int(re.search(r'\d+', range_name).group())
+        for offset, row in enumerate(values):
+            index = first - 1 + offset
+            assert index < self.row_count, "wrote past the end of the worksheet"
+            while len(self.rows) <= index:
+                self.rows.append([])
+            self.rows[index] = list(row)
+
+    def add_rows(self, count):
+        self.row_count += count
+
+
+class FakeClient:
+    def __init__(self, worksheet):
+        self.worksheet = worksheet
+
+    def open_by_url(self, url):
+        return self
+
+    def get_worksheet(self, index):
+        return self.worksheet
+
+
+@pytest.fixture(autouse=True)
+def no_pacing(monkeypatch):
+    monkeypatch.setattr(google_sheets_handler, 'SHEETS_MIN_REQUEST_INTERVAL', 0)
+
+
+def make_handler(worksheet):
+    handler = GoogleSheetsHandler.__new__(GoogleSheetsHandler)
+    handler.client = FakeClient(worksheet)
+    return handler
+
+
+def test_name_entries_keep_their_sheet_row_numbers():
+    rows = [['Иван', ' Петров ', 'firm.ru'], [], ['Анна', ''], ['Олег', 'Сидоров']]
+    assert list(iter_name_entries(rows, first_row=2)) == [(2, ('Иван', 'Петров', 'firm.ru')),
+                                                          (5, ('Олег', 'Сидоров', ''))]
+
+
+def test_rows_are_read_in_ranged_chunks():
+    worksheet = FakeWorksheet([['First', 'Last', 'Company']] + [[f'name{i}', 'x', 'firm.ru'] for i in range(7)],
+                              row_count=8)
+    rows = list(make_handler(worksheet).iter_rows('url', chunk_rows=3))
+
+    assert worksheet.ranges_read == ['A2:C4', 'A5:C7', 'A8:C8']
+    assert [row[0] for row in rows] == [f'name{i}' for i in range(7)]
+
+
+def test_row_numbers_stay_aligned_when_a_chunk_ends_in_empty_rows():
+    worksheet = FakeWorksheet([['First', 'Last', 'Company'], ['Иван', 'Петров', 'firm.ru'], [], [],
+                               ['Анна', 'Смирнова', 'firm.ru']], row_count=6)
+    entries = list(make_handler(worksheet).read_name_entries('url', chunk_rows=3))
+
+    assert worksheet.ranges_read == ['A2:C4', 'A5:C6']
+    assert entries == [(2, ('Иван', 'Петров', 'firm.ru')), (5, ('Анна', 'Смирнова', 'firm.ru'))]
+
+
+def test_reading_can_resume_from_a_later_row():
+    worksheet = FakeWorksheet([['First', 'Last', 'Company'], ['Иван', 'Петров', 'a.ru'], ['Анна', 'Смирнова', 'b.ru']],
+                              row_count=3)
+    assert list(make_handler(worksheet).read_name_entries('url', start_row=3)) == [
+        (3, ('Анна', 'Смирнова', 'b.ru'))]
+
+
+def test_writer_adds_the_header_and_grows_the_sheet():
+    worksheet = FakeWorksheet(row_count=3, title='Results_Sheet1')
+    writer = ResultSheetWriter(worksheet, batch_rows=2, flush_interval=60)
+    writer.add_result(2, ('Иван', 'Петров', 'firm.ru'), [], [{'email': 'i.petrov@firm.ru'}])
+    writer.add_result(3, ('Анна', 'Смирнова', ''), [], [])
+    writer.add_result(5, ('Олег', 'Сидоров', 'firm.ru'),
+                      [CheckRecord.create('o.sidorov@firm.ru', Outcome.ACCEPT_ALL)], [])
+
+    assert writer.close() == 0
+    assert worksheet.rows == [
+        google_sheets_handler.RESULT_HEADERS,
+        ['Иван', 'Петров', 'firm.ru', 'i.petrov@firm.ru', 'Valid', 2],
+        ['Анна', 'Смирнова', '', '', 'No domain found', 3],
+        ['Олег', 'Сидоров', 'firm.ru', '', 'Accept-all/unverifiable', 5],
+    ]
+    assert worksheet.updates[0] == 'A1'
+    # The sheet was grown before the rows ran past its last row (FakeWorksheet checks)
+    assert worksheet.row_count >= 4
+    assert writer.rows_written == 3
+
+
+def test_writer_appends_after_earlier_results():
+    worksheet = FakeWorksheet([google_sheets_handler.RESULT_HEADERS, ['Иван', 'Петров', 'firm.ru', '', '', 2]])
+    writer = ResultSheetWriter(worksheet, batch_rows=10, flush_interval=60)
+    writer.add_row(['Анна', 'Смирнова', 'firm.ru', '', 'No valid email found', 3])
+    assert writer.close() == 0
+    assert worksheet.updates == ['A3:F3']
+
+
+def test_rows_that_cannot_be_written_are_reported(monkeypatch):
+    worksheet = FakeWorksheet([google_sheets_handler.RESULT_HEADERS])
+    writer = ResultSheetWriter(worksheet, batch_rows=10, flush_interval=60)
+
+    def broken(range_name, values):
+        raise RuntimeError("quota exceeded")
+
+    monkeypatch.setattr(worksheet, 'update', broken)
+    writer.add_row(['Иван', 'Петров', 'firm.ru', '', 'No valid email found', 2])
+    assert writer.close() == 1
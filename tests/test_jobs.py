@@ -0,0 +1,237 @@
+import threading
+import time
+
+import pytest
+
+import jobs
+from check_records import CheckRecord, Outcome
+from jobs import FairShareLimiter, JobScheduler, JobStore
+
+ENTRIES = [
+    ('Иван', 'Петров', 'example.com'),
+    ('Анна', 'Смирнова', 'ООО Ромашка'),
+    ('Олег', 'Сидоров', 'example.org'),
+    ('Мария', 'Иванова', ''),
+    ('Пётр', 'Кузнецов', 'example.net'),
+]
+
+
+@pytest.fixture
+def store(database):
+    return JobStore()
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not met in time")
+        time.sleep(0.01)
+
+
+def test_create_job_streams_rows_in_batches(store, monkeypatch):
+    monkeypatch.setattr(jobs, 'JOB_INSERT_BATCH', 2)
+    job_id = store.create_job(iter(ENTRIES), sheet_url='https://sheet', params={'timeout': 5})
+
+    job = store.get_job(job_id)
+    assert job['total'] == 5
+    assert job['status'] == 'initializing'
+    assert job['params'] == {'timeout': 5}
+    assert store.get_entries(job_id) == ENTRIES
+    assert store.preview_entries(job_id, limit=2) == ENTRIES[:2]
+    assert store.has_company_names(job_id)
+
+
+def test_pending_batches_are_keyset_paged_in_sheet_order(store):
+    job_id = store.create_job(ENTRIES)
+    batches = list(store.iter_pending_batches(job_id, 2))
+
+    assert [[index for index, _, _ in batch] for batch in batches] == [[0, 1], [2, 3], [4]]
+    assert batches[0][0] == (0, ENTRIES[0], False)
+
+
+def test_completed_rows_are_skipped_on_resume(store):
+    job_id = store.create_job(ENTRIES)
+    checked = [CheckRecord.create('ivan.petrov@example.com', Outcome.VALID, 'first.last')]
+    valid = [{'first_name': 'Иван', 'last_name': 'Петров', 'domain': 'example.com',
+              'email': 'ivan.petrov@example.com'}]
+    store.complete_rows(job_id, [(0, 'Иван Петров (example.com)', checked, valid),
+                                 (2, 'Олег Сидоров (example.org)', [], [])])
+
+    pending = [index for batch in store.iter_pending_batches(job_id, 2) for index, _, _ in batch]
+    assert pending == [1, 3, 4]
+    assert store.completed_count(job_id) == 2
+    assert store.get_valid_emails(job_id) == valid
+
+    results = store.get_results(job_id)
+    assert results['valid_emails'] == valid
+    [record] = results['all_checked_emails']['Иван Петров (example.com)']
+    assert (record.email, record.outcome, record.pattern_id) == ('ivan.petrov@example.com', Outcome.VALID,
+                                                                'first.last')
+
+
+def test_resolved_domains_are_checkpointed(store):
+    job_id = store.create_job(ENTRIES)
+    store.set_domains(job_id, [('Анна', 'Смирнова', 'romashka.ru')], [1])
+
+    batch = next(store.iter_pending_batches(job_id, 5))
+    assert batch[1] == (1, ('Анна', 'Смирнова', 'romashka.ru'), True)
+    assert batch[0][2] is False
+    # The sheet's own value is kept for the results page
+    assert store.get_original_entries(job_id)[1] == ENTRIES[1]
+
+
+def test_sheet_rows_are_kept_for_numbered_entries(store):
+    numbered = [(2, ENTRIES[0]), (5, ENTRIES[1])]
+    job_id = store.create_job(iter(numbered), numbered=True)
+    assert store.sheet_rows(job_id, [0, 1]) == {0: 2, 1: 5}
+
+    # Jobs not read from a sheet count from 1
+    other_id = store.create_job(ENTRIES[:2])
+    assert store.sheet_rows(other_id, [0, 1]) == {0: 1, 1: 2}
+
+
+def test_completed_batches_replay_results_with_sheet_rows(store):
+    job_id = store.create_job(iter([(7, ENTRIES[0]), (9, ENTRIES[2])]), numbered=True)
+    checked = [CheckRecord.create('o.sidorov@example.org', Outcome.INVALID)]
+    store.complete_rows(job_id, [(1, 'Олег Сидоров (example.org)', checked, [])])
+
+    [[(sheet_row, entry, replayed, valid)]] = list(store.iter_completed_batches(job_id, 10))
+    assert (sheet_row, entry, valid) == (9, ENTRIES[2], [])
+    assert [record.email for record in replayed] == ['o.sidorov@example.org']
+
+
+def test_results_unwritten_flag(store):
+    job_id = store.create_job(ENTRIES)
+    assert store.get_job(job_id)['results_unwritten'] is False
+    store.set_results_unwritten(job_id, True)
+    assert store.get_job(job_id)['results_unwritten'] is True
+
+
+def test_resumable_jobs_skip_drafts_finished_and_owned_jobs(store):
+    running = store.create_job(ENTRIES)
+    draft = store.create_job(ENTRIES, status='draft')
+    done = store.create_job(ENTRIES)
+    store.set_status(done, 'complete')
+    owned = store.create_job(ENTRIES)
+    assert store.claim_job(owned, owner='other-process')
+
+    assert store.resumable_jobs() == [running]
+    store.start_job(draft, {'timeout': 5})
+    assert store.resumable_jobs() == [running, draft]
+
+
+def test_only_expired_drafts_are_deleted(store, monkeypatch):
+    old_draft = store.create_job(ENTRIES, status='draft')
+    old_job = store.create_job(ENTRIES)
+    now = time.time()
+    monkeypatch.setattr(jobs.time, 'time', lambda: now + 3600)
+    new_draft = store.create_job(ENTRIES, status='draft')
+
+    assert store.delete_expired_drafts(max_age=1800) == 1
+    assert store.get_job(old_draft) is None
+    assert store.get_entries(old_draft) == []
+    assert store.get_job(old_job) is not None
+    assert store.get_job(new_draft) is not None
+
+
+def test_claim_is_exclusive_until_the_heartbeat_goes_stale(store, monkeypatch):
+    job_id = store.create_job(ENTRIES)
+    assert store.claim_job(job_id, owner='a')
+    assert store.claim_job(job_id, owner='a')
+    assert not store.claim_job(job_id, owner='b')
+
+    # Owner 'a' died: its heartbeat is older than the claim timeout
+    now = time.time()
+    monkeypatch.setattr(jobs.time, 'time', lambda: now + jobs.JOB_CLAIM_TIMEOUT + 1)
+    assert store.resumable_jobs() == [job_id]
+    assert store.claim_job(job_id, owner='b')
+    assert not store.claim_job(job_id, owner='a')
+
+
+def test_heartbeat_keeps_the_claim_and_release_frees_it(store, monkeypatch):
+    job_id = store.create_job(ENTRIES)
+    assert store.claim_job(job_id, owner='a')
+    now = time.time()
+    monkeypatch.setattr(jobs.time, 'time', lambda: now + jobs.JOB_CLAIM_TIMEOUT - 1)
+    store.heartbeat([job_id], owner='a')
+    monkeypatch.setattr(jobs.time, 'time', lambda: now + jobs.JOB_CLAIM_TIMEOUT + 1)
+    assert not store.claim_job(job_id, owner='b')
+
+    # Only the owner can release it
+    store.release_job(job_id, owner='b')
+    assert not store.claim_job(job_id, owner='b')
+    store.release_job(job_id, owner='a')
+    assert store.claim_job(job_id, owner='b')
+
+
+def test_scheduler_runs_a_claimed_job_and_releases_it(store):
+    scheduler = JobScheduler(max_connections=2, store=store)
+    job_id = store.create_job(ENTRIES)
+    release = threading.Event()
+    seen = []
+
+    def target(handle):
+        seen.append(handle.job_id)
+        release.wait(5)
+
+    handle = scheduler.start(job_id, target, total=5)
+    assert handle is not None
+    # Starting it again while it runs returns the same handle
+    assert scheduler.start(job_id, target) is handle
+    assert scheduler.running_jobs() == [job_id]
+    assert not store.claim_job(job_id, owner='other-process')
+
+    release.set()
+    handle.thread.join(5)
+    assert seen == [job_id]
+    wait_until(lambda: store.claim_job(job_id, owner='other-process'))
+    # The finished job's handle isn't kept around
+    wait_until(lambda: scheduler.get(job_id) is None)
+    assert scheduler.running_jobs() == []
+
+
+def test_scheduler_does_not_start_a_job_another_process_owns(store):
+    scheduler = JobScheduler(store=store)
+    job_id = store.create_job(ENTRIES)
+    assert store.claim_job(job_id, owner='other-process')
+
+    assert scheduler.start(job_id, lambda handle: None) is None
+    assert scheduler.get(job_id) is None
+
+
+def test_cancel_sets_the_stop_flag(store):
+    scheduler = JobScheduler(store=store)
+    job_id = store.create_job(ENTRIES)
+    handle = scheduler.start(job_id, lambda handle: handle.stop_event.wait(5))
+
+    assert scheduler.cancel(job_id)
+    handle.thread.join(5)
+    assert handle.progress['status'] == 'stopping'
+    assert not scheduler.cancel(job_id)
+
+
+def test_fair_share_limiter_rotates_between_jobs():
+    limiter = FairShareLimiter(capacity=1)
+    limiter.acquire('setup')
+    order = []
+
+    def probe(job_id):
+        with limiter.slot(job_id):
+            order.append(job_id)
+
+    threads = []
+    for job_id in ['big', 'big', 'big', 'small']:
+        thread = threading.Thread(target=probe, args=(job_id,))
+        thread.start()
+        threads.append(thread)
+        waiting = len(threads)
+        wait_until(lambda: sum(limiter.get_stats()['waiting'].values()) == waiting)
+
+    limiter.release()
+    for thread in threads:
+        thread.join(5)
+
+    # The small job gets the second slot instead of waiting behind the big one
+    assert order == ['big', 'small', 'big', 'big']
+    assert limiter.get_stats()['in_use'] == 0
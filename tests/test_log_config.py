@@ -0,0 +1,93 @@
+import logging
+import queue
+
+import pytest
+
+import log_config
+from log_config import EventLogger, NonBlockingQueueHandler, WriterThread, parse_levels
+
+
+def make_record(level, message='event'):
+    return logging.LogRecord('email_verifier', level, __file__, 1, message, (), None)
+
+
+def test_parse_levels():
+    assert parse_levels('domain_finder=DEBUG, email_verifier=warning,bad') == {
+        'domain_finder': logging.DEBUG, 'email_verifier': logging.WARNING}
+
+
+def test_full_queue_drops_info_but_keeps_warnings():
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=1))
+    handler.handle(make_record(logging.INFO, 'first'))
+    handler.handle(make_record(logging.INFO, 'dropped'))
+    handler.handle(make_record(logging.DEBUG, 'dropped too'))
+    handler.handle(make_record(logging.ERROR, 'kept'))
+
+    assert handler.dropped == 2
+    kept = [handler.queue.get_nowait().msg for _ in range(handler.queue.qsize())]
+    assert kept == ['first', 'kept']
+
+
+def test_records_are_queued_unformatted():
+    handler = NonBlockingQueueHandler(queue.Queue())
+    record = logging.LogRecord('email_verifier', logging.INFO, __file__, 1, 'probed %s', ('x@firm.ru',), None)
+    handler.handle(record)
+    assert handler.queue.get_nowait().args == ('x@firm.ru',)
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+def test_writer_thread_stops_with_a_full_queue():
+    log_queue = queue.Queue(maxsize=2)
+    target = ListHandler()
+    writer = WriterThread(log_queue, target)
+    log_queue.put_nowait(make_record(logging.INFO, 'one'))
+    log_queue.put_nowait(make_record(logging.INFO, 'two'))
+
+    writer.start()
+    writer.stop()
+    assert target.messages == ['one', 'two']
+
+
+@pytest.fixture
+def events():
+    logger = logging.getLogger('test_events')
+    target = ListHandler()
+    logger.addHandler(target)
+    logger.propagate = False
+    yield target
+    logger.removeHandler(target)
+    logger.setLevel(logging.NOTSET)
+    logger.propagate = True
+
+
+def test_disabled_events_are_not_logged(events):
+    logging.getLogger('test_events').setLevel(logging.WARNING)
+    EventLogger('test_events').info('smtp connect', mx_host='mx.firm.ru')
+    assert events.messages == []
+
+
+def test_sampled_events(events, monkeypatch):
+    logger = logging.getLogger('test_events')
+    logger.setLevel(logging.INFO)
+    EventLogger('test_events', sample_rate=0).sampled('candidate', email='i.petrov@firm.ru')
+    assert events.messages == []
+
+    monkeypatch.setattr(log_config.random, 'random', lambda: 0.0)
+    EventLogger('test_events', sample_rate=0.5).sampled('candidate', email='i.petrov@firm.ru')
+    # At DEBUG every event is logged, sample rate or not
+    logger.setLevel(logging.DEBUG)
+    EventLogger('test_events', sample_rate=0).sampled('rcpt reply', code=250)
+    assert events.messages == ['candidate', 'rcpt reply']
+
+
+def test_stats_without_configured_logging(monkeypatch):
+    monkeypatch.setattr(log_config, '_queue_handler', None)
+    assert log_config.get_stats() == {'queued': 0, 'dropped': 0}
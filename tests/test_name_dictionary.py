@@ -0,0 +1,85 @@
+import pytest
+
+from name_dictionary import NameDictionary, SuffixTrie, SurnameEnding, parse_dictionary
+
+
+@pytest.fixture
+def trie():
+    trie = SuffixTrie()
+    for ending in ['ов', 'ова', 'ский', 'ий', 'ович']:
+        trie.insert(ending, ending)
+    return trie
+
+
+@pytest.mark.parametrize('word, expected', [
+    ('иванов', 'ов'),
+    ('иванова', 'ова'),
+    ('петрович', 'ович'),
+    ('достоевский', 'ский'),
+    ('горький', 'ий'),
+    ('смит', None),
+])
+def test_longest_ending_wins(trie, word, expected):
+    assert trie.longest_match(word) == expected
+
+
+def test_a_match_must_leave_part_of_the_word(trie):
+    # "ов" on its own is not a surname with the ending "ов"
+    assert trie.longest_match('ов') is None
+    assert trie.longest_match('ова') is None
+    assert trie.longest_match('нова') == 'ова'
+    assert trie.longest_match('') is None
+
+
+def test_reinserting_an_ending_replaces_its_value(trie):
+    assert len(trie) == 5
+    trie.insert('ов', 'replaced')
+    assert len(trie) == 5
+    assert trie.longest_match('иванов') == 'replaced'
+
+
+def test_parse_dictionary():
+    sections = parse_dictionary([
+        '# comment',
+        '[names]',
+        'Юрий = Yury, yuri,  # trailing comment',
+        '',
+        '[surname_endings]',
+        'ов = ov, off',
+    ])
+    assert sections == {'names': {'юрий': ('yury', 'yuri')}, 'surname_endings': {'ов': ('ov', 'off')}}
+
+
+@pytest.mark.parametrize('lines', [['юрий = yury'], ['[names]', 'юрий yury']])
+def test_parse_dictionary_rejects_malformed_lines(lines):
+    with pytest.raises(ValueError, match=f"Line {len(lines)}"):
+        parse_dictionary(lines)
+
+
+def test_bundled_dictionary():
+    dictionary = NameDictionary()
+    assert dictionary.name_variations('Юрий')[:2] == ('yury', 'yuri')
+    assert dictionary.name_variations('Неизвестный') == ()
+    assert dictionary.surname_ending('Достоевская').ending == 'ская'
+    assert dictionary.surname_ending('Петрович').variants[0] == 'ovich'
+
+
+def test_extra_files_replace_earlier_entries(tmp_path):
+    base = tmp_path / 'base.txt'
+    base.write_text('[names]\nюрий = yury\nсемён = semyon\n[surname_endings]\nов = ov\n', encoding='utf-8')
+    extra = tmp_path / 'extra.txt'
+    extra.write_text('[names]\nЮрий = jurij\n[patronymic_endings]\nович = ovich\n', encoding='utf-8')
+
+    dictionary = NameDictionary([str(base), str(extra)])
+    assert dictionary.name_variations('юрий') == ('jurij',)
+    # Names are looked up with ё spelled е
+    assert dictionary.name_variations('Семен') == ('semyon',)
+    assert dictionary.surname_ending('Иванов') == SurnameEnding('ов', ('ov',), 2)
+    assert dictionary.surname_ending('Петрович') == SurnameEnding('ович', ('ovich',), 5)
+
+
+def test_files_are_only_read_on_first_lookup(tmp_path):
+    path = tmp_path / 'names.txt'
+    dictionary = NameDictionary([str(path)])
+    path.write_text('[names]\nюрий = yury\n', encoding='utf-8')
+    assert dictionary.name_variations('Юрий') == ('yury',)
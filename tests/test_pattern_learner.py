@@ -0,0 +1,57 @@
+import pytest
+
+from pattern_learner import PatternLearner, infer_pattern
+
+CANDIDATES = ['anna.smirnova@firm.ru', 'a.smirnova@firm.ru', 'asmirnova@firm.ru', 'smirnova@firm.ru']
+
+
+@pytest.fixture
+def learner(database):
+    return PatternLearner(restrict_min_hits=2, restrict_min_share=0.8)
+
+
+@pytest.mark.parametrize('email, pattern', [
+    ('i.petrov@firm.ru', 'f.last'),
+    ('Ivan.Petrov@firm.ru', 'first.last'),
+    ('petrov@firm.ru', 'last'),
+    ('boss@firm.ru', None),
+    ('not-an-address', None),
+])
+def test_infer_pattern(email, pattern):
+    assert infer_pattern('Иван', 'Петров', email) == pattern
+
+
+def test_hits_are_counted_and_persisted(learner):
+    assert learner.record_hit('Иван', 'Петров', 'i.petrov@firm.ru') == 'f.last'
+    assert learner.record_hit('Олег', 'Сидоров', 'o.sidorov@Firm.ru') == 'f.last'
+    assert learner.record_hit('Иван', 'Петров', 'boss@firm.ru') is None
+
+    assert learner.get_patterns('firm.ru') == {'f.last': 2}
+    # Another process (or a later run) starts from the stored counts
+    assert PatternLearner().get_patterns('FIRM.RU') == {'f.last': 2}
+
+
+def test_unknown_domains_keep_the_candidates(learner):
+    assert learner.apply('Анна', 'Смирнова', 'firm.ru', CANDIDATES) == CANDIDATES
+
+
+def test_learned_patterns_are_probed_first(learner):
+    learner.record_hit('Иван', 'Петров', 'petrov@firm.ru')
+    assert learner.dominant_pattern('firm.ru') is None
+    assert learner.apply('Анна', 'Смирнова', 'firm.ru', CANDIDATES) == [
+        'smirnova@firm.ru', 'anna.smirnova@firm.ru', 'a.smirnova@firm.ru', 'asmirnova@firm.ru']
+
+
+def test_a_dominant_pattern_restricts_the_candidates(learner):
+    learner.record_hit('Иван', 'Петров', 'i.petrov@firm.ru')
+    learner.record_hit('Олег', 'Сидоров', 'o.sidorov@firm.ru')
+    assert learner.dominant_pattern('firm.ru') == 'f.last'
+    assert learner.apply('Анна', 'Смирнова', 'firm.ru', CANDIDATES) == ['a.smirnova@firm.ru']
+
+
+def test_no_dominant_pattern_without_a_big_enough_share(learner):
+    learner.record_hit('Иван', 'Петров', 'i.petrov@firm.ru')
+    learner.record_hit('Олег', 'Сидоров', 'o.sidorov@firm.ru')
+    learner.record_hit('Иван', 'Кузнецов', 'ivan.kuznetsov@firm.ru')
+    # Two of three hits is below the 80% share
+    assert learner.dominant_pattern('firm.ru') is None
@@ -0,0 +1,191 @@
+import queue
+import threading
+import time
+
+import pytest
+
+import dns_cache
+import domain_finder
+import email_verification_tool
+import jobs
+from check_records import Outcome
+from pipeline import SheetPipeline
+
+SHEET = [
+    (2, ('Иван', 'Петров', 'example.com')),
+    (3, ('Анна', 'Смирнова', 'ООО Ромашка')),
+    (5, ('Олег', 'Сидоров', 'example.org')),
+]
+COMPANY_DOMAINS = {'ООО Ромашка': 'romashka.ru'}
+
+
+@pytest.fixture
+def store(database):
+    return jobs.JobStore()
+
+
+@pytest.fixture
+def resolved_companies(monkeypatch):
+    """Stand-in for domain discovery; records the entries it was asked about."""
+    calls = []
+
+    def find_missing_domains(entries):
+        calls.append(list(entries))
+        return [(first, last, COMPANY_DOMAINS.get(company, company)) for first, last, company in entries]
+
+    monkeypatch.setattr(domain_finder, 'find_missing_domains', find_missing_domains)
+    return calls
+
+
+@pytest.fixture(autouse=True)
+def no_network(monkeypatch):
+    def no_dns(domain):
+        raise dns_cache.dns.resolver.NoNameservers()
+
+    monkeypatch.setattr(dns_cache, 'resolve_mx', no_dns)
+    monkeypatch.setattr(email_verification_tool, 'is_catch_all_domain', lambda domain, **kwargs: False)
+
+
+def variations(first_name, last_name, domain):
+    return [f'first@{domain}', f'second@{domain}']
+
+
+def check(email, timeout, slot=None):
+    # Only the second candidate at example.com exists
+    is_valid = email == 'second@example.com'
+    return {'is_valid': is_valid, 'outcome': 'valid' if is_valid else 'invalid'}
+
+
+def make_pipeline(store, job_id, **kwargs):
+    kwargs.setdefault('engine_options', {'check_func': check, 'variations_func': variations, 'learner': None,
+                                         'max_workers': 2})
+    return SheetPipeline(job_id, jobs.new_progress(job_id, store.get_job(job_id)['total']), job_store=store,
+                         **kwargs)
+
+
+def test_rows_flow_through_every_stage(store, resolved_companies):
+    job_id = store.create_job(iter(SHEET), numbered=True)
+    emitted = []
+    pipeline = make_pipeline(store, job_id, batch_size=2, stop_on_first_valid=True,
+                             on_row_done=lambda *row: emitted.append(row))
+
+    assert pipeline.run()
+
+    assert store.completed_count(job_id) == 3
+    assert list(store.iter_pending_batches(job_id, 10)) == []
+    # Every row went through domain discovery once
+    assert sorted(entry for batch in resolved_companies for entry in batch) == sorted(entry for _, entry in SHEET)
+    assert store.get_job(job_id)['domains_resolved']
+    assert store.get_valid_emails(job_id) == [{'first_name': 'Иван', 'last_name': 'Петров',
+                                               'domain': 'example.com', 'email': 'second@example.com'}]
+
+    # Rows are handed on with their number in the source sheet and the resolved domain
+    by_row = {sheet_row: (entry, checked) for sheet_row, entry, checked, valid in emitted}
+    assert sorted(by_row) == [2, 3, 5]
+    assert by_row[3][0] == ('Анна', 'Смирнова', 'romashka.ru')
+    assert [(record.email, record.outcome) for record in by_row[2][1]] == [
+        ('first@example.com', Outcome.INVALID), ('second@example.com', Outcome.VALID)]
+
+
+def test_resumed_job_only_processes_pending_rows(store, resolved_companies):
+    job_id = store.create_job(iter(SHEET), numbered=True)
+    store.set_domains(job_id, [('Анна', 'Смирнова', 'romashka.ru')], [1])
+    store.complete_rows(job_id, [(0, 'Иван Петров (example.com)', [], [])])
+    emitted = []
+
+    assert make_pipeline(store, job_id, on_row_done=lambda *row: emitted.append(row)).run()
+
+    assert sorted(sheet_row for sheet_row, _, _, _ in emitted) == [3, 5]
+    # The checkpointed domain is reused instead of searching again
+    assert resolved_companies == [[('Олег', 'Сидоров', 'example.org')]]
+    assert store.completed_count(job_id) == 3
+
+
+def test_a_failing_stage_stops_the_run_and_is_raised(store, monkeypatch):
+    def broken(entries):
+        raise RuntimeError("search engine down")
+
+    monkeypatch.setattr(domain_finder, 'find_missing_domains', broken)
+    job_id = store.create_job(iter(SHEET), numbered=True)
+
+    with pytest.raises(RuntimeError, match="search engine down"):
+        make_pipeline(store, job_id, batch_size=1).run()
+
+
+def test_stop_request_leaves_the_rest_pending(store, resolved_companies):
+    job_id = store.create_job(iter(SHEET), numbered=True)
+    stop = threading.Event()
+
+    def check_then_stop(email, timeout, slot=None):
+        stop.set()
+        return check(email, timeout)
+
+    pipeline = make_pipeline(store, job_id, batch_size=1, engine_options={
+        'check_func': check_then_stop, 'variations_func': variations, 'learner': None, 'max_workers': 1,
+        'should_stop': stop.is_set})
+
+    assert not pipeline.run()
+    assert store.completed_count(job_id) < 3
+
+
+def test_put_waits_for_room_in_a_full_queue(store):
+    job_id = store.create_job(iter(SHEET), numbered=True)
+    pipeline = make_pipeline(store, job_id, queue_batches=1)
+    pipeline._put(pipeline._raw_queue, 'first')
+    results = []
+
+    producer = threading.Thread(target=lambda: results.append(pipeline._put(pipeline._raw_queue, 'second')))
+    producer.start()
+    time.sleep(0.2)
+    assert producer.is_alive()
+    assert pipeline._raw_queue.qsize() == 1
+
+    assert pipeline._raw_queue.get_nowait() == 'first'
+    producer.join(5)
+    assert results == [True]
+    assert pipeline._raw_queue.get_nowait() == 'second'
+
+
+def test_put_gives_up_once_the_pipeline_stops(store):
+    job_id = store.create_job(iter(SHEET), numbered=True)
+    stop = threading.Event()
+    pipeline = make_pipeline(store, job_id, queue_batches=1, engine_options={'should_stop': stop.is_set})
+    pipeline._put(pipeline._raw_queue, 'first')
+    results = []
+
+    producer = threading.Thread(target=lambda: results.append(pipeline._put(pipeline._raw_queue, 'second')))
+    producer.start()
+    stop.set()
+    producer.join(5)
+    assert results == [False]
+
+
+def test_forced_put_makes_room_after_a_failure(store):
+    job_id = store.create_job(iter(SHEET), numbered=True)
+    pipeline = make_pipeline(store, job_id, queue_batches=1)
+    pipeline._put(pipeline._raw_queue, 'stale')
+    pipeline._fail(RuntimeError("boom"))
+
+    assert pipeline._put(pipeline._raw_queue, 'end', force=True)
+    assert pipeline._raw_queue.get_nowait() == 'end'
+
+
+def test_reader_only_runs_queue_batches_ahead(store):
+    job_id = store.create_job(iter((row, ('Иван', f'Петров{row}', 'example.com')) for row in range(2, 12)),
+                              numbered=True)
+    stop = threading.Event()
+    pipeline = make_pipeline(store, job_id, batch_size=2, queue_batches=2,
+                             engine_options={'should_stop': stop.is_set})
+
+    reader = threading.Thread(target=pipeline._read_stage)
+    reader.start()
+    time.sleep(0.2)
+    # Two batches queued and the reader waiting on the third instead of loading all five
+    assert reader.is_alive()
+    assert pipeline._raw_queue.qsize() == 2
+
+    stop.set()
+    reader.join(5)
+    assert not reader.is_alive()
+    with pytest.raises(queue.Full):
+        pipeline._raw_queue.put_nowait('more')
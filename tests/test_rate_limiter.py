@@ -0,0 +1,114 @@
+import pytest
+
+import rate_limiter
+from rate_limiter import RATE_RECOVERY_AFTER, AdaptiveRateLimiter, TokenBucket
+
+
+@pytest.fixture(autouse=True)
+def fake_time(clock, monkeypatch):
+    monkeypatch.setattr(rate_limiter, 'time', clock)
+    return clock
+
+
+def test_burst_goes_out_without_waiting():
+    bucket = TokenBucket(rate=1.0, burst=3)
+    assert [bucket.reserve() for _ in range(3)] == [0.0, 0.0, 0.0]
+
+
+def test_waiters_queue_behind_each_other_once_the_burst_is_used():
+    bucket = TokenBucket(rate=2.0, burst=1)
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() == pytest.approx(0.5)
+    assert bucket.reserve() == pytest.approx(1.0)
+    assert bucket.get_stats()['waited'] == pytest.approx(1.5)
+
+
+def test_tokens_refill_at_the_rate_up_to_the_burst(clock):
+    bucket = TokenBucket(rate=1.0, burst=2)
+    bucket.reserve()
+    bucket.reserve()
+    assert bucket.reserve() == pytest.approx(1.0)
+
+    clock.advance(2)
+    assert bucket.reserve() == 0.0
+
+    # A long idle spell doesn't save up more than the burst
+    clock.advance(100)
+    assert [bucket.reserve() for _ in range(2)] == [0.0, 0.0]
+    assert bucket.reserve() == pytest.approx(1.0)
+
+
+def test_throttle_halves_the_rate_and_drops_the_burst():
+    bucket = TokenBucket(rate=4.0, burst=3, min_rate=0.5)
+    bucket.on_throttle()
+    assert bucket.rate == 2.0
+    # No saved-up tokens left: the next probe waits a full interval
+    assert bucket.reserve() == pytest.approx(0.5)
+
+
+def test_rate_never_drops_below_the_minimum():
+    bucket = TokenBucket(rate=1.0, min_rate=0.25)
+    for _ in range(10):
+        bucket.on_throttle()
+    assert bucket.rate == 0.25
+    assert bucket.get_stats()['throttled'] == 10
+
+
+def test_rate_recovers_after_a_run_of_definitive_replies():
+    bucket = TokenBucket(rate=1.0, max_rate=1.3)
+    for _ in range(RATE_RECOVERY_AFTER - 1):
+        bucket.on_success()
+    assert bucket.rate == 1.0
+    bucket.on_success()
+    assert bucket.rate == pytest.approx(1.2)
+
+    # Capped at max_rate
+    for _ in range(RATE_RECOVERY_AFTER * 3):
+        bucket.on_success()
+    assert bucket.rate == pytest.approx(1.3)
+
+
+def test_throttle_resets_the_recovery_streak():
+    bucket = TokenBucket(rate=1.0, min_rate=0.1)
+    for _ in range(RATE_RECOVERY_AFTER - 1):
+        bucket.on_success()
+    bucket.on_throttle()
+    bucket.on_success()
+    assert bucket.rate == 0.5
+
+
+@pytest.mark.parametrize('code', [421, 450, 451])
+def test_limiter_throttles_on_pushback_codes(code):
+    limiter = AdaptiveRateLimiter(rate=2.0, min_rate=0.1)
+    limiter.report('mx.example.com', code)
+    assert limiter.get_rates()['mx.example.com']['rate'] == 1.0
+
+
+def test_limiter_throttles_on_dropped_connections():
+    limiter = AdaptiveRateLimiter(rate=2.0, min_rate=0.1)
+    limiter.report('mx.example.com', dropped=True)
+    assert limiter.bucket('mx.example.com').rate == 1.0
+
+
+@pytest.mark.parametrize('code, expected_rate', [(250, 1.2), (550, 1.2), (452, 1.0), (None, 1.0)])
+def test_limiter_only_counts_definitive_replies_towards_recovery(code, expected_rate):
+    limiter = AdaptiveRateLimiter(rate=1.0, max_rate=10.0)
+    for _ in range(RATE_RECOVERY_AFTER):
+        limiter.report('mx.example.com', code)
+    assert limiter.bucket('mx.example.com').rate == pytest.approx(expected_rate)
+
+
+def test_hosts_have_separate_buckets_regardless_of_case():
+    limiter = AdaptiveRateLimiter(rate=1.0, burst=1)
+    assert limiter.reserve('MX.example.com') == 0.0
+    assert limiter.reserve('mx.example.com') == pytest.approx(1.0)
+    assert limiter.reserve('mx.other.com') == 0.0
+    assert set(limiter.get_rates()) == {'mx.example.com', 'mx.other.com'}
+
+
+def test_wait_sleeps_for_the_reserved_delay(clock):
+    limiter = AdaptiveRateLimiter(rate=2.0, burst=1)
+    limiter.wait('mx.example.com')
+    start = clock.now
+    limiter.wait('mx.example.com')
+    assert clock.now - start == pytest.approx(0.5)
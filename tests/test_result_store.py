@@ -0,0 +1,57 @@
+import pytest
+
+import result_store
+from result_store import (OUTCOME_ACCEPT_ALL, OUTCOME_INVALID, OUTCOME_LIKELY_VALID, OUTCOME_VALID,
+                          ResultStore)
+
+
+@pytest.fixture
+def store(database, clock, monkeypatch):
+    monkeypatch.setattr(result_store, 'time', clock)
+    return ResultStore(freshness={OUTCOME_VALID: 100, OUTCOME_LIKELY_VALID: 10, OUTCOME_INVALID: 100})
+
+
+def test_fresh_results_are_served_from_the_store(store, clock):
+    store.record('Ivan.Petrov@firm.ru', OUTCOME_VALID, 250, 'Valid', 'mx.firm.ru')
+    clock.advance(99)
+
+    stored = store.lookup('ivan.petrov@FIRM.RU')
+    assert (stored['outcome'], stored['smtp_code'], stored['mx_host']) == (OUTCOME_VALID, 250, 'mx.firm.ru')
+    assert store.get_stats() == {'hits': 1, 'misses': 0}
+
+
+def test_stale_results_are_probed_again(store, clock):
+    store.record('ivan.petrov@firm.ru', OUTCOME_VALID)
+    clock.advance(101)
+    assert store.lookup('ivan.petrov@firm.ru') is None
+    assert store.get_stats() == {'hits': 0, 'misses': 1}
+
+
+def test_heuristic_results_are_trusted_only_briefly(store, clock):
+    store.record('ivan.petrov@mail.ru', OUTCOME_LIKELY_VALID, reason='Likely valid (Mail.ru)')
+    clock.advance(5)
+    assert store.lookup('ivan.petrov@mail.ru')['outcome'] == OUTCOME_LIKELY_VALID
+    clock.advance(10)
+    assert store.lookup('ivan.petrov@mail.ru') is None
+
+
+def test_outcomes_without_a_freshness_window_are_not_stored(store):
+    store.record('ivan.petrov@firm.ru', OUTCOME_ACCEPT_ALL)
+    assert store.lookup('ivan.petrov@firm.ru') is None
+
+
+def test_record_many_replaces_older_results(store):
+    store.record('ivan.petrov@firm.ru', OUTCOME_INVALID)
+    store.record_many([('ivan.petrov@firm.ru', OUTCOME_VALID, 250, 'Valid', 'mx.firm.ru'),
+                       ('i.petrov@firm.ru', OUTCOME_INVALID, 550, None, None),
+                       ('petrov@firm.ru', OUTCOME_ACCEPT_ALL, None, '', '')])
+
+    assert store.lookup('ivan.petrov@firm.ru')['outcome'] == OUTCOME_VALID
+    assert store.lookup('i.petrov@firm.ru')['reason'] == ''
+    assert store.lookup('petrov@firm.ru') is None
+
+
+def test_disabled_store_never_hits(database):
+    store = ResultStore(enabled=False)
+    store.record('ivan.petrov@firm.ru', OUTCOME_VALID)
+    assert store.lookup('ivan.petrov@firm.ru') is None
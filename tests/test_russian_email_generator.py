@@ -0,0 +1,66 @@
+import io
+
+import pytest
+
+from russian_email_generator import (generate_candidates_bulk, generate_email_variations, generate_ranked_candidates,
+                                     generate_surname_variations, ranked_local_parts)
+
+
+def emails(first_name, last_name, domain='firm.ru', top_k=0):
+    return [candidate.email for candidate in generate_ranked_candidates(first_name, last_name, domain, top_k)]
+
+
+@pytest.mark.parametrize('surname, common, legacy', [
+    ('Петровская', 'petrovskaya', 'petrovskaja'),
+    ('Цой', 'tsoy', 'tsoj'),
+])
+def test_modern_spellings_rank_above_legacy_ones(surname, common, legacy):
+    variations = generate_surname_variations(surname)
+    assert variations[0] == common
+    assert variations.index(common) < variations.index(legacy)
+
+    ranked = emails('Ольга', surname)
+    assert ranked.index(f'olga.{common}@firm.ru') < ranked.index(f'olga.{legacy}@firm.ru')
+
+
+def test_ending_variants_follow_the_common_spelling():
+    assert generate_surname_variations('Королёв')[:2] == ['korolyov', 'korolev']
+    assert 'ivanoff' in generate_surname_variations('Иванов')
+
+
+def test_candidates_are_most_likely_first():
+    candidates = generate_ranked_candidates('Иван', 'Петров', 'firm.ru', top_k=0)
+    assert candidates[0].email == 'ivan.petrov@firm.ru'
+    assert candidates[0].pattern == 'first.last'
+    scores = [candidate.score for candidate in candidates]
+    assert scores == sorted(scores, reverse=True)
+    assert len(set(candidate.email for candidate in candidates)) == len(candidates)
+
+
+def test_top_k_keeps_the_best_candidates():
+    assert emails('Иван', 'Петров', top_k=3) == emails('Иван', 'Петров')[:3]
+
+
+@pytest.mark.parametrize('first_name, last_name', [('Иван', ''), ('', 'Петров'), ('Иван', ' - ')])
+def test_no_candidates_without_both_names(first_name, last_name):
+    assert emails(first_name, last_name) == []
+    assert ranked_local_parts(first_name, last_name).local_parts == ()
+
+
+def test_bulk_candidates_match_the_per_row_ones():
+    entries = [('Иван', 'Петров', 'firm.ru'), ('Анна', 'Смирнова', ''), ('Иван', 'Петров', 'other.ru'),
+               ('Олег', 'Сидоров', 'firm.ru')]
+    batch = generate_candidates_bulk(entries, top_k=3)
+
+    assert list(batch.emails_by_row()) == [(row, generate_email_variations(*entries[row], top_k=3))
+                                           for row in (0, 2, 3)]
+    # Each domain is stored once
+    assert batch.domains == ['firm.ru', 'other.ru']
+    assert batch.pattern(0) == 'first.last'
+
+
+def test_bulk_candidates_are_exported_as_csv():
+    output = io.StringIO()
+    generate_candidates_bulk([('Иван', 'Петров', 'firm.ru')], top_k=2).write_csv(output)
+    assert output.getvalue().splitlines() == ['row,pattern,email', '0,first.last,ivan.petrov@firm.ru',
+                                              '0,f.last,i.petrov@firm.ru']
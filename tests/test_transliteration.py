@@ -0,0 +1,54 @@
+import re
+
+import pytest
+
+from transliteration import SCHEME_LETTERS, SCHEMES, get_cache_stats, transliterate, transliteration_variants
+
+
+@pytest.mark.parametrize('scheme, expected', [
+    ('legacy', 'hruschev'),
+    ('web', 'hruschyov'),
+    ('bgn', 'khrushchev'),
+    ('icao', 'khrushchev'),
+    ('gost', 'xrushhyov'),
+])
+def test_scheme_spellings(scheme, expected):
+    assert transliterate('Хрущёв', scheme) == expected
+
+
+def test_common_spellings_come_first():
+    assert SCHEMES[0] == 'web'
+    assert transliterate('Юрий') == 'yuriy'
+    assert transliteration_variants('Юрий') == ('yuriy', 'iurii', 'jurij', 'yurij')
+    assert transliteration_variants('Петровская').index('petrovskaya') < \
+        transliteration_variants('Петровская').index('petrovskaja')
+
+
+def test_identical_spellings_are_listed_once():
+    assert transliteration_variants('Иванов') == ('ivanov',)
+
+
+def test_upper_case_and_other_characters():
+    assert transliterate('ЮРИЙ', 'web') == 'yuriy'
+    assert transliterate('Анна-Мария Smith', 'web') == 'anna-mariya smith'
+
+
+@pytest.mark.parametrize('scheme', SCHEMES)
+def test_every_letter_spells_as_address_safe_latin(scheme):
+    assert len(SCHEME_LETTERS[scheme]) == 33
+    for letter, latin in SCHEME_LETTERS[scheme].items():
+        assert re.fullmatch('[a-z]*', latin), (scheme, letter, latin)
+
+
+def test_soft_and_hard_signs_leave_no_apostrophe():
+    assert set(transliteration_variants('Мельник')) == {'melnik'}
+    assert transliterate('Подъячев', 'legacy') == 'podjachev'
+
+
+def test_variants_are_cached():
+    before = get_cache_stats()
+    transliteration_variants('Кэшированный')
+    transliteration_variants('Кэшированный')
+    after = get_cache_stats()
+    assert after['misses'] - before['misses'] == 1
+    assert after['hits'] - before['hits'] == 1
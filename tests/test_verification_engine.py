@@ -0,0 +1,218 @@
+import threading
+import time
+
+import pytest
+
+import dns_cache
+import email_verification_tool
+from check_records import Outcome
+from jobs import new_progress
+from pattern_learner import PatternLearner
+from result_store import OUTCOME_GREYLISTED, OUTCOME_INVALID, OUTCOME_LIKELY_VALID, OUTCOME_VALID, VALID_OUTCOMES
+from russian_email_generator import generate_email_variations
+from verification_engine import VerificationEngine
+
+
+@pytest.fixture(autouse=True)
+def no_network(monkeypatch):
+    def no_dns(domain):
+        raise dns_cache.dns.resolver.NoNameservers()
+
+    monkeypatch.setattr(dns_cache, 'resolve_mx', no_dns)
+    monkeypatch.setattr(email_verification_tool, 'is_catch_all_domain', lambda domain, **kwargs: False)
+
+
+class FakeChecker:
+    """check_func answering from a table; a list of outcomes is played back one call at a time."""
+
+    def __init__(self, answers=None, delay=0.0):
+        self.answers = dict(answers or {})
+        self.delay = delay
+        self.checked = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, email, timeout, slot=None):
+        with slot():
+            with self._lock:
+                self.checked.append(email)
+                self.in_flight += 1
+                self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            time.sleep(self.delay)
+            with self._lock:
+                self.in_flight -= 1
+        outcome = self.answers.get(email, OUTCOME_INVALID)
+        if isinstance(outcome, list):
+            outcome = outcome.pop(0) if len(outcome) > 1 else outcome[0]
+        return {'is_valid': outcome in VALID_OUTCOMES, 'outcome': outcome, 'retry_after': 0.05}
+
+
+def variations(first_name, last_name, domain):
+    return [f'{first_name}.{last_name}@{domain}', f'{first_name[0]}.{last_name}@{domain}']
+
+
+def run_engine(entries, checker, **options):
+    options.setdefault('variations_func', variations)
+    options.setdefault('learner', None)
+    done = []
+    progress = new_progress('job', len(entries))
+    engine = VerificationEngine(progress, check_func=checker, on_entry_done=lambda *row: done.append(row),
+                                **options)
+    assert engine.run(entries)
+    return progress, done
+
+
+def test_valid_emails_are_reported_in_sheet_order():
+    entries = [('ivan', 'petrov', 'firm.ru'), ('anna', 'smirnova', 'other.ru'), ('oleg', 'sidorov', 'firm.ru')]
+    checker = FakeChecker({'i.petrov@firm.ru': OUTCOME_VALID, 'oleg.sidorov@firm.ru': OUTCOME_VALID})
+
+    progress, done = run_engine(entries, checker)
+
+    assert [record['email'] for record in progress['valid_emails']] == ['i.petrov@firm.ru', 'oleg.sidorov@firm.ru']
+    assert progress['current'] == 3
+    assert sorted(index for index, _, _, _ in done) == [0, 1, 2]
+    # stop_on_first_valid: nothing after oleg.sidorov@firm.ru was probed for him
+    assert 'o.sidorov@firm.ru' not in checker.checked
+
+
+def test_every_candidate_is_checked_without_stop_on_first_valid():
+    checker = FakeChecker({'ivan.petrov@firm.ru': OUTCOME_VALID})
+    progress, done = run_engine([('ivan', 'petrov', 'firm.ru')], checker, stop_on_first_valid=False)
+
+    assert checker.checked == ['ivan.petrov@firm.ru', 'i.petrov@firm.ru']
+    [(_, person, checked, valid)] = done
+    assert person == 'ivan petrov (firm.ru)'
+    assert [record.outcome for record in checked] == [Outcome.VALID, Outcome.INVALID]
+    assert valid == [{'first_name': 'ivan', 'last_name': 'petrov', 'domain': 'firm.ru',
+                      'email': 'ivan.petrov@firm.ru'}]
+
+
+def test_rows_without_a_domain_are_skipped():
+    checker = FakeChecker()
+    progress, done = run_engine([('ivan', 'petrov', ''), ('anna', 'smirnova', 'nodot')], checker)
+    assert checker.checked == []
+    assert progress['current'] == 2
+
+
+def test_accept_all_domains_are_not_probed_per_address(monkeypatch):
+    monkeypatch.setattr(email_verification_tool, 'is_catch_all_domain', lambda domain, **kwargs: domain == 'firm.ru')
+    checker = FakeChecker({'ivan.petrov@firm.ru': OUTCOME_VALID})
+    progress, done = run_engine([('ivan', 'petrov', 'firm.ru')], checker)
+
+    assert checker.checked == []
+    assert progress['valid_emails'] == []
+    [record] = progress['all_checked_emails']['ivan petrov (firm.ru)']
+    assert (record.email, record.outcome) == ('ivan.petrov@firm.ru', Outcome.ACCEPT_ALL)
+
+
+def test_probes_against_one_server_are_capped():
+    entries = [(f'name{i}', 'petrov', 'firm.ru') for i in range(6)]
+    checker = FakeChecker(delay=0.05)
+    run_engine(entries, checker, max_workers=6, max_per_mx=2)
+    assert checker.max_in_flight == 2
+
+
+def test_different_servers_are_probed_in_parallel():
+    entries = [('ivan', 'petrov', f'firm{i}.ru') for i in range(4)]
+    checker = FakeChecker(delay=0.2)
+    run_engine(entries, checker, max_workers=4, max_per_mx=1)
+    assert checker.max_in_flight == 4
+
+
+def test_slots_are_only_taken_by_check_func():
+    progress = new_progress('job', 1)
+    held = []
+    engine = None
+
+    def check(email, timeout, slot=None):
+        # Nothing is held while check_func waits for the server's rate limit
+        held.append(engine.mx_slot('firm.ru')._value)
+        with slot():
+            held.append(engine.mx_slot('firm.ru')._value)
+        return {'is_valid': False, 'outcome': OUTCOME_INVALID}
+
+    engine = VerificationEngine(progress, check_func=check, variations_func=variations, learner=None,
+                                max_per_mx=1)
+    engine.run([('ivan', 'petrov', 'firm.ru')])
+    assert held == [1, 0, 1, 0]
+
+
+def test_rows_are_planned_into_per_domain_lanes():
+    entries = [('a', 'x', 'firm.ru'), ('b', 'x', 'other.ru'), ('c', 'x', 'Firm.ru'), ('d', 'x', 'firm.ru')]
+    engine = VerificationEngine(new_progress('job', 4), max_per_mx=2, learner=None)
+    assert engine.plan(entries, [10, 11, 12, 13]) == [
+        ('firm.ru', [(10, entries[0]), (13, entries[3])]),
+        ('firm.ru', [(12, entries[2])]),
+        ('other.ru', [(11, entries[1])]),
+    ]
+
+
+def test_domain_checks_run_once_per_lane(monkeypatch):
+    probed = []
+    monkeypatch.setattr(email_verification_tool, 'is_catch_all_domain',
+                        lambda domain, **kwargs: probed.append(domain) or False)
+    entries = [(f'name{i}', 'petrov', 'firm.ru') for i in range(4)] + [('anna', 'smirnova', 'other.ru')]
+
+    progress, done = run_engine(entries, FakeChecker(), max_per_mx=1)
+
+    assert sorted(probed) == ['firm.ru', 'other.ru']
+    assert progress['current'] == 5
+
+
+def test_greylisted_candidates_are_retried_later():
+    checker = FakeChecker({'ivan.petrov@firm.ru': [OUTCOME_GREYLISTED, OUTCOME_VALID]})
+    progress, done = run_engine([('ivan', 'petrov', 'firm.ru')], checker)
+
+    assert checker.checked == ['ivan.petrov@firm.ru', 'i.petrov@firm.ru', 'ivan.petrov@firm.ru']
+    [(_, _, checked, valid)] = done
+    assert [record.outcome for record in checked] == [Outcome.GREYLISTED, Outcome.INVALID, Outcome.VALID]
+    assert [record['email'] for record in valid] == ['ivan.petrov@firm.ru']
+
+
+def test_greylisting_is_given_up_after_the_retry_limit(monkeypatch):
+    monkeypatch.setattr(email_verification_tool, 'GREYLIST_MAX_RETRIES', 2)
+    checker = FakeChecker({'ivan.petrov@firm.ru': OUTCOME_GREYLISTED})
+    progress, done = run_engine([('ivan', 'petrov', 'firm.ru')], checker)
+
+    assert checker.checked.count('ivan.petrov@firm.ru') == 3
+    assert progress['current'] == 1
+    assert done[0][3] == []
+
+
+@pytest.fixture
+def learner(database):
+    return PatternLearner(restrict_min_hits=1, restrict_min_share=0.8)
+
+
+def test_confirmed_hits_are_learned(learner):
+    checker = FakeChecker({'i.petrov@firm.ru': OUTCOME_VALID})
+    run_engine([('Иван', 'Петров', 'firm.ru')], checker, learner=learner, variations_func=generate_email_variations)
+    assert learner.get_patterns('firm.ru') == {'f.last': 1}
+
+
+def test_heuristic_hits_are_not_learned(learner):
+    checker = FakeChecker({'ivan.petrov@firm.ru': OUTCOME_LIKELY_VALID})
+    progress, _ = run_engine([('Иван', 'Петров', 'firm.ru')], checker, learner=learner,
+                             variations_func=generate_email_variations)
+    assert progress['valid_emails'][0]['email'] == 'ivan.petrov@firm.ru'
+    assert learner.get_patterns('firm.ru') == {}
+
+
+def test_learned_pattern_narrows_candidates_and_falls_back_when_it_misses(learner):
+    learner.record_hit('Иван', 'Петров', 'i.petrov@firm.ru')
+    checker = FakeChecker({'o.sidorov@firm.ru': OUTCOME_VALID, 'anna.smirnova@firm.ru': OUTCOME_VALID})
+
+    progress, _ = run_engine([('Олег', 'Сидоров', 'firm.ru')], checker, learner=learner,
+                             variations_func=generate_email_variations)
+    assert checker.checked == ['o.sidorov@firm.ru']
+
+    checker.checked.clear()
+    progress, _ = run_engine([('Анна', 'Смирнова', 'firm.ru')], checker, learner=learner,
+                             variations_func=generate_email_variations)
+    # The f.last spellings first; they miss, so the rest are probed after all
+    tried_first = [email for email in checker.checked if email.startswith('a.')]
+    assert checker.checked[0] == 'a.smirnova@firm.ru'
+    assert checker.checked[:len(tried_first)] == tried_first
+    assert checker.checked[-1] == 'anna.smirnova@firm.ru'
+    assert [record['email'] for record in progress['valid_emails']] == ['anna.smirnova@firm.ru']
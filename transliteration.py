@@ -0,0 +1,85 @@
+import os
+from functools import lru_cache
+from typing import Dict, Tuple
+
+# Transliterated names kept in memory (least recently used dropped first); sheets repeat names a lot
+TRANSLIT_CACHE_SIZE = int(os.environ.get('TRANSLIT_CACHE_SIZE', 65536))
+
+# Per-letter Latin spellings of the Russian alphabet under each standard, lower case.
+# Marks that can't appear in an address (GOST's y', e', ``; BGN's primes) are dropped.
+SCHEME_LETTERS: Dict[str, Dict[str, str]] = {
+    # How people usually spell their own names in addresses (Юрий -> yuriy, Хрущёв -> hruschyov)
+    'web': {
+        'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'yo', 'ж': 'zh',
+        'з': 'z', 'и': 'i', 'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm', 'н': 'n', 'о': 'o',
+        'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u', 'ф': 'f', 'х': 'h', 'ц': 'ts',
+        'ч': 'ch', 'ш': 'sh', 'щ': 'sch', 'ъ': '', 'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu',
+        'я': 'ya',
+    },
+    # BGN/PCGN 1947, without diacritics (Юрий -> yuriy, Хрущёв -> khrushchev)
+    'bgn': {
+        'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'e', 'ж': 'zh',
+        'з': 'z', 'и': 'i', 'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm', 'н': 'n', 'о': 'o',
+        'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u', 'ф': 'f', 'х': 'kh', 'ц': 'ts',
+        'ч': 'ch', 'ш': 'sh', 'щ': 'shch', 'ъ': '', 'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu',
+        'я': 'ya',
+    },
+    # ICAO Doc 9303, as in Russian passports since 2013 (Юрий -> iurii, Хрущёв -> khrushchev)
+    'icao': {
+        'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'e', 'ж': 'zh',
+        'з': 'z', 'и': 'i', 'й': 'i', 'к': 'k', 'л': 'l', 'м': 'm', 'н': 'n', 'о': 'o',
+        'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u', 'ф': 'f', 'х': 'kh', 'ц': 'ts',
+        'ч': 'ch', 'ш': 'sh', 'щ': 'shch', 'ъ': 'ie', 'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'iu',
+        'я': 'ia',
+    },
+    # What the `transliterate` package produces (Иванов -> ivanov, Юрий -> jurij); older
+    # addresses use it. The package's apostrophe for ъ/ь (mel'nik) isn't valid in an
+    # address, so it's dropped: melnik
+    'legacy': {
+        'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'e', 'ж': 'zh',
+        'з': 'z', 'и': 'i', 'й': 'j', 'к': 'k', 'л': 'l', 'м': 'm', 'н': 'n', 'о': 'o',
+        'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u', 'ф': 'f', 'х': 'h', 'ц': 'ts',
+        'ч': 'ch', 'ш': 'sh', 'щ': 'sch', 'ъ': '', 'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'ju',
+        'я': 'ja',
+    },
+    # GOST 7.79-2000 system B (Юрий -> yurij, Хрущёв -> xrushhyov, Цой -> czoj)
+    'gost': {
+        'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'yo', 'ж': 'zh',
+        'з': 'z', 'и': 'i', 'й': 'j', 'к': 'k', 'л': 'l', 'м': 'm', 'н': 'n', 'о': 'o',
+        'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u', 'ф': 'f', 'х': 'x', 'ц': 'cz',
+        'ч': 'ch', 'ш': 'sh', 'щ': 'shh', 'ъ': '', 'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu',
+        'я': 'ya',
+    },
+}
+
+# Order variants are returned in: most common in real addresses first, so 'ya'/'y'
+# (petrovskaya, tsoy) beat the older 'ja'/'j' (petrovskaja, tsoj)
+SCHEMES = tuple(SCHEME_LETTERS)
+
+# str.translate tables, built once; upper-case letters map like lower-case ones
+_TABLES = {
+    scheme: str.maketrans({
+        **{letter: latin for letter, latin in letters.items()},
+        **{letter.upper(): latin for letter, latin in letters.items()},
+    })
+    for scheme, letters in SCHEME_LETTERS.items()
+}
+
+
+def transliterate(text: str, scheme: str = 'web') -> str:
+    """Lower-case Latin spelling of Russian text under one scheme; other characters pass through."""
+    return text.translate(_TABLES[scheme]).lower()
+
+
+@lru_cache(maxsize=TRANSLIT_CACHE_SIZE)
+def transliteration_variants(text: str) -> Tuple[str, ...]:
+    """Every distinct spelling of a name across the schemes, most common first.
+
+    'Юрий' -> ('yuriy', 'iurii', 'jurij', 'yurij'), 'Иванов' -> ('ivanov',).
+    """
+    return tuple(dict.fromkeys(text.translate(_TABLES[scheme]).lower() for scheme in SCHEMES))
+
+
+def get_cache_stats() -> Dict[str, int]:
+    info = transliteration_variants.cache_info()
+    return {'hits': info.hits, 'misses': info.misses, 'size': info.currsize}
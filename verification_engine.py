@@ -0,0 +1,447 @@
+import heapq
+import logging
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager, nullcontext
+from functools import partial
+from typing import Any, Callable, ContextManager, Dict, Iterable, List, Optional, Tuple
+
+import dns_cache
+from check_records import UNKNOWN_PATTERN, CheckRecord, Outcome, domain_table
+import email_verification_tool
+from log_config import EventLogger
+import pattern_learner
+import russian_email_generator
+from result_store import OUTCOME_GREYLISTED, OUTCOME_VALID
+
+logger = logging.getLogger("verification_engine")
+# Per-row and per-candidate events, sampled unless the engine logs at DEBUG
+events = EventLogger("verification_engine")
+
+# Concurrency settings
+VERIFICATION_MAX_WORKERS = int(os.environ.get('VERIFICATION_MAX_WORKERS', 8))
+VERIFICATION_MAX_PER_MX = int(os.environ.get('VERIFICATION_MAX_PER_MX', 2))
+
+
+class MXSlots:
+    """Per-MX-host semaphores; can be shared by several engines so the limit is global."""
+
+    def __init__(self, max_per_mx: int = VERIFICATION_MAX_PER_MX):
+        self.max_per_mx = max(1, max_per_mx)
+        self._slots: Dict[str, threading.Semaphore] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> threading.Semaphore:
+        with self._lock:
+            if key not in self._slots:
+                self._slots[key] = threading.Semaphore(self.max_per_mx)
+            return self._slots[key]
+
+
+class RowState:
+    """One sheet row in flight; kept around while the row waits for a greylisting retry."""
+
+    def __init__(self, index: int, entry: Tuple[str, str, str], person_key: str,
+                 slot: threading.Semaphore):
+        self.index = index
+        self.entry = entry
+        self.person_key = person_key
+        self.slot = slot
+        self.domain_id = domain_table.id(entry[2] or '')
+        # Pattern number of each candidate's local part, filled in once candidates are generated
+        self.pattern_numbers: Dict[str, int] = {}
+        self.checked: List[CheckRecord] = []
+        self.shared_checked: List[CheckRecord] = []
+        self.pending_emails: List[str] = []
+        # Candidates the learner left out; probed if the ones it kept don't hit
+        self.fallback_emails: List[str] = []
+        self.attempts = 0
+        self.found_valid = False
+
+    def record_check(self, email: str, outcome: Outcome):
+        local_part = email.rpartition('@')[0]
+        record = CheckRecord(local_part, self.domain_id,
+                             self.pattern_numbers.get(local_part, UNKNOWN_PATTERN), outcome)
+        self.checked.append(record)
+        self.shared_checked.append(record)
+
+
+class VerificationEngine:
+    """Worker pool that verifies many people in parallel.
+
+    Rows are planned into per-domain groups first. The domain-level work (MX
+    lookup, catch-all probe) runs once per group, and the group's people are
+    then verified back to back, so their candidates stream through the same
+    pooled SMTP session. Big groups are split into up to `max_per_mx` lanes.
+    Within a person, variations are still probed one by one (so
+    stop_on_first_valid keeps working). A global limit caps the number of
+    workers and a per-MX limit caps how many probes hit the same mail server at
+    once, so throughput grows with the number of distinct domains without
+    hammering any single server.
+
+    Progress is written into the same dict layout the sheet progress page reads
+    (`verification_progress` in app.py).
+
+    When several jobs run at once, the scheduler passes a shared `mx_slots` so
+    the per-MX limit holds across jobs, and a `probe_slot` that hands out the
+    global outbound connection budget fairly between jobs. Both are handed to
+    `check_func` as its `slot`, so they are only held while a probe runs and
+    not while it waits for the mail server's rate limit.
+
+    SMTP-confirmed hits feed the `learner`, which reorders (or narrows) the
+    candidates of everyone else at the same domain to the company's pattern.
+    When a narrowed list finds nothing, the rest of the candidates are probed
+    after all.
+
+    Candidates answered with 450/451 (greylisting) don't hold up a worker: the
+    row is parked and its greylisted candidates are probed again once the
+    server's retry delay has passed, while other rows keep going.
+
+    `run_stream` takes rows in batches as they become available (e.g. from a
+    pipeline's queue) and only pulls the next batch when the workers run low,
+    so a job of any size keeps just a batch or two in memory. Set
+    `keep_checked=False` to stop collecting every checked address in
+    `progress['all_checked_emails']` when the results are stored elsewhere.
+    """
+
+    def __init__(self,
+                 progress: Dict[str, Any],
+                 timeout: int = 30,
+                 stop_on_first_valid: bool = True,
+                 max_workers: int = VERIFICATION_MAX_WORKERS,
+                 max_per_mx: int = VERIFICATION_MAX_PER_MX,
+                 should_stop: Callable[[], bool] = lambda: False,
+                 on_entry_done: Callable[[int, str, List[CheckRecord], List[Dict[str, str]]], None] = None,
+                 mx_slots: MXSlots = None,
+                 probe_slot: Callable[[], ContextManager] = None,
+                 check_func: Callable[..., Dict[str, Any]] = email_verification_tool.check_email,
+                 variations_func: Callable[[str, str, str], List[str]] = russian_email_generator.generate_email_variations,
+                 learner: Optional[pattern_learner.PatternLearner] = pattern_learner.pattern_learner,
+                 keep_checked: bool = True):
+        self.progress = progress
+        self.timeout = timeout
+        self.stop_on_first_valid = stop_on_first_valid
+        self.max_workers = max(1, max_workers)
+        self.max_per_mx = max(1, max_per_mx)
+        self.should_stop = should_stop
+        self.on_entry_done = on_entry_done
+        self.mx_slots = mx_slots or MXSlots(self.max_per_mx)
+        self.probe_slot = probe_slot or nullcontext
+        self.check_func = check_func
+        self.variations_func = variations_func
+        self.learner = learner
+        self.keep_checked = keep_checked
+
+        self._lock = threading.Lock()
+        self._valid_by_row: Dict[int, List[Dict[str, str]]] = {}
+        self._completed = 0
+        self._completed_before = 0
+        self._submitted = 0
+        # Rows parked after greylisting: (retry_at, sequence, RowState)
+        self._deferred: List[Tuple[float, int, RowState]] = []
+        self._deferred_seq = 0
+
+    def mx_key(self, domain: str) -> str:
+        """Key used for per-server limits: the primary MX host, or the domain itself."""
+        try:
+            return dns_cache.resolve_mx(domain)[0]
+        except Exception:
+            return domain
+
+    def mx_slot(self, domain: str) -> threading.Semaphore:
+        return self.mx_slots.get(self.mx_key(domain))
+
+    @contextmanager
+    def _held_slots(self, mx_slot: threading.Semaphore):
+        # The mail server's slot first, so a busy MX doesn't hold a global slot
+        with mx_slot, self.probe_slot():
+            yield
+
+    def run(self, entries: List[Tuple[str, str, str]], row_indices: List[int] = None) -> bool:
+        """Verify all entries, blocking until done.
+
+        Args:
+            entries: (first_name, last_name, domain) tuples to verify
+            row_indices: Original row number of each entry, when only part of a
+                sheet is being verified (e.g. a resumed job). Defaults to 0..n-1.
+
+        Returns:
+            bool: False if processing was stopped before all entries were handled
+        """
+        if row_indices is None:
+            row_indices = list(range(len(entries)))
+        # Rows finished by an earlier, interrupted run count towards progress
+        self.progress['total'] = self.progress.get('current', 0) + len(entries)
+        return self.run_stream([list(zip(row_indices, entries))])
+
+    def run_stream(self, batches: Iterable[List[Tuple[int, Tuple[str, str, str]]]]) -> bool:
+        """Verify rows arriving in batches of (row_index, entry), blocking until all are done.
+
+        Each batch is planned into domain lanes on its own. The next batch is
+        only pulled once fewer than a few rows per worker are still waiting, so
+        a slow mail server holds back the producer instead of growing a backlog.
+        progress['total'] is left to the caller, who knows the size of the job.
+
+        Returns:
+            bool: False if processing was stopped before all rows were handled
+        """
+        logger.info(f"Verifying with {self.max_workers} workers, {self.max_per_mx} per MX host")
+        self._completed = self._completed_before = self.progress.get('current', 0)
+        self._submitted = 0
+        valid_before = list(self.progress.get('valid_emails', []))
+        low_water = self.max_workers * 4
+
+        batches = iter(batches)
+        exhausted = False
+        executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="verify")
+        try:
+            futures = set()
+            while True:
+                if not exhausted and not self.should_stop() and (not futures or self._outstanding() < low_water):
+                    batch = next(batches, None)
+                    if batch is None:
+                        exhausted = True
+                    else:
+                        self._submitted += len(batch)
+                        futures |= {executor.submit(self._process_group, domain, lane)
+                                    for domain, lane in self.plan([entry for _, entry in batch],
+                                                                  [index for index, _ in batch])}
+                        continue
+                # Keep feeding greylisted rows back in as they come due, alongside the regular work
+                futures |= {executor.submit(self._retry_row, row) for row in self._pop_due_rows()}
+                futures = {future for future in futures if not future.done()}
+                if self.should_stop() or (exhausted and not futures and not self._deferred):
+                    break
+                timeout = min(self._next_retry_in(), 1.0)
+                if futures:
+                    wait(futures, timeout=timeout, return_when=FIRST_COMPLETED)
+                else:
+                    time.sleep(timeout)
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+        if self._deferred:
+            logger.info(f"Leaving {len(self._deferred)} greylisted rows pending")
+
+        # Report valid emails in sheet order rather than completion order
+        self.progress['valid_emails'] = valid_before + [
+            record for i in sorted(self._valid_by_row) for record in self._valid_by_row[i]
+        ]
+        return not self.should_stop()
+
+    def _outstanding(self) -> int:
+        """Rows handed to workers that are neither finished nor parked for a retry."""
+        with self._lock:
+            return self._submitted - (self._completed - self._completed_before) - len(self._deferred)
+
+    def plan(self, entries: List[Tuple[str, str, str]],
+             row_indices: List[int]) -> List[Tuple[str, List[Tuple[int, Tuple[str, str, str]]]]]:
+        """Group rows by domain and split each group into lanes of (row_index, entry)."""
+        lanes = []
+        for domain, positions in email_verification_tool.group_entries_by_domain(entries):
+            lane_count = min(self.max_per_mx, len(positions))
+            for lane in range(lane_count):
+                lanes.append((domain, [(row_indices[i], entries[i]) for i in positions[lane::lane_count]]))
+        logger.info(f"Planned {len(lanes)} lanes over "
+                    f"{len(set(domain for domain, lane in lanes))} domains")
+        return lanes
+
+    def _process_group(self, domain: str, items: List[Tuple[int, Tuple[str, str, str]]]):
+        if self.should_stop():
+            return
+
+        slot = self.mx_slot(domain) if domain else None
+        accept_all = False
+        if domain and '.' in domain:
+            # One probe per domain tells us whether per-address probes mean anything there
+            try:
+                accept_all = email_verification_tool.is_catch_all_domain(
+                    domain, slot=partial(self._held_slots, slot))
+            except Exception as e:
+                logger.error(f"Error checking {domain} for accept-all: {str(e)}")
+
+        for index, entry in items:
+            if self.should_stop():
+                return
+            self._process_entry(index, entry, slot, accept_all)
+
+    def _process_entry(self, index: int, entry: Tuple[str, str, str],
+                       slot: threading.Semaphore, accept_all: bool):
+        if self.should_stop():
+            return
+
+        first_name, last_name, domain = entry
+        row = RowState(index, entry, f"{first_name} {last_name} ({domain})", slot)
+        finished = False
+        try:
+            self.progress['current_name'] = row.person_key
+
+            # Skip if domain is still missing
+            if not domain or '.' not in domain:
+                logger.warning(f"Skipping entry {index+1}: {first_name} {last_name} - No valid domain found")
+                finished = True
+                return
+
+            events.sampled("row start", row=index + 1, total=self.progress['total'], person=row.person_key)
+
+            email_variations = self.variations_func(first_name, last_name, domain)
+            if self.learner:
+                learned = self.learner.apply(first_name, last_name, domain, email_variations)
+                kept = set(learned)
+                row.fallback_emails = [email for email in email_variations if email not in kept]
+                email_variations = learned
+            parts = russian_email_generator.ranked_local_parts(first_name, last_name)
+            row.pattern_numbers = dict(zip(parts.local_parts, parts.patterns))
+            self.progress['total_emails'] = len(email_variations)
+            if self.keep_checked:
+                row.shared_checked = self.progress['all_checked_emails'].setdefault(row.person_key, [])
+
+            if accept_all:
+                logger.info(f"{domain} accepts all recipients, marking {first_name} {last_name} as unverifiable")
+                if email_variations:
+                    row.record_check(email_variations[0], Outcome.ACCEPT_ALL)
+                finished = True
+                return
+
+            finished = self._probe_candidates(row, email_variations)
+        except Exception as e:
+            # One bad row must not take down the whole run
+            logger.error(f"Error processing entry {index+1}: {str(e)}")
+            finished = True
+        finally:
+            # A row interrupted by a stop request, or parked for a greylisting
+            # retry, is left pending so it can be resumed / finished later
+            if finished:
+                self._finish_row(row)
+
+    def _retry_row(self, row: RowState):
+        """Probe a parked row's greylisted candidates again."""
+        if self.should_stop():
+            return
+
+        finished = False
+        try:
+            self.progress['current_name'] = row.person_key
+            emails, row.pending_emails = row.pending_emails, []
+            logger.info(f"Retrying {len(emails)} greylisted candidates for {row.person_key} "
+                        f"(attempt {row.attempts + 1})")
+            finished = self._probe_candidates(row, emails)
+        except Exception as e:
+            logger.error(f"Error retrying entry {row.index+1}: {str(e)}")
+            finished = True
+        finally:
+            if finished:
+                self._finish_row(row)
+
+    def _probe_candidates(self, row: RowState, emails: List[str]) -> bool:
+        """Probe a row's candidates in order.
+
+        Greylisted candidates are collected and the row is parked to retry them
+        after the delay the server asked for (up to GREYLIST_MAX_RETRIES times).
+
+        Returns:
+            bool: True if the row is finished, False if it was stopped or parked
+        """
+        first_name, last_name, domain = row.entry
+        greylisted = []
+        retry_after = 0
+        valid_email_found = False
+
+        for j, email in enumerate(emails):
+            if self.should_stop():
+                return False
+
+            self.progress['current_email'] = email
+            self.progress['current_email_index'] = j
+
+            try:
+                # check_func takes the slots once it has waited out the server's rate limit
+                check = self.check_func(email, self.timeout, slot=partial(self._held_slots, row.slot))
+            except Exception as e:
+                events.error("check error", email=email, error=str(e))
+                row.record_check(email, Outcome.ERROR)
+                continue
+
+            if check.get('outcome') == OUTCOME_GREYLISTED:
+                events.debug("greylisted, will retry", email=email)
+                row.record_check(email, Outcome.GREYLISTED)
+                greylisted.append(email)
+                retry_after = max(retry_after, check.get('retry_after') or email_verification_tool.GREYLIST_RETRY_DELAY)
+                continue
+
+            is_valid = check['is_valid']
+            row.record_check(email, Outcome.from_name(check.get('outcome'), is_valid))
+            if is_valid:
+                logger.info(f"Valid email found: {email}")
+                self._record_valid(row, email)
+                valid_email_found = True
+                # Heuristic answers (Mail.ru, Yandex) would teach the learner whatever we guessed first
+                if self.learner and check.get('outcome') == OUTCOME_VALID:
+                    self.learner.record_hit(first_name, last_name, email)
+
+                if self.stop_on_first_valid:
+                    break
+
+        if greylisted and not (valid_email_found and self.stop_on_first_valid):
+            if row.attempts < email_verification_tool.GREYLIST_MAX_RETRIES:
+                row.attempts += 1
+                row.pending_emails = greylisted
+                self._defer(row, retry_after)
+                return False
+            logger.warning(f"Giving up on {len(greylisted)} greylisted candidates for {row.person_key}")
+
+        if not row.found_valid and row.fallback_emails:
+            # The domain's usual pattern doesn't fit this person, so try the rest
+            emails, row.fallback_emails = row.fallback_emails, []
+            logger.info(f"Nothing in the learned pattern for {row.person_key}, probing {len(emails)} more candidates")
+            return self._probe_candidates(row, emails)
+
+        if not valid_email_found and not row.found_valid:
+            events.sampled("no valid email", row=row.index + 1, person=row.person_key)
+        return True
+
+    def _record_valid(self, row: RowState, email: str):
+        first_name, last_name, domain = row.entry
+        record = {
+            'first_name': first_name,
+            'last_name': last_name,
+            'domain': domain,
+            'email': email
+        }
+        row.found_valid = True
+        with self._lock:
+            self._valid_by_row.setdefault(row.index, []).append(record)
+            self.progress['valid_emails'].append(record)
+
+    def _defer(self, row: RowState, delay: float):
+        logger.info(f"Parking {row.person_key} for {delay:.0f}s after greylisting")
+        with self._lock:
+            self._deferred_seq += 1
+            heapq.heappush(self._deferred, (time.time() + delay, self._deferred_seq, row))
+
+    def _pop_due_rows(self) -> List[RowState]:
+        now = time.time()
+        due = []
+        with self._lock:
+            while self._deferred and self._deferred[0][0] <= now:
+                due.append(heapq.heappop(self._deferred)[2])
+        return due
+
+    def _next_retry_in(self) -> float:
+        with self._lock:
+            if not self._deferred:
+                return 1.0
+            return max(0.0, self._deferred[0][0] - time.time())
+
+    def _finish_row(self, row: RowState):
+        with self._lock:
+            self._completed += 1
+            self.progress['current'] = self._completed
+        if self.on_entry_done:
+            try:
+                self.on_entry_done(row.index, row.person_key, list(row.checked),
+                                   self._valid_by_row.get(row.index, []))
+            except Exception as e:
+                logger.error(f"Error checkpointing entry {row.index+1}: {str(e)}")
@@ -1,4 +1,7 @@
-from app import app
+from app import app, startup
+
+# Server entry point: resume interrupted jobs (each is claimed, so only one worker runs it)
+startup()
 
 # This file is used by Vercel to import the Flask application
 if __name__ == "__main__":